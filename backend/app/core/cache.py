@@ -0,0 +1,379 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, Hashable, Iterable, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.tenancy import current_shop
+
+load_dotenv()
+
+# "local" only invalidates this process; "sqlite" also tells every other worker on the host
+CACHE_INVALIDATION_BACKEND = os.getenv("CACHE_INVALIDATION_BACKEND", "local")
+CACHE_INVALIDATION_PATH = os.getenv("CACHE_INVALIDATION_PATH", "./cache_invalidations.db")
+CACHE_INVALIDATION_POLL_MS = int(os.getenv("CACHE_INVALIDATION_POLL_MS", 100))
+CACHE_INVALIDATION_RETENTION_SECONDS = int(os.getenv("CACHE_INVALIDATION_RETENTION_SECONDS", 300))
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# Entries with this tag depend on every write, so any tag invalidation drops them
+WILDCARD_TAG = "*"
+
+@dataclass(frozen=True)
+class ShopKey:
+    """A cache key as seen from one shop, so shops sharing a process never read each other's entries"""
+    shop: str
+    key: Hashable
+
+def _scoped(key: Hashable) -> Hashable:
+    shop = current_shop.get()
+    return key if shop is None else ShopKey(shop, key)
+
+def _unscoped(key: Hashable) -> Hashable:
+    return key.key if isinstance(key, ShopKey) else key
+
+class LocalCache:
+    """A bounded in-process LRU whose entries can be dropped from any worker.
+
+    Every invalidation bumps a generation counter; get_or_load only stores a
+    value if no invalidation happened while it was being loaded, so a slow
+    reader can never put back data that a concurrent write made stale.
+
+    Keys are private to the current shop. Invalidations are not: dropping a
+    key drops it for every shop, which costs the others a reload but lets
+    an invalidation published by another worker apply without knowing the
+    shop.
+    """
+
+    def __init__(self, name: str, max_entries: int = 1024, ttl_seconds: Optional[float] = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        register_cache(self)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        key = _scoped(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[1] and entry[1] <= time.monotonic()):
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Return the cached value or call loader; None results are not cached"""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        generation = self._generation
+        value = loader()
+        if value is not None:
+            self._store(key, value, generation)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._store(key, value, self._generation)
+
+    def _store(self, key: Hashable, value: Any, generation: int) -> None:
+        key = _scoped(key)
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else 0.0
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._forget(self._entries.popitem(last=False)[0])
+
+    def _forget(self, key: Hashable) -> None:
+        """Called with the lock held whenever an entry leaves the cache"""
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one entry, or everything when key is None, in this process only"""
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                for cached in list(self._entries):
+                    self._forget(cached)
+                self._entries.clear()
+            else:
+                for cached in [cached for cached in self._entries if _unscoped(cached) == key]:
+                    del self._entries[cached]
+                    self._forget(cached)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "max_entries": self.max_entries,
+            }
+
+class TaggedCache(LocalCache):
+    """A LocalCache whose invalidations name tags instead of keys.
+
+    Each entry is stored with the tags of the data it was built from, so a
+    write only drops the entries it can affect. Invalidating a tag also
+    drops entries tagged WILDCARD_TAG; invalidating with no key clears
+    everything, as for any cache.
+    """
+
+    def __init__(self, name: str, max_entries: int = 1024, ttl_seconds: Optional[float] = None):
+        self._tags: Dict[Hashable, FrozenSet[str]] = {}
+        self._by_tag: Dict[str, Set[Hashable]] = defaultdict(set)
+        super().__init__(name, max_entries, ttl_seconds)
+
+    def get_or_load_tagged(self, key: Hashable, loader: Callable[[], Tuple[Any, Optional[Iterable[str]]]]) -> Any:
+        """Return the cached value or call loader for (value, tags); tags of None mean don't cache"""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        generation = self._generation
+        value, tags = loader()
+        if tags is not None:
+            self._store(key, value, generation, frozenset(tags))
+        return value
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = (WILDCARD_TAG,)) -> None:
+        self._store(key, value, self._generation, frozenset(tags))
+
+    def _store(self, key: Hashable, value: Any, generation: int, tags: FrozenSet[str] = frozenset((WILDCARD_TAG,))) -> None:
+        key = _scoped(key)
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else 0.0
+        with self._lock:
+            if generation != self._generation:
+                return
+            if key in self._entries:
+                self._forget(key)
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            self._tags[key] = tags
+            for tag in tags:
+                self._by_tag[tag].add(key)
+            while len(self._entries) > self.max_entries:
+                self._forget(self._entries.popitem(last=False)[0])
+
+    def _forget(self, key: Hashable) -> None:
+        for tag in self._tags.pop(key, ()):
+            keys = self._by_tag[tag]
+            keys.discard(key)
+            if not keys:
+                del self._by_tag[tag]
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Drop the entries tagged with key (plus wildcard entries), or everything when key is None"""
+        if key is None:
+            super().invalidate()
+            return
+        with self._lock:
+            self._generation += 1
+            for tag in (key, WILDCARD_TAG):
+                for cached in list(self._by_tag.get(tag, ())):
+                    self._entries.pop(cached, None)
+                    self._forget(cached)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        with self._lock:
+            stats["tags"] = len(self._by_tag)
+        return stats
+
+class LocalInvalidationChannel:
+    """Single-process deployments have nobody else to tell"""
+
+    def publish(self, cache: str, key: Optional[str]) -> None:
+        pass
+
+    def start(self, handler: Callable[[str, Optional[str]], None]) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+class SQLiteInvalidationChannel:
+    """Broadcasts invalidations to every worker on a host through an append-only SQLite log.
+
+    A local stand-in for a pub/sub server: publishing is one INSERT, and
+    each worker polls for rows newer than the last one it has seen, skipping
+    its own. Readers that fall further behind than the retention window
+    clear all of their caches instead of guessing what they missed.
+    """
+
+    def __init__(
+        self,
+        path: str = CACHE_INVALIDATION_PATH,
+        poll_ms: int = CACHE_INVALIDATION_POLL_MS,
+        retention_seconds: int = CACHE_INVALIDATION_RETENTION_SECONDS
+    ):
+        self.path = path
+        self.poll_ms = poll_ms
+        self.retention_seconds = retention_seconds
+        self._local = threading.local()
+        self._last_id = 0
+        self._handler: Optional[Callable[[str, Optional[str]], None]] = None
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_invalidations ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, cache TEXT NOT NULL, key TEXT, "
+            "origin INTEGER NOT NULL, created_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_cache_invalidations_created_at "
+            "ON cache_invalidations (created_at)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so they are keyed by process as well as thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def publish(self, cache: str, key: Optional[str]) -> None:
+        self._connect().execute(
+            "INSERT INTO cache_invalidations (cache, key, origin, created_at) VALUES (?, ?, ?, ?)",
+            (cache, key, os.getpid(), time.time()),
+        )
+
+    def start(self, handler: Callable[[str, Optional[str]], None]) -> None:
+        self._handler = handler
+        self._last_id = self._connect().execute(
+            "SELECT COALESCE(MAX(id), 0) FROM cache_invalidations"
+        ).fetchone()[0]
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="cache-invalidation", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def poll(self) -> int:
+        """Apply invalidations published by other processes since the last poll"""
+        conn = self._connect()
+        oldest = conn.execute("SELECT MIN(id) FROM cache_invalidations").fetchone()[0]
+        rows = conn.execute(
+            "SELECT id, cache, key, origin FROM cache_invalidations WHERE id > ? ORDER BY id",
+            (self._last_id,),
+        ).fetchall()
+        if oldest is not None and oldest > self._last_id + 1 and self._last_id:
+            # Rows we never saw were pruned
+            logger.warning("Missed cache invalidations; clearing every cache")
+            for cache in list(_caches):
+                self._handler(cache, None)
+        applied = 0
+        for row_id, cache, key, origin in rows:
+            if origin != os.getpid():
+                self._handler(cache, key)
+                applied += 1
+            self._last_id = row_id
+        return applied
+
+    def _run(self) -> None:
+        last_prune = 0.0
+        while not self._stopping.wait(self.poll_ms / 1000):
+            try:
+                self.poll()
+                now = time.time()
+                if now - last_prune > self.retention_seconds / 2:
+                    self._connect().execute(
+                        "DELETE FROM cache_invalidations WHERE created_at < ?",
+                        (now - self.retention_seconds,),
+                    )
+                    last_prune = now
+            except Exception:
+                logger.exception("Polling cache invalidations failed")
+
+_caches: Dict[str, LocalCache] = {}
+# Other messages carried to every worker by the same channel, handled by name
+_relays: Dict[str, Callable[[str], None]] = {}
+
+def register_cache(cache: LocalCache) -> None:
+    _caches[cache.name] = cache
+
+def register_relay(name: str, handler: Callable[[str], None]) -> None:
+    _relays[name] = handler
+
+def create_invalidation_channel(backend: str = CACHE_INVALIDATION_BACKEND):
+    if backend == "sqlite":
+        return SQLiteInvalidationChannel()
+    return LocalInvalidationChannel()
+
+invalidation_channel = create_invalidation_channel()
+
+def _apply_invalidation(cache: str, key: Optional[str]) -> None:
+    if cache in _caches:
+        _caches[cache].invalidate(key)
+    elif cache in _relays and key is not None:
+        _relays[cache](key)
+
+def invalidate(cache: str, key: Optional[str] = None) -> None:
+    """Drop a cache entry (or the whole cache) here and in every other worker"""
+    _apply_invalidation(cache, key)
+    try:
+        invalidation_channel.publish(cache, key)
+    except Exception:
+        logger.exception("Publishing invalidation of %s failed", cache)
+
+def relay(name: str, message: str) -> None:
+    """Hand a message to the relay registered under name in every other worker"""
+    try:
+        invalidation_channel.publish(name, message)
+    except Exception:
+        logger.exception("Relaying %s failed", name)
+
+def start_invalidation_listener() -> None:
+    invalidation_channel.start(_apply_invalidation)
+
+def stop_invalidation_listener() -> None:
+    invalidation_channel.stop()
+
+def cache_stats() -> Dict[str, dict]:
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+def clear_caches() -> None:
+    for cache in _caches.values():
+        cache.invalidate()
+
+def invalidate_on_commit(session: Session, cache: str, key: Optional[str] = None) -> None:
+    """Invalidate a cache once the session's current transaction commits"""
+    pending: Set[Tuple[str, Optional[str]]] = session.info.setdefault("cache_invalidations", set())
+    pending.add((cache, key))
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    for cache, key in session.info.pop("cache_invalidations", ()):
+        invalidate(cache, key)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_rolled_back(session: Session, previous_transaction) -> None:
+    session.info.pop("cache_invalidations", None)
@@ -0,0 +1,5 @@
+from datetime import datetime, timezone
+
+def utcnow() -> datetime:
+    """Current UTC time as a naive datetime (SQLite stores timestamps without tzinfo)"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
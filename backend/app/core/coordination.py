@@ -0,0 +1,55 @@
+import os
+from contextlib import contextmanager
+from typing import Iterator, Optional, TextIO
+
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single worker is the only supported mode there
+    fcntl = None
+
+load_dotenv()
+
+# Where workers on one host keep the lock files they coordinate through
+RUN_DIR = os.getenv("RUN_DIR", ".")
+
+@contextmanager
+def file_lock(name: str) -> Iterator[None]:
+    """Hold an exclusive lock shared by every process on the host, waiting for it if needed"""
+    with open(os.path.join(RUN_DIR, name), "a") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+_leadership: Optional[TextIO] = None
+
+def acquire_leadership(name: str = "sweetshop-leader.lock") -> bool:
+    """Try to become the one worker that runs host-wide singleton jobs.
+
+    The lock is held until the process exits, so when the leader dies the
+    next worker to start (or call this again) takes over.
+    """
+    global _leadership
+    if _leadership is not None:
+        return True
+    if fcntl is None:
+        return True
+    handle = open(os.path.join(RUN_DIR, name), "a")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _leadership = handle
+    return True
+
+def release_leadership() -> None:
+    global _leadership
+    if _leadership is not None:
+        _leadership.close()
+        _leadership = None
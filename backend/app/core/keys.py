@@ -0,0 +1,189 @@
+import base64
+import json
+import os
+import secrets
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import jwt
+from jwt.algorithms import has_crypto
+from jwt.exceptions import InvalidTokenError
+
+# Members of a JWK that must never leave the key file
+PRIVATE_MEMBERS = ("d", "p", "q", "dp", "dq", "qi", "oth", "k")
+SUPPORTED_ALGORITHMS = ("EdDSA", "ES256", "HS256")
+
+@dataclass(frozen=True)
+class SigningKey:
+    """One key of the set, parsed once into the object PyJWT signs and verifies with"""
+    kid: Optional[str]
+    algorithm: str
+    jwk: jwt.PyJWK
+    public: Optional[dict]
+
+def _parse(data: dict) -> SigningKey:
+    algorithm = data.get("alg")
+    if algorithm not in SUPPORTED_ALGORITHMS:
+        raise ValueError(f"Key {data.get('kid')!r} has unsupported alg {algorithm!r}")
+    public = None
+    if data.get("kty") != "oct":
+        public = {name: value for name, value in data.items() if name not in PRIVATE_MEMBERS and name != "retired_at"}
+    return SigningKey(kid=data.get("kid"), algorithm=algorithm, jwk=jwt.PyJWK(data, algorithm), public=public)
+
+class KeySet:
+    """Access-token keys read from a local JWKS file, with one active signing key.
+
+    The file holds private JWKs plus the kid of the key new tokens are
+    signed with; every other key in it still verifies, which is what lets
+    a rotation overlap with tokens signed before it. The file is re-read
+    when it changes, at most every `reload_seconds`, so workers pick up a
+    rotation without a restart. Without a file, tokens are signed with the
+    shared secret, as before. Once there is a file, tokens without a kid
+    (signed with the shared secret) only verify until its `legacy_until`,
+    which the first rotation sets to when the last of them has expired.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        fallback_secret: Optional[str] = None,
+        fallback_algorithm: str = "HS256",
+        reload_seconds: float = 30.0
+    ):
+        self.path = path or None
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        self._keys: Dict[str, SigningKey] = {}
+        self._active: Optional[SigningKey] = None
+        self._legacy_until: Optional[float] = None
+        self._stamp = None
+        self._next_check = 0.0
+        # Verifies tokens without a kid, i.e. everything signed before a key file existed
+        self._legacy = None
+        if fallback_secret:
+            self._legacy = SigningKey(
+                kid=None,
+                algorithm=fallback_algorithm,
+                jwk=jwt.PyJWK(
+                    {"kty": "oct", "k": _b64(fallback_secret.encode("utf-8"))},
+                    fallback_algorithm
+                ),
+                public=None
+            )
+        self._refresh(force=True)
+
+    def _refresh(self, force: bool = False) -> None:
+        if self.path is None or (not force and time.monotonic() < self._next_check):
+            return
+        with self._lock:
+            if not force and time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + self.reload_seconds
+            try:
+                self._load()
+            except (OSError, ValueError):
+                # A broken rewrite must not take authentication down; keep the last good set
+                if force:
+                    raise
+
+    def _load(self) -> None:
+        stat = os.stat(self.path)
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp:
+            return
+        with open(self.path) as handle:
+            document = json.load(handle)
+        keys = {}
+        for data in document.get("keys", []):
+            key = _parse(data)
+            keys[key.kid] = key
+        if document.get("active") not in keys:
+            raise ValueError(f"Active key {document.get('active')!r} is not in {self.path}")
+        self._keys, self._active, self._stamp = keys, keys[document["active"]], stamp
+        self._legacy_until = document.get("legacy_until")
+
+    def signing_key(self) -> SigningKey:
+        self._refresh()
+        if self._active is not None:
+            return self._active
+        if self._legacy is None:
+            raise RuntimeError("No signing key: set JWT_KEYS_FILE or SECRET_KEY")
+        return self._legacy
+
+    def verifier(self, kid: Optional[str]) -> SigningKey:
+        """The parsed key a token's kid points at; raises InvalidTokenError for unknown kids"""
+        self._refresh()
+        if kid is not None:
+            key = self._keys.get(kid)
+        elif self._active is None or time.time() < (self._legacy_until or 0):
+            key = self._legacy
+        else:
+            key = None
+        if key is None:
+            raise InvalidTokenError(f"Unknown signing key {kid!r}")
+        return key
+
+    def encode(self, payload: dict) -> str:
+        key = self.signing_key()
+        headers = {"kid": key.kid} if key.kid is not None else None
+        return jwt.encode(payload, key.jwk, algorithm=key.algorithm, headers=headers)
+
+    def decode(self, token: str) -> dict:
+        key = self.verifier(jwt.get_unverified_header(token).get("kid"))
+        return jwt.decode(token, key.jwk, algorithms=[key.algorithm])
+
+    def jwks(self) -> dict:
+        """Public halves of the asymmetric keys, for services that verify our tokens"""
+        self._refresh()
+        return {"keys": [key.public for key in self._keys.values() if key.public is not None]}
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def generate_jwk(algorithm: str, kid: Optional[str] = None) -> dict:
+    """A new private JWK for the algorithm; EdDSA and ES256 need the cryptography package"""
+    kid = kid or uuid.uuid4().hex[:16]
+    if algorithm == "HS256":
+        return {"kty": "oct", "kid": kid, "alg": "HS256", "use": "sig", "k": _b64(secrets.token_bytes(32))}
+    if algorithm not in SUPPORTED_ALGORITHMS:
+        raise ValueError(f"Unsupported algorithm {algorithm!r}")
+    if not has_crypto:
+        raise RuntimeError(f"{algorithm} keys need the cryptography package: pip install cryptography")
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+    from jwt.algorithms import ECAlgorithm, OKPAlgorithm
+
+    if algorithm == "EdDSA":
+        data = OKPAlgorithm.to_jwk(ed25519.Ed25519PrivateKey.generate(), as_dict=True)
+    else:
+        data = ECAlgorithm.to_jwk(ec.generate_private_key(ec.SECP256R1()), as_dict=True)
+    return {**data, "kid": kid, "alg": algorithm, "use": "sig"}
+
+def rotate_key_file(path: str, algorithm: str, overlap_seconds: float) -> str:
+    """Add a new active key, retire the old one, and drop keys retired longer than the overlap.
+
+    Returns the new kid. The file is replaced atomically and is only
+    readable by its owner. A new file stops tokens signed with the shared
+    secret from verifying once they have had the overlap to expire.
+    """
+    now = time.time()
+    document = {"active": None, "keys": [], "legacy_until": now + overlap_seconds}
+    if os.path.exists(path):
+        with open(path) as handle:
+            document = json.load(handle)
+    keys: List[dict] = []
+    for data in document["keys"]:
+        if data["kid"] == document["active"]:
+            data = {**data, "retired_at": now}
+        if now - data.get("retired_at", now) <= overlap_seconds:
+            keys.append(data)
+    new_key = generate_jwk(algorithm)
+    keys.append(new_key)
+    temporary = f"{path}.tmp"
+    descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, "w") as handle:
+        json.dump({**document, "active": new_key["kid"], "keys": keys}, handle, indent=2)
+    os.replace(temporary, path)
+    return new_key["kid"]
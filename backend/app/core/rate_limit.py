@@ -0,0 +1,211 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request, status
+
+from app.core.tenancy import current_shop
+
+load_dotenv()
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+# "memory" keeps buckets per process; "sqlite" shares them between workers through a local file
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", "./rate_limits.db")
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", 100_000))
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() in ("1", "true", "yes")
+AUTH_RATE_LIMIT_IP_BURST = int(os.getenv("AUTH_RATE_LIMIT_IP_BURST", 20))
+AUTH_RATE_LIMIT_IP_PER_MINUTE = float(os.getenv("AUTH_RATE_LIMIT_IP_PER_MINUTE", 10))
+AUTH_RATE_LIMIT_USER_BURST = int(os.getenv("AUTH_RATE_LIMIT_USER_BURST", 5))
+AUTH_RATE_LIMIT_USER_PER_MINUTE = float(os.getenv("AUTH_RATE_LIMIT_USER_PER_MINUTE", 2))
+
+class MemoryBucketStore:
+    """Token buckets for one process, held as compact tuples in a bounded LRU.
+
+    Each entry is (tokens, updated_at, full_at). A bucket that would have
+    refilled completely is indistinguishable from a missing one, so such
+    entries are dropped lazily from the cold end of the LRU.
+    """
+
+    def __init__(self, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def take(self, key: str, capacity: float, per_second: float, now: float) -> float:
+        """Take one token; returns 0 if allowed, else seconds until a token is available"""
+        with self._lock:
+            tokens, updated_at, _ = self._buckets.pop(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated_at) * per_second)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / per_second
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / per_second)
+            self._expire(now)
+            return wait
+
+    def refund(self, key: str, capacity: float, per_second: float) -> None:
+        with self._lock:
+            entry = self._buckets.get(key)
+            if entry is not None:
+                tokens, updated_at, _ = entry
+                tokens = min(capacity, tokens + 1)
+                self._buckets[key] = (tokens, updated_at, updated_at + (capacity - tokens) / per_second)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+    def _expire(self, now: float) -> None:
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        # Bounded amount of lazy cleanup per call
+        for _ in range(2):
+            if not self._buckets:
+                return
+            key, (_, _, full_at) = next(iter(self._buckets.items()))
+            if full_at > now:
+                return
+            del self._buckets[key]
+
+class SQLiteBucketStore:
+    """Token buckets shared by every worker on a host through a small SQLite file.
+
+    A local stand-in for a networked store such as Redis; each take is one
+    short write transaction.
+    """
+
+    def __init__(self, path: str = RATE_LIMIT_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+                "updated_at REAL NOT NULL, full_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_rate_limit_buckets_full_at "
+                "ON rate_limit_buckets (full_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so they are keyed by process as well as thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, key: str, capacity: float, per_second: float, now: float) -> float:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, updated_at = row if row else (capacity, now)
+            tokens = min(capacity, tokens + (now - updated_at) * per_second)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / per_second
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limit_buckets VALUES (?, ?, ?, ?)",
+                (key, tokens, now, now + (capacity - tokens) / per_second),
+            )
+            conn.execute("DELETE FROM rate_limit_buckets WHERE full_at <= ?", (now,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def refund(self, key: str, capacity: float, per_second: float) -> None:
+        self._connect().execute(
+            "UPDATE rate_limit_buckets SET tokens = MIN(?, tokens + 1), "
+            "full_at = updated_at + (? - MIN(?, tokens + 1)) / ? WHERE key = ?",
+            (capacity, capacity, capacity, per_second, key),
+        )
+
+    def reset(self) -> None:
+        self._connect().execute("DELETE FROM rate_limit_buckets")
+
+class RateLimiter:
+    """Per-IP and per-username token buckets for the authentication endpoints"""
+
+    def __init__(
+        self,
+        store,
+        ip_burst: int = AUTH_RATE_LIMIT_IP_BURST,
+        ip_per_minute: float = AUTH_RATE_LIMIT_IP_PER_MINUTE,
+        user_burst: int = AUTH_RATE_LIMIT_USER_BURST,
+        user_per_minute: float = AUTH_RATE_LIMIT_USER_PER_MINUTE,
+        enabled: bool = RATE_LIMIT_ENABLED,
+    ):
+        self.store = store
+        self.enabled = enabled
+        self.ip_rule = (ip_burst, ip_per_minute / 60)
+        self.user_rule = (user_burst, user_per_minute / 60)
+
+    def check(self, request: Request, scope: str, username: Optional[str]) -> None:
+        """Take a token from the caller's IP and username buckets or raise 429"""
+        if not self.enabled:
+            return
+        now = time.time()
+        waits = [self.store.take(f"{scope}:ip:{client_ip(request)}", *self.ip_rule, now)]
+        if username:
+            waits.append(self.store.take(self._user_key(scope, username), *self.user_rule, now))
+        wait = max(waits)
+        if wait > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many attempts. Try again later.",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+    def succeeded(self, scope: str, username: str) -> None:
+        """Give back the username token after a successful attempt.
+
+        Only failed attempts should count against an account, otherwise a user
+        who logs in often would lock themselves out.
+        """
+        if self.enabled:
+            self.store.refund(self._user_key(scope, username), *self.user_rule)
+
+    def reset(self) -> None:
+        self.store.reset()
+
+    @staticmethod
+    def _user_key(scope: str, username: str) -> str:
+        # Usernames are per shop, so are their buckets; IP buckets guard the host and stay shared
+        key = f"{scope}:user:{username.strip().lower()}"
+        shop = current_shop.get()
+        return key if shop is None else f"shop:{shop}:{key}"
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def create_bucket_store(backend: str = RATE_LIMIT_BACKEND):
+    if backend == "sqlite":
+        return SQLiteBucketStore()
+    return MemoryBucketStore()
+
+auth_rate_limiter = RateLimiter(create_bucket_store())
@@ -1,15 +1,21 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import Optional
-import jwt
 from jwt.exceptions import InvalidTokenError
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event, select
 from sqlalchemy.orm import Session
 import os
 from dotenv import load_dotenv
 
-from app.database import get_db
+from app.core.cache import LocalCache, invalidate_on_commit
+from app.core.keys import KeySet
+from app.core.tenancy import current_shop
+from app.database import ReadConnection, get_read_connection
 from app.models.user import User
 from app.schemas.user import TokenData
 
@@ -17,7 +23,23 @@ load_dotenv()
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+# Kept short: clients renew through /api/auth/refresh instead of logging in again
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 15))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# bcrypt releases the GIL, so hashes run in parallel up to this many at a time
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10_000))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", 300))
+# Local JWKS file with the active signing key; without one, tokens are signed with SECRET_KEY
+JWT_KEYS_FILE = os.getenv("JWT_KEYS_FILE", "")
+JWT_KEYS_RELOAD_SECONDS = float(os.getenv("JWT_KEYS_RELOAD_SECONDS", 30))
+
+key_set = KeySet(
+    JWT_KEYS_FILE,
+    fallback_secret=SECRET_KEY,
+    fallback_algorithm=ALGORITHM,
+    reload_seconds=JWT_KEYS_RELOAD_SECONDS
+)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
@@ -27,43 +49,85 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     """Hash a password"""
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed.decode('utf-8')
 
+# Separate from the request threadpool so slow hashes cannot starve other endpoints
+password_hasher = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the password-hashing pool instead of the request thread"""
+    return await asyncio.get_running_loop().run_in_executor(password_hasher, get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    """Create a JWT access token using PyJWT"""
+    """Create a JWT access token, signed with the active key and naming it in the kid header.
+
+    With tenancy, the token also names the shop it was issued by and is
+    only accepted there: user IDs and names are per shop.
+    """
     to_encode = data.copy()
+    if current_shop.get() is not None:
+        to_encode["shop"] = current_shop.get()
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    return key_set.encode(to_encode)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    """Get the current authenticated user"""
+@dataclass(frozen=True)
+class CurrentUser:
+    """The authenticated user, detached from any session so it can be cached across requests"""
+    id: int
+    email: str
+    username: str
+    is_admin: bool
+
+user_cache = LocalCache("users", max_entries=USER_CACHE_SIZE, ttl_seconds=USER_CACHE_TTL_SECONDS)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_users(mapper, connection, target: User) -> None:
+    invalidate_on_commit(Session.object_session(target), "users")
+
+def load_user(conn: ReadConnection, username: str) -> Optional[CurrentUser]:
+    row = conn.execute(
+        select(User.id, User.email, User.username, User.is_admin).where(User.username == username)
+    ).first()
+    if row is None:
+        return None
+    return CurrentUser(id=row.id, email=row.email, username=row.username, is_admin=bool(row.is_admin))
+
+def get_user_from_token(token: str, conn: ReadConnection) -> CurrentUser:
+    """Resolve a bearer token to its user, raising 401 if it is invalid"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = key_set.decode(token)
         username: str = payload.get("sub")
-        if username is None:
+        if username is None or payload.get("shop") != current_shop.get():
             raise credentials_exception
         token_data = TokenData(username=username)
     except InvalidTokenError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.username == token_data.username).first()
+    user = user_cache.get_or_load(token_data.username, lambda: load_user(conn, token_data.username))
     if user is None:
         raise credentials_exception
     return user
 
-def get_current_admin_user(current_user: User = Depends(get_current_user)) -> User:
+def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    conn: ReadConnection = Depends(get_read_connection)
+) -> CurrentUser:
+    """Get the current authenticated user"""
+    return get_user_from_token(token, conn)
+
+def get_current_admin_user(current_user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
     """Verify that the current user is an admin"""
     if not current_user.is_admin:
         raise HTTPException(
@@ -0,0 +1,160 @@
+import os
+import sqlite3
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+from fastapi import Depends
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.core.tenancy import current_shop
+from app.database import DATABASE_URL, EngineRegistry, get_db, tenant_engines
+
+load_dotenv()
+
+SNAPSHOT_PAGES_PER_STEP = int(os.getenv("SNAPSHOT_PAGES_PER_STEP", 256))
+SNAPSHOT_STEP_SLEEP_MS = float(os.getenv("SNAPSHOT_STEP_SLEEP_MS", 10))
+# Times writers may send the step-by-step copy back to the start before it is finished in one pass
+SNAPSHOT_MAX_RESTARTS = int(os.getenv("SNAPSHOT_MAX_RESTARTS", 3))
+# When set, analytics endpoints read this snapshot instead of the live database;
+# with TENANT_DATABASE_URL it needs a {shop} placeholder, e.g. snapshots/{shop}.db
+ANALYTICS_SNAPSHOT_PATH = os.getenv("ANALYTICS_SNAPSHOT_PATH", "")
+SNAPSHOT_MMAP_BYTES = int(os.getenv("SNAPSHOT_MMAP_BYTES", 256 * 1024 * 1024))
+
+def database_path(url: str = DATABASE_URL) -> str:
+    """The file behind a sqlite:/// URL"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or not parsed.database or parsed.database == ":memory:":
+        raise ValueError(f"{url} is not a SQLite database file")
+    return parsed.database
+
+def _check(conn: sqlite3.Connection, path: str) -> None:
+    result = conn.execute("PRAGMA quick_check").fetchone()[0]
+    if result != "ok":
+        raise ValueError(f"{path} failed its integrity check: {result}")
+
+class _KeepsRestarting(Exception):
+    pass
+
+def create_snapshot(
+    source_path: str,
+    target_path: str,
+    pages: int = SNAPSHOT_PAGES_PER_STEP,
+    sleep_ms: float = SNAPSHOT_STEP_SLEEP_MS,
+    progress: Optional[Callable[[int, int, int], None]] = None,
+    max_restarts: int = SNAPSHOT_MAX_RESTARTS
+) -> None:
+    """Copy a live database with the online backup API, a few pages at a time.
+
+    The source is only locked while a step copies its pages, so writers
+    commit in between steps; a write from another connection makes the
+    copy start over, which keeps it consistent. After max_restarts of
+    those, the copy is redone in one step under a read transaction, which
+    holds writers off until it is done; if that cannot get its lock within
+    the busy timeout, the error is raised. The snapshot is written next to
+    the target and renamed over it once it has been checked.
+    """
+    temporary = f"{target_path}.partial"
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(temporary)
+    restarts = 0
+    last_remaining = None
+
+    def step(status: int, remaining: int, total: int) -> None:
+        nonlocal restarts, last_remaining
+        # Every completed step leaves fewer pages to copy, unless the copy started over
+        if status == sqlite3.SQLITE_OK and last_remaining is not None and remaining >= last_remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _KeepsRestarting()
+        last_remaining = remaining
+        if progress is not None:
+            progress(status, remaining, total)
+
+    try:
+        try:
+            source.backup(target, pages=pages, progress=step, sleep=sleep_ms / 1000)
+        except _KeepsRestarting:
+            source.execute("BEGIN")
+            try:
+                # Take the read lock before copying, so no commit can restart this pass
+                source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+                source.backup(target, pages=-1)
+            finally:
+                source.rollback()
+        _check(target, temporary)
+    finally:
+        target.close()
+        source.close()
+    os.replace(temporary, target_path)
+
+def restore_snapshot(snapshot_path: str, target_path: str) -> None:
+    """Replace a database with a snapshot in one backup step.
+
+    Other connections see either the old contents or the new ones; stop
+    the app first anyway, since cached data and in-flight requests would
+    still refer to the old state.
+    """
+    snapshot = sqlite3.connect(f"file:{snapshot_path}?mode=ro", uri=True)
+    target = sqlite3.connect(target_path, timeout=30)
+    try:
+        _check(snapshot, snapshot_path)
+        snapshot.backup(target)
+    finally:
+        target.close()
+        snapshot.close()
+
+def create_snapshot_engine(path: str, mmap_bytes: int = SNAPSHOT_MMAP_BYTES) -> Engine:
+    """A read-only engine over a snapshot file, reading pages through mmap.
+
+    Connections are not pooled, so a snapshot replaced by a newer one is
+    picked up by the next request.
+    """
+    snapshot_engine = create_engine(
+        f"sqlite:///file:{os.path.abspath(path)}?mode=ro&uri=true",
+        connect_args={"check_same_thread": False},
+        poolclass=NullPool
+    )
+
+    @event.listens_for(snapshot_engine, "connect")
+    def _configure(dbapi_connection, connection_record):
+        dbapi_connection.execute(f"PRAGMA mmap_size = {int(mmap_bytes)}")
+        dbapi_connection.execute("PRAGMA query_only = 1")
+
+    return snapshot_engine
+
+if ANALYTICS_SNAPSHOT_PATH and ("{shop}" in ANALYTICS_SNAPSHOT_PATH) != (tenant_engines is not None):
+    raise ValueError("ANALYTICS_SNAPSHOT_PATH needs a {shop} placeholder exactly when TENANT_DATABASE_URL is set")
+
+AnalyticsSessionLocal = None
+# Per-shop snapshots are opened like shop databases: on first use, in an LRU
+snapshot_engines = None
+if tenant_engines is not None and ANALYTICS_SNAPSHOT_PATH:
+    AnalyticsSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+    snapshot_engines = EngineRegistry(
+        f"sqlite:///{os.path.abspath(ANALYTICS_SNAPSHOT_PATH)}",
+        factory=lambda url: create_snapshot_engine(make_url(url).database)
+    )
+elif ANALYTICS_SNAPSHOT_PATH:
+    AnalyticsSessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=create_snapshot_engine(ANALYTICS_SNAPSHOT_PATH)
+    )
+
+def get_analytics_db(db: Session = Depends(get_db)):
+    """Dependency for reporting queries: the analytics snapshot if one is configured, else the live database"""
+    # The live session never connects unless it is the one handed out
+    if AnalyticsSessionLocal is None:
+        yield db
+        return
+    if snapshot_engines is not None:
+        snapshot_db = AnalyticsSessionLocal(bind=snapshot_engines.get(current_shop.get()))
+    else:
+        snapshot_db = AnalyticsSessionLocal()
+    try:
+        yield snapshot_db
+    finally:
+        snapshot_db.close()
@@ -0,0 +1,276 @@
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TASK_QUEUE_BACKEND = os.getenv("TASK_QUEUE_BACKEND", "memory")
+TASK_QUEUE_PATH = os.getenv("TASK_QUEUE_PATH", "./tasks.db")
+TASK_QUEUE_MAX_SIZE = int(os.getenv("TASK_QUEUE_MAX_SIZE", 10_000))
+TASK_QUEUE_WORKERS = int(os.getenv("TASK_QUEUE_WORKERS", 2))
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", 5))
+TASK_BACKOFF_SECONDS = float(os.getenv("TASK_BACKOFF_SECONDS", 1.0))
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Task:
+    name: str
+    payload: dict
+    attempts: int = 0
+    id: Optional[int] = None
+
+class MemoryTaskStore:
+    """No durability: tasks still queued when the process dies are lost"""
+
+    def add(self, task: Task) -> None:
+        pass
+
+    def retry(self, task: Task, due: float) -> None:
+        pass
+
+    def done(self, task: Task) -> None:
+        pass
+
+    def recover(self) -> List[Task]:
+        return []
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class SQLiteTaskStore:
+    """Keeps every queued task in a SQLite file until it has run.
+
+    Rows belong to the process that enqueued them. A process starting up
+    takes over the rows of processes that are no longer running, so work
+    queued before a crash or restart still happens, at least once.
+    """
+
+    def __init__(self, path: str = TASK_QUEUE_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS background_tasks ("
+            "id INTEGER PRIMARY KEY, name TEXT NOT NULL, payload TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL, due REAL NOT NULL, owner INTEGER NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_background_tasks_owner ON background_tasks (owner)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so they are keyed by process as well as thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def add(self, task: Task) -> None:
+        task.id = self._connect().execute(
+            "INSERT INTO background_tasks (name, payload, attempts, due, owner) VALUES (?, ?, ?, ?, ?)",
+            (task.name, json.dumps(task.payload), task.attempts, time.time(), os.getpid()),
+        ).lastrowid
+
+    def retry(self, task: Task, due: float) -> None:
+        self._connect().execute(
+            "UPDATE background_tasks SET attempts = ?, due = ? WHERE id = ?", (task.attempts, due, task.id)
+        )
+
+    def done(self, task: Task) -> None:
+        self._connect().execute("DELETE FROM background_tasks WHERE id = ?", (task.id,))
+
+    def recover(self) -> List[Task]:
+        """Claim the tasks of processes that exited before running them"""
+        conn = self._connect()
+        me = os.getpid()
+        owners = [row[0] for row in conn.execute("SELECT DISTINCT owner FROM background_tasks")]
+        for owner in owners:
+            if owner != me and not _is_running(owner):
+                conn.execute("UPDATE background_tasks SET owner = ? WHERE owner = ?", (me, owner))
+        rows = conn.execute(
+            "SELECT id, name, payload, attempts FROM background_tasks WHERE owner = ? ORDER BY due", (me,)
+        ).fetchall()
+        return [Task(name, json.loads(payload), attempts, task_id) for task_id, name, payload, attempts in rows]
+
+class TaskQueue:
+    """Bounded in-process queue that runs side effects on worker threads.
+
+    Handlers are registered by name so that durable tasks can be stored
+    as (name, JSON payload) and run again by another process. A failing
+    task is retried with exponential backoff and jitter, up to
+    `max_attempts`; when the queue is full, new tasks are dropped and
+    counted rather than blocking the request that enqueued them.
+    """
+
+    def __init__(
+        self,
+        store=None,
+        max_size: int = TASK_QUEUE_MAX_SIZE,
+        workers: int = TASK_QUEUE_WORKERS,
+        max_attempts: int = TASK_MAX_ATTEMPTS,
+        backoff_seconds: float = TASK_BACKOFF_SECONDS
+    ):
+        self.store = store or MemoryTaskStore()
+        self.max_size = max_size
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self._handlers: Dict[str, Callable[[dict], Any]] = {}
+        self._ready: deque = deque()
+        self._delayed: list = []
+        self._sequence = itertools.count()
+        self._running = 0
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+        self._counts = {"enqueued": 0, "completed": 0, "retried": 0, "failed": 0, "dropped": 0}
+
+    def register(self, name: str, handler: Callable[[dict], Any]) -> None:
+        self._handlers[name] = handler
+
+    def enqueue(self, name: str, payload: dict) -> bool:
+        """Queue a task to run after the caller returns; False if the queue was full"""
+        with self._cond:
+            if len(self._ready) + len(self._delayed) >= self.max_size:
+                self._counts["dropped"] += 1
+                logger.warning("Task queue full; dropped %s", name)
+                return False
+        task = Task(name, payload)
+        self.store.add(task)
+        with self._cond:
+            self._ready.append(task)
+            self._counts["enqueued"] += 1
+            self._cond.notify()
+        if not self._threads:
+            self.start()
+        return True
+
+    def start(self) -> None:
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            recovered = self.store.recover()
+            if recovered:
+                logger.info("Recovered %d queued tasks", len(recovered))
+            self._ready.extend(recovered)
+            self._threads = [
+                threading.Thread(target=self._run, name=f"task-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Finish the tasks that are ready, then stop; retries still waiting are left to the store"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        with self._cond:
+            self._threads = []
+            self._delayed.clear()
+
+    def drain(self, timeout: float = 5.0) -> bool:
+        """Wait until nothing is queued, waiting for a retry or running; False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._ready or self._delayed or self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(min(remaining, 0.05))
+        return True
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                **self._counts,
+                "queued": len(self._ready),
+                "waiting_retry": len(self._delayed),
+                "running": self._running,
+                "max_size": self.max_size,
+                "workers": self.workers,
+            }
+
+    def _next(self) -> Optional[Task]:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    self._ready.append(heapq.heappop(self._delayed)[2])
+                if self._ready:
+                    self._running += 1
+                    return self._ready.popleft()
+                if self._stopping:
+                    return None
+                self._cond.wait(self._delayed[0][0] - now if self._delayed else None)
+
+    def _run(self) -> None:
+        while True:
+            task = self._next()
+            if task is None:
+                return
+            try:
+                self._execute(task)
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._cond.notify_all()
+
+    def _execute(self, task: Task) -> None:
+        handler = self._handlers.get(task.name)
+        if handler is None:
+            logger.error("No handler registered for task %s; discarding it", task.name)
+            self.store.done(task)
+            return
+        try:
+            handler(task.payload)
+        except Exception:
+            task.attempts += 1
+            if task.attempts >= self.max_attempts:
+                logger.exception("Task %s failed %d times; giving up", task.name, task.attempts)
+                self.store.done(task)
+                with self._cond:
+                    self._counts["failed"] += 1
+                return
+            delay = self.backoff_seconds * 2 ** (task.attempts - 1) * random.uniform(0.5, 1.0)
+            logger.warning("Task %s failed; retrying in %.1fs", task.name, delay, exc_info=True)
+            self.store.retry(task, time.time() + delay)
+            with self._cond:
+                self._counts["retried"] += 1
+                heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._sequence), task))
+                self._cond.notify()
+            return
+        self.store.done(task)
+        with self._cond:
+            self._counts["completed"] += 1
+
+def create_task_store(backend: str = TASK_QUEUE_BACKEND):
+    if backend == "sqlite":
+        return SQLiteTaskStore()
+    return MemoryTaskStore()
+
+task_queue = TaskQueue(create_task_store())
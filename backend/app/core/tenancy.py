@@ -0,0 +1,84 @@
+import json
+import os
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional
+from urllib.parse import parse_qs
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Requests name their shop in this header; websockets, which browsers cannot give headers, use ?shop=
+TENANT_HEADER = os.getenv("TENANT_HEADER", "X-Shop-ID")
+
+# Shop-independent endpoints, served without a shop header
+TENANT_EXEMPT_PATHS = frozenset(("/", "/docs", "/redoc", "/openapi.json", "/api/auth/jwks.json"))
+
+# Shop IDs end up in file names, so they are kept to a safe alphabet
+SHOP_ID = re.compile(r"[a-z0-9][a-z0-9_-]{0,62}")
+
+# The shop the current request or background job works for; None without tenancy
+current_shop: ContextVar[Optional[str]] = ContextVar("current_shop", default=None)
+
+def validate_shop_id(shop: str) -> str:
+    if not SHOP_ID.fullmatch(shop):
+        raise ValueError(f"Invalid shop ID {shop!r}: use lowercase letters, digits, '-' and '_'")
+    return shop
+
+@contextmanager
+def shop_scope(shop: Optional[str]) -> Iterator[None]:
+    """Run a block on behalf of a shop, e.g. one pass of a background worker"""
+    token = current_shop.set(shop)
+    try:
+        yield
+    finally:
+        current_shop.reset(token)
+
+class TenantMiddleware:
+    """Sets current_shop for each request from the shop header.
+
+    A plain ASGI middleware, so the shop is set in the context that the
+    endpoint and its dependencies are copied from. Requests without a valid
+    shop get 400, and shops without a database get 404 rather than a new
+    empty one.
+    """
+
+    def __init__(self, app, enabled: Callable[[], bool], exists: Callable[[str], bool], header: str = TENANT_HEADER):
+        self.app = app
+        self.enabled = enabled
+        self.exists = exists
+        self.header = header.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] not in ("http", "websocket")
+            or scope["path"] in TENANT_EXEMPT_PATHS
+            or not self.enabled()
+        ):
+            await self.app(scope, receive, send)
+            return
+        shop = dict(scope["headers"]).get(self.header, b"").decode("latin-1")
+        if not shop and scope["type"] == "websocket":
+            shop = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("shop", [""])[0]
+        if not SHOP_ID.fullmatch(shop):
+            await self._reject(scope, receive, send, 400, f"Missing or invalid {self.header.decode()} header")
+            return
+        if not self.exists(shop):
+            await self._reject(scope, receive, send, 404, "Shop not found")
+            return
+        with shop_scope(shop):
+            await self.app(scope, receive, send)
+
+    async def _reject(self, scope, receive, send, status_code: int, detail: str) -> None:
+        if scope["type"] == "websocket":
+            await send({"type": "websocket.close", "code": 1008})
+            return
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,18 +1,159 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from collections import OrderedDict
+from typing import Callable, List, Optional, Set
+import functools
+import glob
+import logging
 import os
+import re
+import threading
+import time
 from dotenv import load_dotenv
 
+from app.core.tenancy import SHOP_ID, current_shop, validate_shop_id
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sweetshop.db")
+# One database per shop, e.g. sqlite:///./shops/{shop}.db; unset, every request uses DATABASE_URL
+TENANT_DATABASE_URL = os.getenv("TENANT_DATABASE_URL", "")
+# Shop engines kept open at once; the least recently used one is disposed beyond this
+TENANT_ENGINE_CACHE_SIZE = int(os.getenv("TENANT_ENGINE_CACHE_SIZE", 32))
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS_ENABLED", "true").lower() in ("1", "true", "yes")
+QUERY_STATS_MAX_FINGERPRINTS = int(os.getenv("QUERY_STATS_MAX_FINGERPRINTS", 1000))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 100))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger("app.slow_query")
+
+def create_database_engine(url: str) -> Engine:
+    return create_engine(url, connect_args={"check_same_thread": False})
+
+engine = create_database_engine(DATABASE_URL)
+
+class EngineRegistry:
+    """An engine per shop database, opened on first use and kept in an LRU.
+
+    Every shop has its own file, hence its own pool and its own write lock,
+    so a busy shop never makes another one wait. Beyond max_engines the
+    least recently used engine is disposed, closing its idle connections;
+    connections still checked out finish their request and are closed when
+    returned. `prepare` runs once per shop and process, before its engine
+    is first handed out.
+    """
+
+    def __init__(
+        self,
+        url_template: str,
+        max_engines: int = TENANT_ENGINE_CACHE_SIZE,
+        factory: Callable[[str], Engine] = create_database_engine,
+        prepare: Optional[Callable[[Engine], None]] = None
+    ):
+        if "{shop}" not in url_template:
+            raise ValueError(f"{url_template} has no {{shop}} placeholder")
+        self.url_template = url_template
+        self.max_engines = max_engines
+        self.factory = factory
+        self.prepare = prepare
+        self.opened = 0
+        self.evicted = 0
+        self._engines: "OrderedDict[str, Engine]" = OrderedDict()
+        self._prepared: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def url(self, shop: str) -> str:
+        return self.url_template.format(shop=validate_shop_id(shop))
+
+    def path(self, shop: str) -> str:
+        return make_url(self.url(shop)).database
+
+    def exists(self, shop: str) -> bool:
+        return os.path.exists(self.path(shop))
+
+    def shops(self) -> List[str]:
+        """Every shop that has a database file"""
+        template = make_url(self.url_template).database
+        prefix, suffix = template.split("{shop}", 1)
+        found = []
+        for path in sorted(glob.glob(glob.escape(prefix) + "*" + glob.escape(suffix))):
+            shop = path[len(prefix):len(path) - len(suffix)]
+            if SHOP_ID.fullmatch(shop):
+                found.append(shop)
+        return found
+
+    def get(self, shop: str) -> Engine:
+        with self._lock:
+            shop_engine = self._engines.get(shop)
+            if shop_engine is not None:
+                self._engines.move_to_end(shop)
+                return shop_engine
+        # Opening and preparing happen outside the lock, so a slow migration only holds up its own shop
+        shop_engine = self.factory(self.url(shop))
+        if self.prepare is not None and shop not in self._prepared:
+            self.prepare(shop_engine)
+            self._prepared.add(shop)
+        with self._lock:
+            existing = self._engines.get(shop)
+            if existing is not None:
+                shop_engine.dispose()
+                return existing
+            self._engines[shop] = shop_engine
+            self.opened += 1
+            evicted = []
+            while len(self._engines) > self.max_engines:
+                evicted.append(self._engines.popitem(last=False)[1])
+                self.evicted += 1
+        for idle in evicted:
+            idle.dispose()
+        return shop_engine
+
+    def dispose(self) -> None:
+        with self._lock:
+            engines = list(self._engines.values())
+            self._engines.clear()
+        for shop_engine in engines:
+            shop_engine.dispose()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "open": len(self._engines),
+                "max_engines": self.max_engines,
+                "opened": self.opened,
+                "evicted": self.evicted,
+            }
+
+tenant_engines: Optional[EngineRegistry] = EngineRegistry(TENANT_DATABASE_URL) if TENANT_DATABASE_URL else None
+
+def tenancy_enabled() -> bool:
+    return tenant_engines is not None
+
+def shop_exists(shop: str) -> bool:
+    return tenant_engines is not None and tenant_engines.exists(shop)
+
+def each_shop() -> List[Optional[str]]:
+    """The shops a background job has to visit: every shop database, or just None without tenancy"""
+    return tenant_engines.shops() if tenant_engines is not None else [None]
+
+def current_engine() -> Engine:
+    """The current shop's engine, or the shared one without tenancy"""
+    if tenant_engines is None:
+        return engine
+    shop = current_shop.get()
+    if shop is None:
+        raise RuntimeError("No shop selected; run this inside shop_scope()")
+    return tenant_engines.get(shop)
+
+class TenantSessionFactory(sessionmaker):
+    """A sessionmaker binding each new session to the engine of the shop it is made for"""
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+    def __call__(self, **local_kw) -> Session:
+        local_kw.setdefault("bind", current_engine())
+        return super().__call__(**local_kw)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = TenantSessionFactory(autocommit=False, autoflush=False)
 
 Base = declarative_base()
 
@@ -22,4 +163,133 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+class ReadConnection:
+    """Runs Core statements for read-only requests, without an ORM session.
+
+    The pooled connection is only checked out on first use, so a request
+    answered entirely from cache never touches the pool.
+    """
+
+    def __init__(self, bind: Engine):
+        self.bind = bind
+        self._connection = None
+
+    def execute(self, statement, parameters=None):
+        if self._connection is None:
+            self._connection = self.bind.connect()
+        return self._connection.execute(statement, parameters)
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+def get_read_connection():
+    """Dependency for read-only endpoints that return plain rows"""
+    conn = ReadConnection(current_engine())
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|(?<![\w.])\d+(?:\.\d+)?\b")
+_REPEATED_GROUP = re.compile(r"(\((?:\?, )*\?\))(?:, \1)+")
+_PLACEHOLDER_LIST = re.compile(r"\(\?(?:, \?)+\)")
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> str:
+    """Normalize a statement so that executions differing only in values group together"""
+    normalized = " ".join(statement.split())
+    normalized = _LITERAL.sub("?", normalized)
+    normalized = _REPEATED_GROUP.sub(r"\1, ...", normalized)
+    return _PLACEHOLDER_LIST.sub("(?, ...)", normalized)
+
+class QueryStats:
+    """Count, cumulative and worst time per statement fingerprint.
+
+    The cost per statement is one cached fingerprint lookup and a dict update
+    under a lock, so it is meant to stay on in production. Once
+    max_fingerprints distinct statements have been seen, new ones are only
+    counted in `untracked`.
+    """
+
+    def __init__(self, max_fingerprints: int = QUERY_STATS_MAX_FINGERPRINTS):
+        self.max_fingerprints = max_fingerprints
+        self.untracked = 0
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def observe(self, statement: str, elapsed: float, slow: bool = False, plan=None) -> None:
+        key = fingerprint(statement)
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    self.untracked += 1
+                    return
+                entry = self._stats[key] = {"count": 0, "total": 0.0, "max": 0.0, "slow": 0, "plan": None}
+            entry["count"] += 1
+            entry["total"] += elapsed
+            entry["max"] = max(entry["max"], elapsed)
+            if slow:
+                entry["slow"] += 1
+            if plan:
+                entry["plan"] = plan
+
+    def top(self, limit: int = 10, order_by: str = "total") -> list:
+        with self._lock:
+            items = [(key, dict(entry)) for key, entry in self._stats.items()]
+        items.sort(key=lambda item: item[1][order_by], reverse=True)
+        return [
+            {
+                "fingerprint": key,
+                "count": entry["count"],
+                "total_ms": entry["total"] * 1000,
+                "mean_ms": entry["total"] * 1000 / entry["count"],
+                "max_ms": entry["max"] * 1000,
+                "slow_count": entry["slow"],
+                "plan": entry["plan"],
+            }
+            for key, entry in items[:limit]
+        ]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self.untracked = 0
+
+query_stats = QueryStats()
+
+def explain_query_plan(cursor, statement: str, parameters) -> list:
+    """EXPLAIN QUERY PLAN on the raw DBAPI connection, so it is neither timed nor logged itself"""
+    rows = cursor.connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    return [row[-1] for row in rows]
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own context: a statement that raises never reaches
+    # after_cursor_execute, and must not leave anything behind on the connection
+    if QUERY_STATS_ENABLED and context is not None:
+        context.query_started_at = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    started_at = getattr(context, "query_started_at", None)
+    if not QUERY_STATS_ENABLED or started_at is None:
+        return
+    elapsed = time.perf_counter() - started_at
+    slow = elapsed * 1000 >= SLOW_QUERY_MS
+    plan = None
+    if slow:
+        if SLOW_QUERY_EXPLAIN and not executemany and conn.dialect.name == "sqlite":
+            try:
+                plan = explain_query_plan(cursor, statement, parameters)
+            except Exception:
+                logger.debug("Could not explain statement", exc_info=True)
+        logger.warning(
+            "Slow query (%.1f ms): %s | params=%.500r | plan=%s",
+            elapsed * 1000, " ".join(statement.split()), parameters, plan
+        )
+    query_stats.observe(statement, elapsed, slow, plan)
@@ -1,31 +1,94 @@
+import os
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.database import engine, Base
-from app.routers import auth, sweets
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(
-    title="Sweet Shop Management System",
-    description="API for managing a sweet shop",
-    version="1.0.0"
-)
-
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # In production, replace with specific origins
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Include routers
-app.include_router(auth.router)
-app.include_router(sweets.router)
-
-@app.get("/")
-def read_root():
-    return {"message": "Welcome to Sweet Shop Management System API"}
\ No newline at end of file
+from app.database import engine, SessionLocal, shop_exists, tenancy_enabled, tenant_engines
+from app.migrations import run_migrations_once
+from app.routers import auth, sweets, analytics, reservations, admin
+from app.core.cache import start_invalidation_listener, stop_invalidation_listener
+from app.core.coordination import acquire_leadership, release_leadership
+from app.core.tenancy import TenantMiddleware
+from app.core.tasks import task_queue
+from app.services.inventory import LedgerCompactor
+from app.services.reservations import reservation_scheduler
+from app.services.batching import purchase_batcher, PURCHASE_BATCHING
+
+load_dotenv()
+
+# Set by app.server once it has migrated the database for all of its workers
+SKIP_STARTUP_MIGRATIONS = os.getenv("SKIP_STARTUP_MIGRATIONS", "false").lower() in ("1", "true", "yes")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop background workers"""
+    start_invalidation_listener()
+    task_queue.start()
+    # Ledger compaction only needs to run in one worker per host
+    compactor = LedgerCompactor(SessionLocal) if acquire_leadership() else None
+    if compactor:
+        compactor.start()
+    reservation_scheduler.start(SessionLocal)
+    if PURCHASE_BATCHING:
+        purchase_batcher.start(SessionLocal)
+    yield
+    purchase_batcher.stop()
+    reservation_scheduler.stop()
+    if compactor:
+        compactor.stop()
+        release_leadership()
+    task_queue.stop()
+    stop_invalidation_listener()
+    if tenant_engines is not None:
+        tenant_engines.dispose()
+
+def create_app() -> FastAPI:
+    """Build the application without touching the database or starting threads.
+
+    Safe to call in a pre-fork master: everything stateful starts in the
+    lifespan of each worker.
+    """
+    app = FastAPI(
+        title="Sweet Shop Management System",
+        description="API for managing a sweet shop",
+        version="1.0.0",
+        lifespan=lifespan
+    )
+
+    # Picks the shop database for each request; added first so CORS preflights never need a shop
+    app.add_middleware(TenantMiddleware, enabled=tenancy_enabled, exists=shop_exists)
+
+    # CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # In production, replace with specific origins
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Include routers
+    app.include_router(auth.router)
+    app.include_router(sweets.router)
+    app.include_router(analytics.router)
+    app.include_router(reservations.router)
+    app.include_router(admin.router)
+
+    @app.get("/")
+    def read_root():
+        return {"message": "Welcome to Sweet Shop Management System API"}
+
+    return app
+
+# Create database tables and apply pending schema changes
+if tenant_engines is not None:
+    # Shop databases are created by create_admin.py --shop and migrated when a worker first opens them
+    tenant_engines.prepare = run_migrations_once
+elif not SKIP_STARTUP_MIGRATIONS:
+    run_migrations_once(engine)
+    # Don't hand pooled connections to workers forked from this process
+    engine.dispose()
+
+app = create_app()
@@ -0,0 +1,80 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateColumn
+
+from app.core.coordination import file_lock
+from app.database import Base
+from app import models  # noqa: F401  (registers every table on Base.metadata)
+from app.models.category import CategoryFacet
+from app.services.facets import refresh_category_facets
+from app.services import changes  # noqa: F401  (versions every sweet write, including upgrades)
+
+def normalize_categories(conn: Connection) -> None:
+    """Move sweets from a free-form category string to a categories.id foreign key"""
+    columns = {column["name"] for column in inspect(conn).get_columns("sweets")}
+    if "category" not in columns:
+        return
+    conn.execute(text("INSERT OR IGNORE INTO categories (name) SELECT DISTINCT category FROM sweets"))
+    if "category_id" not in columns:
+        conn.execute(text("ALTER TABLE sweets ADD COLUMN category_id INTEGER REFERENCES categories (id)"))
+    conn.execute(text(
+        "UPDATE sweets SET category_id = "
+        "(SELECT id FROM categories WHERE categories.name = sweets.category)"
+    ))
+    conn.execute(text("DROP INDEX IF EXISTS ix_sweets_category"))
+    conn.execute(text("ALTER TABLE sweets DROP COLUMN category"))
+    # The facets were keyed by name; rebuild them by ID
+    conn.execute(text("DROP TABLE IF EXISTS category_facets"))
+    CategoryFacet.__table__.create(conn)
+    refresh_category_facets(conn)
+
+def version_sweets(conn: Connection) -> None:
+    """Add the change-feed version column, numbering existing sweets by ID so a sync from 0 sees them"""
+    columns = {column["name"] for column in inspect(conn).get_columns("sweets")}
+    if "version" in columns:
+        return
+    conn.execute(text("ALTER TABLE sweets ADD COLUMN version INTEGER NOT NULL DEFAULT 0"))
+    conn.execute(text("UPDATE sweets SET version = id"))
+
+# Changes that rewrite existing tables, in the order they were introduced.
+# Each one checks for itself whether it still has anything to do.
+UPGRADES = [
+    normalize_categories,
+    version_sweets,
+]
+
+# Derived tables to fill from existing data when they are first created
+BACKFILLS = {
+    "category_facets": refresh_category_facets,
+    "change_sequence": changes.seed_change_sequence,
+}
+
+def run_migrations(engine: Engine) -> None:
+    """Create missing tables and bring existing ones up to the current models.
+
+    Additive changes are handled generically: new columns (which must have
+    a server default when NOT NULL), new indexes, and backfilling new
+    derived tables. Anything else is an explicit step in UPGRADES.
+    """
+    created = set(Base.metadata.tables) - set(inspect(engine).get_table_names())
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for upgrade in UPGRADES:
+            upgrade(conn)
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=conn.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        for table_name, backfill in BACKFILLS.items():
+            if table_name in created:
+                backfill(conn)
+
+def run_migrations_once(engine: Engine) -> None:
+    """Run migrations while holding a host-wide lock, so workers starting together take turns"""
+    with file_lock("sweetshop-migrate.lock"):
+        run_migrations(engine)
@@ -1,2 +1,8 @@
 from .user import User
-from .sweet import Sweet
\ No newline at end of file
+from .sweet import ChangeSequence, Sweet, SweetTombstone
+from .inventory import InventoryMovement, InventorySnapshot
+from .sales import Purchase, HourlySales, DailySales
+from .idempotency import IdempotencyRecord
+from .reservation import Reservation
+from .category import Category, CategoryFacet
+from .refresh_token import RefreshToken
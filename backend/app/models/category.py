@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from app.database import Base
+
+class Category(Base):
+    __tablename__ = "categories"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False, unique=True, index=True)
+
+class CategoryFacet(Base):
+    """Per-category aggregates of the catalog, maintained on every sweet write"""
+    __tablename__ = "category_facets"
+
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    items = Column(Integer, nullable=False, default=0)
+    min_price = Column(Float, nullable=False)
+    max_price = Column(Float, nullable=False)
+    total_stock = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from app.database import Base
+
+class IdempotencyRecord(Base):
+    """Stored response of a write made with an Idempotency-Key header"""
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(Integer, primary_key=True)
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=False, default=200)
+    response_body = Column(Text, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from app.database import Base
+from app.core.clock import utcnow
+
+# Movement kinds
+SALE = "sale"
+RESTOCK = "restock"
+ADJUSTMENT = "adjustment"
+
+class InventoryMovement(Base):
+    """Append-only record of a single stock change"""
+    __tablename__ = "inventory_movements"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sweet_id = Column(Integer, ForeignKey("sweets.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String, nullable=False)
+    delta = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+
+    __table_args__ = (
+        Index("ix_inventory_movements_sweet_created", "sweet_id", "created_at"),
+    )
+
+class InventorySnapshot(Base):
+    """Stock level of a sweet after folding every movement up to last_movement_id"""
+    __tablename__ = "inventory_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sweet_id = Column(Integer, ForeignKey("sweets.id", ondelete="CASCADE"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    as_of = Column(DateTime, nullable=False)
+    last_movement_id = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_inventory_snapshots_sweet_as_of", "sweet_id", "as_of"),
+    )
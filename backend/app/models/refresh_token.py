@@ -0,0 +1,18 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, LargeBinary
+from app.database import Base
+
+class RefreshToken(Base):
+    """An issued refresh token, kept only as its SHA-256 digest.
+
+    Each login starts a family that every rotation extends; presenting a
+    token that was already rotated revokes the whole family.
+    """
+    __tablename__ = "refresh_tokens"
+    # Keyed by the digest itself, so a renewal is one primary-key lookup
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    token_hash = Column(LargeBinary(32), primary_key=True)
+    family_id = Column(LargeBinary(16), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    used_at = Column(DateTime)
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from app.database import Base
+from app.core.clock import utcnow
+
+# Reservation states; only HELD reservations count towards Sweet.reserved
+HELD = "held"
+CONFIRMED = "confirmed"
+RELEASED = "released"
+EXPIRED = "expired"
+
+class Reservation(Base):
+    """Quantity of a sweet held for a checkout until it is confirmed, released or expires"""
+    __tablename__ = "reservations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sweet_id = Column(Integer, ForeignKey("sweets.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    quantity = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, default=HELD)
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+
+    __table_args__ = (
+        Index("ix_reservations_status_expires", "status", "expires_at"),
+    )
@@ -0,0 +1,40 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
+from app.database import Base
+from app.core.clock import utcnow
+
+class Purchase(Base):
+    """A single completed purchase"""
+    __tablename__ = "purchases"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sweet_id = Column(Integer, ForeignKey("sweets.id", ondelete="SET NULL"), index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), index=True)
+    quantity = Column(Integer, nullable=False)
+    unit_price = Column(Float, nullable=False)
+    amount = Column(Float, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=utcnow, index=True)
+
+class SalesRollupMixin:
+    """Units and revenue of one sweet within one time bucket"""
+    bucket = Column(DateTime, primary_key=True)
+    sweet_id = Column(Integer, primary_key=True)
+    category = Column(String, nullable=False)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+    orders = Column(Integer, nullable=False, default=0)
+
+class HourlySales(SalesRollupMixin, Base):
+    __tablename__ = "sales_hourly"
+
+    __table_args__ = (
+        Index("ix_sales_hourly_sweet_bucket", "sweet_id", "bucket"),
+        Index("ix_sales_hourly_category_bucket", "category", "bucket"),
+    )
+
+class DailySales(SalesRollupMixin, Base):
+    __tablename__ = "sales_daily"
+
+    __table_args__ = (
+        Index("ix_sales_daily_sweet_bucket", "sweet_id", "bucket"),
+        Index("ix_sales_daily_category_bucket", "category", "bucket"),
+    )
@@ -1,11 +1,94 @@
-from sqlalchemy import Column, Integer, String, Float
+from typing import Optional
+
+from sqlalchemy import Column, DateTime, Integer, String, Float, ForeignKey, Index, event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import Session, attributes, relationship
 from app.database import Base
+from app.models.category import Category
 
 class Sweet(Base):
     __tablename__ = "sweets"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False, index=True)
-    category = Column(String, nullable=False, index=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False, index=True)
     price = Column(Float, nullable=False)
-    quantity = Column(Integer, nullable=False, default=0)
\ No newline at end of file
+    quantity = Column(Integer, nullable=False, default=0)
+    reorder_threshold = Column(Integer, nullable=False, default=0, server_default="0")
+    # Units held by pending reservations; maintained on every reservation change
+    reserved = Column(Integer, nullable=False, default=0, server_default="0")
+    # Position of the row's latest change in the catalog's change feed; see app.services.changes
+    version = Column(Integer, nullable=False, default=0, server_default="0", index=True)
+
+    category_ref = relationship(Category, lazy="joined", innerjoin=True)
+
+    __table_args__ = (
+        # Partial covering index: only rows at or below their reorder threshold are
+        # indexed, and it carries every column the low-stock listing returns.
+        Index(
+            "ix_sweets_low_stock",
+            "reorder_threshold", "quantity", "id", "name",
+            sqlite_where=quantity <= reorder_threshold,
+        ),
+    )
+
+    # A category name assigned but not yet resolved to a row; see _resolve_categories
+    _category_name = None
+
+    @hybrid_property
+    def category(self) -> Optional[str]:
+        """The category name; assigning a new name creates the category on flush"""
+        if self._category_name is not None:
+            return self._category_name
+        return self.category_ref.name if self.category_ref is not None else None
+
+    @category.inplace.setter
+    def _category_setter(self, name: str) -> None:
+        self._category_name = name
+        # Make sure the sweet is flushed even if nothing else about it changed
+        attributes.flag_dirty(self)
+
+    @category.inplace.expression
+    @classmethod
+    def _category_expression(cls):
+        return select(Category.name).where(Category.id == cls.category_id).scalar_subquery()
+
+    @property
+    def available(self) -> int:
+        """Stock that can still be sold or reserved"""
+        return self.quantity - (self.reserved or 0)
+
+class SweetTombstone(Base):
+    """Left behind by a deleted sweet so that syncing clients learn about the deletion"""
+    __tablename__ = "sweet_tombstones"
+
+    sweet_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, index=True)
+    deleted_at = Column(DateTime, nullable=False)
+
+class ChangeSequence(Base):
+    """The last change-feed version handed out; a single row that only ever goes up"""
+    __tablename__ = "change_sequence"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+
+def get_or_create_category(session: Session, name: str) -> Category:
+    """The category with this name, inserting it if needed (safe against concurrent inserts)"""
+    session.execute(
+        sqlite_insert(Category).values(name=name).on_conflict_do_nothing(index_elements=[Category.name])
+    )
+    return session.execute(select(Category).where(Category.name == name)).scalar_one()
+
+@event.listens_for(Session, "before_flush")
+def _resolve_categories(session: Session, flush_context, instances) -> None:
+    for sweet in (*session.new, *session.dirty):
+        if isinstance(sweet, Sweet) and sweet._category_name is not None:
+            name = sweet._category_name
+            if sweet.category_ref is None or sweet.category_ref.name != name:
+                with session.no_autoflush:
+                    category = get_or_create_category(session, name)
+                sweet.category_ref = category
+                sweet.category_id = category.id
+            sweet._category_name = None
@@ -0,0 +1,57 @@
+from typing import Literal
+from fastapi import APIRouter, Depends, Query
+
+from app.database import query_stats, tenant_engines, SLOW_QUERY_MS
+from app.core.cache import cache_stats
+from app.core.security import CurrentUser, get_current_admin_user
+from app.core.tasks import task_queue
+from app.services.batching import purchase_batcher
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+@router.get("/purchase-batching")
+def get_purchase_batching_stats(current_user: CurrentUser = Depends(get_current_admin_user)):
+    """Get purchase group-commit settings and batch-size metrics (Admin only)"""
+    return {
+        "enabled": purchase_batcher.running,
+        "window_ms": purchase_batcher.window_ms,
+        "max_batch_size": purchase_batcher.max_batch_size,
+        **purchase_batcher.stats.snapshot()
+    }
+
+@router.get("/caches")
+def get_cache_stats(current_user: CurrentUser = Depends(get_current_admin_user)):
+    """Get entries, size limits and hit/miss counts of every in-process cache (Admin only)"""
+    return cache_stats()
+
+@router.get("/tenants")
+def get_tenant_engine_stats(current_user: CurrentUser = Depends(get_current_admin_user)):
+    """Get how many shop databases this worker has open, opened and evicted (Admin only)"""
+    if tenant_engines is None:
+        return {"enabled": False}
+    return {"enabled": True, **tenant_engines.stats()}
+
+@router.get("/tasks")
+def get_task_queue_stats(current_user: CurrentUser = Depends(get_current_admin_user)):
+    """Get background task queue depth, retries and drops (Admin only)"""
+    return task_queue.stats()
+
+
+@router.get("/slow-queries")
+def get_slow_queries(
+    current_user: CurrentUser = Depends(get_current_admin_user),
+    limit: int = Query(10, ge=1, le=100, description="Number of statement fingerprints"),
+    order_by: Literal["total", "max", "count"] = Query("total", description="Rank by cumulative time, worst time or executions")
+):
+    """Get the most expensive SQL statement fingerprints since startup (Admin only)"""
+    return {
+        "slow_query_ms": SLOW_QUERY_MS,
+        "untracked": query_stats.untracked,
+        "statements": query_stats.top(limit, order_by)
+    }
+
+@router.delete("/slow-queries")
+def reset_slow_queries(current_user: CurrentUser = Depends(get_current_admin_user)):
+    """Start collecting statement statistics afresh (Admin only)"""
+    query_stats.reset()
+    return {"message": "Query statistics reset"}
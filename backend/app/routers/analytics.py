@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.core.snapshots import get_analytics_db
+from app.schemas.analytics import TopSeller, SalesPoint
+from app.core.security import CurrentUser, get_current_admin_user
+from app.services.analytics import top_sellers, sales_timeseries
+
+router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+
+def _as_utc(moment: Optional[datetime]) -> Optional[datetime]:
+    if moment is not None and moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+@router.get("/top", response_model=List[TopSeller])
+def get_top_sellers(
+    db: Session = Depends(get_analytics_db),
+    current_user: CurrentUser = Depends(get_current_admin_user),
+    by: Literal["sweet", "category"] = Query("sweet", description="Rank sweets or categories"),
+    metric: Literal["revenue", "units"] = Query("revenue", description="Ranking metric"),
+    since: Optional[datetime] = Query(None, description="Start of range (UTC, inclusive)"),
+    until: Optional[datetime] = Query(None, description="End of range (UTC, exclusive)"),
+    limit: int = Query(10, ge=1, le=100)
+):
+    """Get the top-selling sweets or categories (Admin only)"""
+    return top_sellers(db, by, metric, _as_utc(since), _as_utc(until), limit)
+
+@router.get("/timeseries", response_model=List[SalesPoint])
+def get_sales_timeseries(
+    db: Session = Depends(get_analytics_db),
+    current_user: CurrentUser = Depends(get_current_admin_user),
+    granularity: Literal["hour", "day"] = Query("hour", description="Bucket size"),
+    since: Optional[datetime] = Query(None, description="Start of range (UTC, inclusive)"),
+    until: Optional[datetime] = Query(None, description="End of range (UTC, exclusive)"),
+    sweet_id: Optional[int] = Query(None, description="Only this sweet"),
+    category: Optional[str] = Query(None, description="Only this category")
+):
+    """Get units sold and revenue per hour or day (Admin only)"""
+    return sales_timeseries(db, granularity, _as_utc(since), _as_utc(until), sweet_id, category)
@@ -1,55 +1,92 @@
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app.models.user import User
-from app.schemas.user import UserCreate, User as UserSchema, Token
+from app.schemas.user import UserCreate, User as UserSchema, Token, RefreshRequest
 from app.core.security import (
-    get_password_hash,
+    hash_password_async,
     verify_password,
     create_access_token,
-    ACCESS_TOKEN_EXPIRE_MINUTES
+    key_set,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    JWT_KEYS_RELOAD_SECONDS
+)
+from app.core.rate_limit import auth_rate_limiter
+from app.services.refresh_tokens import (
+    issue_refresh_token,
+    purge_expired,
+    revoke_refresh_token,
+    rotate_refresh_token
 )
 
 router = APIRouter(prefix="/api/auth", tags=["authentication"])
 
-@router.post("/register", response_model=UserSchema, status_code=status.HTTP_201_CREATED)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    """Register a new user"""
-    # Check if email already exists
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    
-    # Check if username already exists
-    db_user = db.query(User).filter(User.username == user.username).first()
-    if db_user:
+def insert_user(db: Session, user: UserCreate, hashed_password: str) -> dict:
+    """Insert a user with one statement, letting the unique indexes reject duplicates"""
+    try:
+        user_id = db.execute(
+            insert(User)
+            .values(
+                email=user.email,
+                username=user.username,
+                hashed_password=hashed_password,
+                is_admin=False
+            )
+            .returning(User.id)
+        ).scalar_one()
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        message = str(exc.orig)
+        if "email" in message:
+            detail = "Email already registered"
+        elif "username" in message:
+            detail = "Username already taken"
+        else:
+            raise
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Username already taken"
+            detail=detail
         )
-    
-    # Create new user
-    hashed_password = get_password_hash(user.password)
-    db_user = User(
-        email=user.email,
-        username=user.username,
-        hashed_password=hashed_password,
-        is_admin=False
+    return {"id": user_id, "email": user.email, "username": user.username, "is_admin": False}
+
+def issue_tokens(username: str, is_admin: bool, refresh_token: str) -> dict:
+    """Sign a new access token and pair it with the refresh token"""
+    # Create access token with is_admin in payload
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": username, "is_admin": is_admin},
+        expires_delta=access_token_expires
     )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.post("/register", response_model=UserSchema, status_code=status.HTTP_201_CREATED)
+async def register(request: Request, user: UserCreate, db: Session = Depends(get_db)):
+    """Register a new user"""
+    # Throttle before any database or bcrypt work; a shared limiter may wait on its database
+    await run_in_threadpool(auth_rate_limiter.check, request, "register", user.username)
+    
+    hashed_password = await hash_password_async(user.password)
+    db_user = await run_in_threadpool(insert_user, db, user, hashed_password)
+    await run_in_threadpool(auth_rate_limiter.succeeded, "register", user.username)
     return db_user
 
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+def login(
+    request: Request,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: Session = Depends(get_db)
+):
     """Login and get access token"""
+    # Throttle before any database or bcrypt work
+    auth_rate_limiter.check(request, "login", form_data.username)
+    
     # Find user by username
     user = db.query(User).filter(User.username == form_data.username).first()
     if not user or not verify_password(form_data.password, user.hashed_password):
@@ -59,10 +96,42 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Create access token with is_admin in payload
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username, "is_admin": user.is_admin}, 
-        expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    auth_rate_limiter.succeeded("login", user.username)
+    
+    refresh_token = issue_refresh_token(db, user.id)
+    purge_expired(db)
+    db.commit()
+    return issue_tokens(user.username, user.is_admin, refresh_token)
+
+@router.post("/refresh", response_model=Token)
+def refresh(body: RefreshRequest, db: Session = Depends(get_db)):
+    """Trade a refresh token for a new access token and refresh token, without a password"""
+    rotated = rotate_refresh_token(db, body.refresh_token)
+    if rotated is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user_id, refresh_token = rotated
+    user = db.execute(select(User.username, User.is_admin).where(User.id == user_id)).one_or_none()
+    if user is None:
+        # The token outlived its user; nothing enforces the foreign key, so clean up here
+        revoke_refresh_token(db, refresh_token)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return issue_tokens(user.username, user.is_admin, refresh_token)
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(body: RefreshRequest, db: Session = Depends(get_db)):
+    """Revoke a refresh token and every token rotated from the same login"""
+    revoke_refresh_token(db, body.refresh_token)
+
+@router.get("/jwks.json")
+def get_jwks(response: Response):
+    """Public keys that verify our access tokens, by kid"""
+    response.headers["Cache-Control"] = f"public, max-age={int(JWT_KEYS_RELOAD_SECONDS)}"
+    return key_set.jwks()
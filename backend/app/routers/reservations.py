@@ -0,0 +1,145 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Response
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.models.reservation import Reservation, HELD, CONFIRMED, RELEASED
+from app.models.sweet import Sweet
+from app.schemas.reservation import ReservationCreate, Reservation as ReservationSchema
+from app.core.clock import utcnow
+from app.core.security import CurrentUser, get_current_user
+from app.services.events import LOW_STOCK, STOCK_CHANGED, publish
+from app.services.idempotency import IdempotentWrite
+from app.services.inventory import apply_sale
+from app.services.reservations import (
+    hold_stock,
+    finish_reservation,
+    release_hold,
+    expire_reservation,
+    reservation_scheduler
+)
+
+router = APIRouter(prefix="/api/reservations", tags=["reservations"])
+
+def get_own_reservation(db: Session, reservation_id: int, user: CurrentUser) -> Reservation:
+    reservation = db.get(Reservation, reservation_id)
+    if not reservation or (reservation.user_id != user.id and not user.is_admin):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Reservation not found"
+        )
+    return reservation
+
+def ensure_held(db: Session, reservation: Reservation) -> None:
+    if reservation.status == HELD and reservation.expires_at <= utcnow():
+        # The expiry timer has not fired yet; expire it now rather than honour it
+        expire_reservation(db, reservation.id)
+        db.refresh(reservation)
+    if reservation.status != HELD:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Reservation is {reservation.status}"
+        )
+
+@router.post("", response_model=ReservationSchema, status_code=status.HTTP_201_CREATED)
+def create_reservation(
+    reservation: ReservationCreate,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Hold stock of a sweet for a limited time (requires authentication)"""
+    db_sweet = db.query(Sweet).filter(Sweet.id == reservation.sweet_id).first()
+
+    if not db_sweet:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sweet not found"
+        )
+
+    db_reservation = hold_stock(
+        db, db_sweet, current_user.id, reservation.quantity, reservation.ttl_seconds
+    )
+    if db_reservation is None:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Insufficient stock. Only {db_sweet.available} available."
+        )
+    db.commit()
+    db.refresh(db_reservation)
+    reservation_scheduler.schedule(db_reservation.id, db_reservation.expires_at)
+    return db_reservation
+
+@router.get("/{reservation_id}", response_model=ReservationSchema)
+def get_reservation(
+    reservation_id: int,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Get a reservation (requires authentication)"""
+    return get_own_reservation(db, reservation_id, current_user)
+
+@router.post("/{reservation_id}/confirm")
+def confirm_reservation(
+    reservation_id: int,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255)
+):
+    """Turn a held reservation into a purchase (requires authentication)"""
+    write = IdempotentWrite(db, idempotency_key, current_user.id, f"confirm:{reservation_id}", {})
+    if write.replay is not None:
+        return write.respond(response, write.replay)
+
+    reservation = get_own_reservation(db, reservation_id, current_user)
+    ensure_held(db, reservation)
+    if not finish_reservation(db, reservation, CONFIRMED):
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Reservation is no longer held"
+        )
+
+    db_sweet = db.get(Sweet, reservation.sweet_id)
+    if not db_sweet:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sweet not found"
+        )
+
+    low_stock = apply_sale(db, db_sweet, reservation.quantity, reservation.user_id, reserved=True)
+    result = {
+        "message": "Purchase successful",
+        "reservation_id": reservation_id,
+        "sweet_id": db_sweet.id,
+        "name": db_sweet.name,
+        "quantity": db_sweet.quantity,
+        "purchased": reservation.quantity
+    }
+    write.record(result)
+    replay = write.commit()
+    if replay is not None:
+        return write.respond(response, replay)
+
+    # Reloaded together after commit, so the quantity is the one this version describes
+    publish(STOCK_CHANGED, {"sweet_id": db_sweet.id, "quantity": db_sweet.quantity, "version": db_sweet.version})
+    if low_stock:
+        publish(LOW_STOCK, low_stock)
+    return result
+
+@router.post("/{reservation_id}/release", response_model=ReservationSchema)
+def release_reservation(
+    reservation_id: int,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Give up a held reservation (requires authentication)"""
+    reservation = get_own_reservation(db, reservation_id, current_user)
+    ensure_held(db, reservation)
+    if finish_reservation(db, reservation, RELEASED):
+        release_hold(db, reservation)
+    db.commit()
+    db.refresh(reservation)
+    return reservation
@@ -1,18 +1,49 @@
+import asyncio
+from datetime import datetime, timezone
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Response, WebSocket
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from app.database import get_db
-from app.models.sweet import Sweet
-from app.models.user import User
+from app.database import get_db, get_read_connection, ReadConnection
+from app.models.category import Category
+from app.models.sweet import Sweet, SweetTombstone
+from app.models.inventory import RESTOCK, ADJUSTMENT
 from app.schemas.sweet import (
     SweetCreate, 
     SweetUpdate, 
     Sweet as SweetSchema,
+    LowStockItem,
+    Category as CategorySchema,
+    CategoryFacet,
+    SweetChanges,
     PurchaseRequest,
     RestockRequest
 )
-from app.core.security import get_current_user, get_current_admin_user
+from app.schemas.inventory import StockLevel
+from app.core.clock import utcnow
+from app.core.security import CurrentUser, get_current_user, get_current_admin_user, get_user_from_token
+from app.services.inventory import apply_sale, record_movement, stock_at
+from app.services.alerts import check_low_stock
+from app.services.events import LOW_STOCK, STOCK_CHANGED, publish
+from app.services.realtime import current_stock_hub, resume_subscription, serve_subscription
+from app.services.idempotency import IdempotentWrite
+from app.services.batching import purchase_batcher
+from app.services.catalog import (
+    ALL_FIELDS,
+    LISTING_STREAM_THRESHOLD,
+    list_sweets,
+    find_sweets,
+    get_sweets_by_ids,
+    project_sweets,
+    parse_id_list,
+    parse_fields,
+    stream_sweets
+)
+from app.services.facets import category_facets
+from app.services.changes import changes_since
 
 router = APIRouter(prefix="/api/sweets", tags=["sweets"])
 
@@ -20,64 +51,145 @@ router = APIRouter(prefix="/api/sweets", tags=["sweets"])
 def create_sweet(
     sweet: SweetCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """Create a new sweet (requires authentication)"""
     db_sweet = Sweet(
         name=sweet.name,
         category=sweet.category,
         price=sweet.price,
-        quantity=sweet.quantity
+        quantity=sweet.quantity,
+        reorder_threshold=sweet.reorder_threshold
     )
     db.add(db_sweet)
+    if db_sweet.quantity:
+        db.flush()
+        record_movement(db, db_sweet.id, ADJUSTMENT, db_sweet.quantity)
     db.commit()
     db.refresh(db_sweet)
+    publish(STOCK_CHANGED, {"sweet_id": db_sweet.id, "quantity": db_sweet.quantity, "version": db_sweet.version})
     return db_sweet
 
 @router.get("", response_model=List[SweetSchema])
 def get_all_sweets(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    conn: ReadConnection = Depends(get_read_connection),
+    current_user: CurrentUser = Depends(get_current_user),
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    ids: Optional[str] = Query(None, description="Comma-separated sweet IDs, e.g. 1,5,9"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,name,price")
 ):
-    """Get all sweets (requires authentication)"""
-    sweets = db.query(Sweet).offset(skip).limit(limit).all()
-    return sweets
+    """Get all sweets, or only some of them and some of their fields (requires authentication)"""
+    try:
+        id_list = parse_id_list(ids) if ids is not None else None
+        field_list = parse_fields(fields) if fields is not None else None
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+    
+    if id_list is None and limit > LISTING_STREAM_THRESHOLD:
+        return StreamingResponse(
+            stream_sweets(conn.bind, field_list or ALL_FIELDS, skip, limit),
+            media_type="application/json"
+        )
+    if field_list is not None:
+        # Partial rows would not validate against SweetSchema, and need no conversion anyway
+        return JSONResponse(project_sweets(conn, field_list, id_list, skip, limit))
+    if id_list is not None:
+        return get_sweets_by_ids(conn, id_list)
+    return list_sweets(conn, skip, limit)
 
 @router.get("/search", response_model=List[SweetSchema])
 def search_sweets(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    conn: ReadConnection = Depends(get_read_connection),
+    current_user: CurrentUser = Depends(get_current_user),
     name: Optional[str] = Query(None, description="Search by sweet name"),
-    category: Optional[str] = Query(None, description="Filter by category"),
+    category_id: Optional[int] = Query(None, description="Filter by exact category ID"),
+    category: Optional[str] = Query(None, description="Filter by category name substring"),
     min_price: Optional[float] = Query(None, description="Minimum price"),
     max_price: Optional[float] = Query(None, description="Maximum price")
 ):
     """Search for sweets by name, category, or price range (requires authentication)"""
-    query = db.query(Sweet)
-    
-    if name:
-        query = query.filter(Sweet.name.ilike(f"%{name}%"))
-    
-    if category:
-        query = query.filter(Sweet.category.ilike(f"%{category}%"))
-    
-    if min_price is not None:
-        query = query.filter(Sweet.price >= min_price)
-    
-    if max_price is not None:
-        query = query.filter(Sweet.price <= max_price)
+    return find_sweets(conn, name, category_id, category, min_price, max_price)
+
+@router.websocket("/live")
+async def stream_stock_updates(
+    websocket: WebSocket,
+    token: str = Query(..., description="Bearer token"),
+    since: Optional[int] = Query(None, description="Resume after this stock version"),
+    conn: ReadConnection = Depends(get_read_connection)
+):
+    """Stream coalesced stock deltas (requires authentication)"""
+    try:
+        await run_in_threadpool(get_user_from_token, token, conn)
+    except HTTPException:
+        conn.close()
+        # Accepted first: a close before the handshake reaches browsers as a bare 1006, not 1008
+        await websocket.accept()
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
     
-    sweets = query.all()
-    return sweets
+    await websocket.accept()
+    hub = current_stock_hub()
+    subscription = hub.subscribe()
+    try:
+        try:
+            hello = await run_in_threadpool(resume_subscription, subscription, conn, since)
+        finally:
+            # The connection is only needed for the handshake and catch-up, not the socket's lifetime
+            conn.close()
+        await websocket.send_json(hello)
+        await serve_subscription(websocket, subscription)
+    finally:
+        hub.unsubscribe(subscription)
+
+@router.get("/low-stock", response_model=List[LowStockItem])
+def get_low_stock_sweets(
+    conn: ReadConnection = Depends(get_read_connection),
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """List sweets at or below their reorder threshold (Admin only)"""
+    # Matches the predicate of the partial ix_sweets_low_stock index, so only
+    # low-stock rows are read and the table itself is never touched.
+    return conn.execute(
+        select(Sweet.id, Sweet.name, Sweet.quantity, Sweet.reorder_threshold)
+        .where(Sweet.quantity <= Sweet.reorder_threshold)
+    ).mappings().all()
+
+@router.get("/categories", response_model=List[CategorySchema])
+def get_categories(
+    conn: ReadConnection = Depends(get_read_connection),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Get all categories and their IDs (requires authentication)"""
+    return conn.execute(select(Category.id, Category.name).order_by(Category.name)).mappings().all()
+
+@router.get("/facets", response_model=List[CategoryFacet])
+def get_category_facets(
+    conn: ReadConnection = Depends(get_read_connection),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Get item count, price range and total stock per category (requires authentication)"""
+    return category_facets(conn)
+
+@router.get("/changes", response_model=SweetChanges)
+def get_sweet_changes(
+    conn: ReadConnection = Depends(get_read_connection),
+    current_user: CurrentUser = Depends(get_current_user),
+    since: int = Query(0, ge=0, description="Version returned by the previous sync; 0 for everything"),
+    limit: int = Query(500, ge=1, le=1000, description="Maximum changes per page")
+):
+    """Get sweets created, updated or deleted since a version, for incremental sync (requires authentication)"""
+    return changes_since(conn, since, limit)
 
 @router.put("/{sweet_id}", response_model=SweetSchema)
 def update_sweet(
     sweet_id: int,
     sweet_update: SweetUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """Update a sweet's details (requires authentication)"""
     db_sweet = db.query(Sweet).filter(Sweet.id == sweet_id).first()
@@ -89,19 +201,32 @@ def update_sweet(
         )
     
     # Update only provided fields
+    previous_quantity = db_sweet.quantity
+    previous_threshold = db_sweet.reorder_threshold
     update_data = sweet_update.model_dump(exclude_unset=True)
+    if update_data.get("quantity") is not None and update_data["quantity"] < db_sweet.reserved:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Quantity cannot be below the {db_sweet.reserved} units currently reserved"
+        )
+    if update_data.get("quantity") is not None and update_data["quantity"] != db_sweet.quantity:
+        record_movement(db, db_sweet.id, ADJUSTMENT, update_data["quantity"] - db_sweet.quantity)
     for field, value in update_data.items():
         setattr(db_sweet, field, value)
+    low_stock = check_low_stock(db_sweet, previous_quantity, previous_threshold)
     
     db.commit()
     db.refresh(db_sweet)
+    publish(STOCK_CHANGED, {"sweet_id": db_sweet.id, "quantity": db_sweet.quantity, "version": db_sweet.version})
+    if low_stock:
+        publish(LOW_STOCK, low_stock)
     return db_sweet
 
 @router.delete("/{sweet_id}")
 def delete_sweet(
     sweet_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: CurrentUser = Depends(get_current_admin_user)
 ):
     """Delete a sweet (Admin only)"""
     db_sweet = db.query(Sweet).filter(Sweet.id == sweet_id).first()
@@ -114,16 +239,42 @@ def delete_sweet(
     
     db.delete(db_sweet)
     db.commit()
+    tombstone = db.get(SweetTombstone, sweet_id)
+    publish(STOCK_CHANGED, {"sweet_id": sweet_id, "quantity": None, "version": tombstone.version, "deleted": True})
     return {"message": "Sweet deleted successfully"}
 
 @router.post("/{sweet_id}/purchase")
-def purchase_sweet(
+async def purchase_sweet(
     sweet_id: int,
     purchase: PurchaseRequest,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255)
 ):
     """Purchase a sweet, decreasing its quantity (requires authentication)"""
+    if purchase_batcher.running and not idempotency_key:
+        # Group commit: resolves once the batch holding this purchase has committed.
+        # Keyed purchases keep their own transaction so the stored response stays atomic.
+        future = purchase_batcher.submit(sweet_id, purchase.quantity, current_user.id)
+        return await asyncio.wrap_future(future)
+    return await run_in_threadpool(
+        purchase_now, sweet_id, purchase, response, db, current_user, idempotency_key
+    )
+
+def purchase_now(
+    sweet_id: int,
+    purchase: PurchaseRequest,
+    response: Response,
+    db: Session,
+    current_user: CurrentUser,
+    idempotency_key: Optional[str]
+) -> dict:
+    """Purchase a sweet in its own transaction"""
+    write = IdempotentWrite(db, idempotency_key, current_user.id, f"purchase:{sweet_id}", purchase.model_dump())
+    if write.replay is not None:
+        return write.respond(response, write.replay)
+    
     db_sweet = db.query(Sweet).filter(Sweet.id == sweet_id).first()
     
     if not db_sweet:
@@ -132,32 +283,45 @@ def purchase_sweet(
             detail="Sweet not found"
         )
     
-    if db_sweet.quantity < purchase.quantity:
+    if db_sweet.available < purchase.quantity:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Insufficient stock. Only {db_sweet.quantity} available."
+            detail=f"Insufficient stock. Only {db_sweet.available} available."
         )
     
-    db_sweet.quantity -= purchase.quantity
-    db.commit()
-    db.refresh(db_sweet)
-    
-    return {
+    low_stock = apply_sale(db, db_sweet, purchase.quantity, current_user.id)
+    result = {
         "message": "Purchase successful",
         "sweet_id": db_sweet.id,
         "name": db_sweet.name,
         "quantity": db_sweet.quantity,
         "purchased": purchase.quantity
     }
+    write.record(result)
+    replay = write.commit()
+    if replay is not None:
+        return write.respond(response, replay)
+    
+    # Reloaded together after commit, so the quantity is the one this version describes
+    publish(STOCK_CHANGED, {"sweet_id": sweet_id, "quantity": db_sweet.quantity, "version": db_sweet.version})
+    if low_stock:
+        publish(LOW_STOCK, low_stock)
+    return result
 
 @router.post("/{sweet_id}/restock")
 def restock_sweet(
     sweet_id: int,
     restock: RestockRequest,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: CurrentUser = Depends(get_current_admin_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255)
 ):
     """Restock a sweet, increasing its quantity (Admin only)"""
+    write = IdempotentWrite(db, idempotency_key, current_user.id, f"restock:{sweet_id}", restock.model_dump())
+    if write.replay is not None:
+        return write.respond(response, write.replay)
+    
     db_sweet = db.query(Sweet).filter(Sweet.id == sweet_id).first()
     
     if not db_sweet:
@@ -167,13 +331,48 @@ def restock_sweet(
         )
     
     db_sweet.quantity += restock.quantity
-    db.commit()
-    db.refresh(db_sweet)
-    
-    return {
+    record_movement(db, db_sweet.id, RESTOCK, restock.quantity)
+    result = {
         "message": "Restock successful",
         "sweet_id": db_sweet.id,
         "name": db_sweet.name,
         "quantity": db_sweet.quantity,
         "restocked": restock.quantity
-    }
\ No newline at end of file
+    }
+    write.record(result)
+    replay = write.commit()
+    if replay is not None:
+        return write.respond(response, replay)
+    
+    # Reloaded together after commit, so the quantity is the one this version describes
+    publish(STOCK_CHANGED, {"sweet_id": sweet_id, "quantity": db_sweet.quantity, "version": db_sweet.version})
+    return result
+
+@router.get("/{sweet_id}/stock", response_model=StockLevel)
+def get_stock_level(
+    sweet_id: int,
+    at: Optional[datetime] = Query(None, description="Point in time (UTC); defaults to now"),
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """Get a sweet's stock level, optionally as of a past point in time (Admin only)"""
+    db_sweet = db.query(Sweet).filter(Sweet.id == sweet_id).first()
+    
+    if not db_sweet:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sweet not found"
+        )
+    
+    if at is None:
+        return {"sweet_id": db_sweet.id, "quantity": db_sweet.quantity, "at": utcnow()}
+    
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    quantity = stock_at(db, sweet_id, at)
+    if quantity is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Stock history for that time has been compacted"
+        )
+    return {"sweet_id": sweet_id, "quantity": quantity, "at": at}
\ No newline at end of file
@@ -1,2 +1,5 @@
 from .user import UserCreate, UserLogin, User, Token, TokenData
-from .sweet import SweetCreate, SweetUpdate, Sweet, PurchaseRequest, RestockRequest
\ No newline at end of file
+from .sweet import SweetCreate, SweetUpdate, Sweet, LowStockItem, Category, CategoryFacet, PurchaseRequest, RestockRequest
+from .inventory import StockLevel
+from .analytics import TopSeller, SalesPoint
+from .reservation import ReservationCreate, Reservation
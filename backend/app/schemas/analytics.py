@@ -0,0 +1,16 @@
+from datetime import datetime
+from pydantic import BaseModel
+
+class TopSeller(BaseModel):
+    sweet_id: int | None = None
+    name: str | None = None
+    category: str | None = None
+    units: int
+    revenue: float
+    orders: int
+
+class SalesPoint(BaseModel):
+    bucket: datetime
+    units: int
+    revenue: float
+    orders: int
@@ -0,0 +1,7 @@
+from datetime import datetime
+from pydantic import BaseModel
+
+class StockLevel(BaseModel):
+    sweet_id: int
+    quantity: int
+    at: datetime
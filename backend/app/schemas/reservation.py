@@ -0,0 +1,29 @@
+import os
+from datetime import datetime
+from dotenv import load_dotenv
+from pydantic import BaseModel, ConfigDict, Field
+
+load_dotenv()
+
+RESERVATION_DEFAULT_TTL_SECONDS = int(os.getenv("RESERVATION_DEFAULT_TTL_SECONDS", 600))
+RESERVATION_MAX_TTL_SECONDS = int(os.getenv("RESERVATION_MAX_TTL_SECONDS", 3600))
+
+class ReservationCreate(BaseModel):
+    sweet_id: int
+    quantity: int = Field(..., gt=0)
+    ttl_seconds: int = Field(
+        RESERVATION_DEFAULT_TTL_SECONDS,
+        ge=1,
+        le=RESERVATION_MAX_TTL_SECONDS,
+        description="How long to hold the stock"
+    )
+
+class Reservation(BaseModel):
+    id: int
+    sweet_id: int
+    quantity: int
+    status: str
+    expires_at: datetime
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
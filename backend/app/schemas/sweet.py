@@ -5,6 +5,7 @@ class SweetBase(BaseModel):
     category: str = Field(..., min_length=1)
     price: float = Field(..., gt=0, description="Price in rupees")
     quantity: int = Field(..., ge=0)
+    reorder_threshold: int = Field(0, ge=0, description="Stock level at or below which to reorder")
 
 class SweetCreate(SweetBase):
     pass
@@ -14,15 +15,55 @@ class SweetUpdate(BaseModel):
     category: str | None = None
     price: float | None = Field(None, gt=0, description="Price in rupees")
     quantity: int | None = Field(None, ge=0)
+    reorder_threshold: int | None = Field(None, ge=0)
 
 class Sweet(SweetBase):
     id: int
+    category_id: int | None = None
+    reserved: int = 0
+    available: int | None = None
+    version: int = 0
 
     class Config:
         from_attributes = True
 
+class LowStockItem(BaseModel):
+    id: int
+    name: str
+    quantity: int
+    reorder_threshold: int
+
+    class Config:
+        from_attributes = True
+
+class Category(BaseModel):
+    id: int
+    name: str
+
+    class Config:
+        from_attributes = True
+
+class CategoryFacet(BaseModel):
+    category_id: int
+    category: str
+    items: int
+    min_price: float
+    max_price: float
+    total_stock: int
+
+class SweetChange(BaseModel):
+    id: int
+    version: int
+    deleted: bool = False
+    sweet: Sweet | None = None
+
+class SweetChanges(BaseModel):
+    version: int = Field(..., description="Pass as since to fetch the next changes")
+    has_more: bool
+    changes: list[SweetChange]
+
 class PurchaseRequest(BaseModel):
     quantity: int = Field(..., gt=0)
 
 class RestockRequest(BaseModel):
-    quantity: int = Field(..., gt=0)
\ No newline at end of file
+    quantity: int = Field(..., gt=0)
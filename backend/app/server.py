@@ -0,0 +1,48 @@
+"""Multi-process server entry point.
+
+    python -m app.server --workers 4
+
+Migrates the database once, then starts uvicorn with one process per
+worker. With more than one worker, caches are kept coherent, and stock
+changes reach the live feed (/api/sweets/live) of every worker, through the
+SQLite invalidation channel unless CACHE_INVALIDATION_BACKEND says
+otherwise. For gunicorn, see gunicorn.conf.py next to this package.
+"""
+import argparse
+import os
+
+import uvicorn
+from dotenv import load_dotenv
+
+from app.database import engine, tenancy_enabled
+from app.migrations import run_migrations_once
+
+load_dotenv()
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", 8000))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+
+def prepare_workers(workers: int) -> None:
+    """Do the one-off startup work in the parent and tell the workers to skip it"""
+    # Shop databases are migrated by the first worker that opens each of them
+    if not tenancy_enabled():
+        run_migrations_once(engine)
+        engine.dispose()
+    os.environ["SKIP_STARTUP_MIGRATIONS"] = "true"
+    if workers > 1:
+        os.environ.setdefault("CACHE_INVALIDATION_BACKEND", "sqlite")
+        os.environ.setdefault("RATE_LIMIT_BACKEND", "sqlite")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the Sweet Shop API")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    args = parser.parse_args()
+
+    prepare_workers(args.workers)
+    uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import logging
+import os
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from app.core.tasks import task_queue
+from app.core.tenancy import current_shop
+from app.models.sweet import Sweet
+from app.services.events import LOW_STOCK, subscribe
+
+load_dotenv()
+
+LOW_STOCK_WEBHOOK_URL = os.getenv("LOW_STOCK_WEBHOOK_URL")
+
+logger = logging.getLogger(__name__)
+
+def is_low_stock(quantity: int, reorder_threshold: int) -> bool:
+    return quantity <= reorder_threshold
+
+def check_low_stock(
+    sweet: Sweet,
+    previous_quantity: int,
+    previous_threshold: Optional[int] = None
+) -> Optional[dict]:
+    """Return a low-stock event if this change moved the sweet to or below its reorder threshold"""
+    if previous_threshold is None:
+        previous_threshold = sweet.reorder_threshold
+    if is_low_stock(previous_quantity, previous_threshold):
+        return None
+    if not is_low_stock(sweet.quantity, sweet.reorder_threshold):
+        return None
+    event = {
+        "sweet_id": sweet.id,
+        "name": sweet.name,
+        "quantity": sweet.quantity,
+        "reorder_threshold": sweet.reorder_threshold,
+    }
+    # Sweet IDs are per shop, so the webhook has to be told which shop they belong to
+    if current_shop.get() is not None:
+        event["shop"] = current_shop.get()
+    return event
+
+def log_low_stock(event: dict) -> None:
+    logger.warning(
+        "Low stock: %s (id=%s) has %s left, reorder threshold %s",
+        event["name"], event["sweet_id"], event["quantity"], event["reorder_threshold"]
+    )
+
+def post_low_stock_webhook(event: dict) -> None:
+    """Deliver the event to the configured webhook; raising lets the task queue retry it"""
+    httpx.post(LOW_STOCK_WEBHOOK_URL, json=event, timeout=5.0).raise_for_status()
+
+def queue_low_stock_webhook(event: dict) -> None:
+    task_queue.enqueue("low_stock_webhook", event)
+
+task_queue.register("low_stock_webhook", post_low_stock_webhook)
+subscribe(LOW_STOCK, log_low_stock)
+if LOW_STOCK_WEBHOOK_URL:
+    subscribe(LOW_STOCK, queue_low_stock_webhook)
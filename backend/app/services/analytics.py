@@ -0,0 +1,161 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.clock import utcnow
+from app.models.category import Category
+from app.models.sales import Purchase, HourlySales, DailySales
+from app.models.sweet import Sweet
+
+ROLLUPS = {"hour": HourlySales, "day": DailySales}
+
+def hour_bucket(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def day_bucket(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def record_sale(db: Session, sweet: Sweet, quantity: int, user_id: Optional[int]) -> None:
+    """Record a purchase and fold it into the hourly and daily rollups in the caller's transaction"""
+    record_sales(db, sweet, [(quantity, user_id)])
+
+def record_sales(db: Session, sweet: Sweet, sales: List[Tuple[int, Optional[int]]]) -> None:
+    """Record several (quantity, user_id) purchases of one sweet with a single rollup update each"""
+    if not sales:
+        return
+    now = utcnow()
+    db.add_all([
+        Purchase(
+            sweet_id=sweet.id,
+            user_id=user_id,
+            quantity=quantity,
+            unit_price=sweet.price,
+            amount=sweet.price * quantity,
+            created_at=now,
+        )
+        for quantity, user_id in sales
+    ])
+    units = sum(quantity for quantity, _ in sales)
+    for model, bucket in ((HourlySales, hour_bucket(now)), (DailySales, day_bucket(now))):
+        stmt = sqlite_insert(model).values(
+            bucket=bucket,
+            sweet_id=sweet.id,
+            category=sweet.category,
+            units=units,
+            revenue=sweet.price * units,
+            orders=len(sales),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[model.bucket, model.sweet_id],
+            set_={
+                "category": stmt.excluded.category,
+                "units": model.units + stmt.excluded.units,
+                "revenue": model.revenue + stmt.excluded.revenue,
+                "orders": model.orders + stmt.excluded.orders,
+            },
+        )
+        db.execute(stmt)
+
+def _pick_rollup(since: Optional[datetime], until: Optional[datetime]):
+    """Use the daily rollup when the range is day-aligned, otherwise the hourly one"""
+    for moment in (since, until):
+        if moment is not None and moment != day_bucket(moment):
+            return HourlySales
+    return DailySales
+
+def _in_range(model, since: Optional[datetime], until: Optional[datetime]) -> list:
+    conditions = []
+    if since is not None:
+        conditions.append(model.bucket >= since)
+    if until is not None:
+        conditions.append(model.bucket < until)
+    return conditions
+
+def top_sellers(
+    db: Session,
+    by: str = "sweet",
+    metric: str = "revenue",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 10,
+) -> List[dict]:
+    """Top-N sweets or categories by units or revenue, read from the rollups"""
+    model = _pick_rollup(since, until)
+    units = func.sum(model.units).label("units")
+    revenue = func.sum(model.revenue).label("revenue")
+    orders = func.sum(model.orders).label("orders")
+    order_by = units if metric == "units" else revenue
+
+    if by == "category":
+        rows = db.execute(
+            select(model.category, units, revenue, orders)
+            .where(*_in_range(model, since, until))
+            .group_by(model.category)
+            .order_by(order_by.desc())
+            .limit(limit)
+        ).all()
+        return [
+            {"category": category, "units": u, "revenue": r, "orders": o}
+            for category, u, r, o in rows
+        ]
+
+    ranked = (
+        select(model.sweet_id, units, revenue, orders)
+        .where(*_in_range(model, since, until))
+        .group_by(model.sweet_id)
+        .order_by(order_by.desc())
+        .limit(limit)
+        .subquery()
+    )
+    rows = db.execute(
+        select(ranked, Sweet.name, Category.name.label("category"))
+        .outerjoin(Sweet, Sweet.id == ranked.c.sweet_id)
+        .outerjoin(Category, Category.id == Sweet.category_id)
+        .order_by(ranked.c.units.desc() if metric == "units" else ranked.c.revenue.desc())
+    ).all()
+    return [
+        {
+            "sweet_id": row.sweet_id,
+            "name": row.name,
+            "category": row.category,
+            "units": row.units,
+            "revenue": row.revenue,
+            "orders": row.orders,
+        }
+        for row in rows
+    ]
+
+def sales_timeseries(
+    db: Session,
+    granularity: str = "hour",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    sweet_id: Optional[int] = None,
+    category: Optional[str] = None,
+) -> List[dict]:
+    """Units and revenue per time bucket, optionally for one sweet or category"""
+    model = ROLLUPS[granularity]
+    conditions = _in_range(model, since, until)
+    if sweet_id is not None:
+        conditions.append(model.sweet_id == sweet_id)
+    if category is not None:
+        conditions.append(model.category == category)
+
+    rows = db.execute(
+        select(
+            model.bucket,
+            func.sum(model.units),
+            func.sum(model.revenue),
+            func.sum(model.orders),
+        )
+        .where(*conditions)
+        .group_by(model.bucket)
+        .order_by(model.bucket)
+    ).all()
+    return [
+        {"bucket": bucket, "units": u, "revenue": r, "orders": o}
+        for bucket, u, r, o in rows
+    ]
@@ -0,0 +1,282 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from sqlalchemy.orm import sessionmaker
+
+from app.core.tenancy import current_shop, shop_scope
+from app.models.inventory import SALE
+from app.models.sweet import Sweet
+from app.services.alerts import check_low_stock
+from app.services.analytics import record_sales
+from app.services.events import LOW_STOCK, STOCK_CHANGED, publish
+from app.services.inventory import adjust_stock, record_movements
+
+load_dotenv()
+
+PURCHASE_BATCHING = os.getenv("PURCHASE_BATCHING", "false").lower() in ("1", "true", "yes")
+PURCHASE_BATCH_WINDOW_MS = int(os.getenv("PURCHASE_BATCH_WINDOW_MS", 5))
+PURCHASE_BATCH_MAX_SIZE = int(os.getenv("PURCHASE_BATCH_MAX_SIZE", 1000))
+
+logger = logging.getLogger(__name__)
+
+class PurchaseIntent:
+    __slots__ = ("sweet_id", "quantity", "user_id", "shop", "future")
+
+    def __init__(self, sweet_id: int, quantity: int, user_id: Optional[int], shop: Optional[str] = None):
+        self.sweet_id = sweet_id
+        self.quantity = quantity
+        self.user_id = user_id
+        self.shop = shop
+        self.future: Future = Future()
+
+class BatchStats:
+    """Counters describing how purchases were grouped into transactions"""
+
+    # Upper bounds of the batch-size histogram buckets; the last bucket is open-ended
+    BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.purchases = 0
+        self.rejected = 0
+        self.failed_batches = 0
+        self.max_batch_size = 0
+        self.histogram = [0] * (len(self.BUCKETS) + 1)
+
+    def observe(self, size: int, rejected: int) -> None:
+        with self._lock:
+            self.batches += 1
+            self.purchases += size
+            self.rejected += rejected
+            self.max_batch_size = max(self.max_batch_size, size)
+            for index, bound in enumerate(self.BUCKETS):
+                if size <= bound:
+                    self.histogram[index] += 1
+                    break
+            else:
+                self.histogram[-1] += 1
+
+    def observe_failure(self) -> None:
+        with self._lock:
+            self.failed_batches += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [f"<={bound}" for bound in self.BUCKETS] + [f">{self.BUCKETS[-1]}"]
+            return {
+                "batches": self.batches,
+                "purchases": self.purchases,
+                "rejected": self.rejected,
+                "failed_batches": self.failed_batches,
+                "max_batch_size": self.max_batch_size,
+                "mean_batch_size": self.purchases / self.batches if self.batches else 0.0,
+                "batch_size_histogram": dict(zip(labels, self.histogram)),
+            }
+
+class PurchaseBatcher:
+    """Queues purchase intents per sweet and commits them together every few milliseconds.
+
+    Intents for the same sweet are applied in arrival order, so each caller
+    sees exactly the result it would have got from a serial purchase_sweet.
+    Queues are kept per shop and sweet, and a batch never spans two shops,
+    since each shop commits to its own database.
+    """
+
+    def __init__(
+        self,
+        window_ms: int = PURCHASE_BATCH_WINDOW_MS,
+        max_batch_size: int = PURCHASE_BATCH_MAX_SIZE,
+        session_factory: Optional[sessionmaker] = None
+    ):
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+        self.stats = BatchStats()
+        self._lock = threading.Lock()
+        self._queues: "OrderedDict[Tuple[Optional[str], int], List[PurchaseIntent]]" = OrderedDict()
+        self._queued = 0
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._session_factory = session_factory
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, session_factory: Optional[sessionmaker] = None) -> None:
+        if session_factory is not None:
+            self._session_factory = session_factory
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="purchase-batcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, sweet_id: int, quantity: int, user_id: Optional[int]) -> Future:
+        """Queue a purchase; the future resolves to the response body or an HTTPException"""
+        intent = PurchaseIntent(sweet_id, quantity, user_id, current_shop.get())
+        with self._lock:
+            self._queues.setdefault((intent.shop, sweet_id), []).append(intent)
+            self._queued += 1
+        self._wakeup.set()
+        return intent.future
+
+    def _run(self) -> None:
+        while not (self._stopping and not self._queued):
+            self._wakeup.wait()
+            if self.window_ms and not self._stopping:
+                # Let more purchases for the same hot sweets arrive
+                time.sleep(self.window_ms / 1000)
+            self._wakeup.clear()
+            self.flush()
+
+    def _take_batch(self) -> Tuple[Optional[str], Dict[int, List[PurchaseIntent]]]:
+        """The oldest shop's queued intents, up to max_batch_size"""
+        batch: Dict[int, List[PurchaseIntent]] = {}
+        size = 0
+        with self._lock:
+            if not self._queues:
+                return None, batch
+            shop = next(iter(self._queues))[0]
+            for key in [key for key in self._queues if key[0] == shop]:
+                if size >= self.max_batch_size:
+                    break
+                intents = self._queues[key]
+                room = self.max_batch_size - size
+                batch[key[1]] = intents[:room]
+                if len(intents) > room:
+                    self._queues[key] = intents[room:]
+                else:
+                    del self._queues[key]
+                size += len(batch[key[1]])
+            self._queued -= size
+            if self._queued:
+                self._wakeup.set()
+        return shop, batch
+
+    def flush(self) -> int:
+        """Apply one batch of queued intents in a single transaction; returns its size"""
+        shop, batch = self._take_batch()
+        if not batch:
+            return 0
+        with shop_scope(shop):
+            return self._flush(batch)
+
+    def _flush(self, batch: Dict[int, List[PurchaseIntent]]) -> int:
+        intents = [intent for queued in batch.values() for intent in queued]
+        try:
+            outcomes, events = self._apply(batch)
+        except Exception as exc:
+            logger.exception("Purchase batch of %d failed", len(intents))
+            self.stats.observe_failure()
+            for intent in intents:
+                intent.future.set_exception(exc)
+            return len(intents)
+
+        # Count the batch before waking any caller so its stats are never behind
+        rejected = sum(isinstance(outcome, Exception) for outcome in outcomes)
+        self.stats.observe(len(intents), rejected)
+        for intent, outcome in zip(intents, outcomes):
+            if isinstance(outcome, Exception):
+                intent.future.set_exception(outcome)
+            else:
+                intent.future.set_result(outcome)
+        for topic, payload in events:
+            publish(topic, payload)
+        return len(intents)
+
+    def _apply(self, batch: Dict[int, List[PurchaseIntent]]):
+        db = self._session_factory()
+        try:
+            sweets = {
+                sweet.id: sweet
+                for sweet in db.query(Sweet).filter(Sweet.id.in_(list(batch))).all()
+            }
+            outcomes = []
+            events = []
+            movements = []
+            sold_sweets = []
+            for sweet_id, intents in batch.items():
+                sweet = sweets.get(sweet_id)
+                if sweet is None:
+                    outcomes.extend(
+                        HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sweet not found")
+                        for _ in intents
+                    )
+                    continue
+
+                sold, sweet_outcomes = self._allocate(sweet, intents)
+                if sold and not adjust_stock(db, sweet, Sweet.quantity - Sweet.reserved >= sold, quantity=-sold):
+                    # Stock changed since it was read; the failed UPDATE holds the write lock, so this read is final
+                    db.refresh(sweet)
+                    sold, sweet_outcomes = self._allocate(sweet, intents)
+                    if sold:
+                        adjust_stock(db, sweet, Sweet.quantity - Sweet.reserved >= sold, quantity=-sold)
+                outcomes.extend(sweet_outcomes)
+
+                previous_quantity = sweet.quantity + sold
+                sales = [
+                    (intent.quantity, intent.user_id)
+                    for intent, outcome in zip(intents, sweet_outcomes)
+                    if not isinstance(outcome, HTTPException)
+                ]
+                movements.extend((sweet_id, SALE, -quantity) for quantity, _ in sales)
+                if sales:
+                    record_sales(db, sweet, sales)
+                    sold_sweets.append(sweet)
+                    low_stock = check_low_stock(sweet, previous_quantity)
+                    if low_stock:
+                        events.append((LOW_STOCK, low_stock))
+
+            record_movements(db, movements)
+            # Versions are assigned when the sweets are flushed
+            db.flush()
+            events.extend(
+                (STOCK_CHANGED, {"sweet_id": sweet.id, "quantity": sweet.quantity, "version": sweet.version})
+                for sweet in sold_sweets
+            )
+            db.commit()
+            return outcomes, events
+        finally:
+            db.close()
+
+    @staticmethod
+    def _allocate(sweet: Sweet, intents: List[PurchaseIntent]) -> Tuple[int, list]:
+        """Decide which intents the sweet's available stock covers, in arrival order"""
+        available = sweet.available
+        quantity = sweet.quantity
+        sold = 0
+        outcomes = []
+        for intent in intents:
+            if available < intent.quantity:
+                outcomes.append(HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Insufficient stock. Only {available} available."
+                ))
+                continue
+            available -= intent.quantity
+            quantity -= intent.quantity
+            sold += intent.quantity
+            outcomes.append({
+                "message": "Purchase successful",
+                "sweet_id": sweet.id,
+                "name": sweet.name,
+                "quantity": quantity,
+                "purchased": intent.quantity
+            })
+        return sold, outcomes
+
+purchase_batcher = PurchaseBatcher()
@@ -0,0 +1,209 @@
+import json
+import math
+import os
+from typing import Iterator, List, Optional, Sequence, Set, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, attributes
+
+from app.core.cache import WILDCARD_TAG, LocalCache, TaggedCache, invalidate_on_commit
+from app.database import ReadConnection
+from app.models.category import Category
+from app.models.sweet import Sweet
+
+load_dotenv()
+
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", 256))
+MAX_BATCH_IDS = int(os.getenv("MAX_BATCH_IDS", 200))
+# Pages larger than this are streamed in chunks of LISTING_CHUNK_ROWS instead of built and cached whole
+LISTING_STREAM_THRESHOLD = int(os.getenv("LISTING_STREAM_THRESHOLD", 1000))
+LISTING_CHUNK_ROWS = int(os.getenv("LISTING_CHUNK_ROWS", 1000))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 1024))
+# Larger results are served but not cached, so a few broad searches cannot fill memory
+SEARCH_CACHE_MAX_ROWS = int(os.getenv("SEARCH_CACHE_MAX_ROWS", 500))
+# Widen price bounds to multiples of this before caching, then filter exactly; 0 disables
+SEARCH_PRICE_BUCKET = float(os.getenv("SEARCH_PRICE_BUCKET", 0))
+
+# Columns a sparse fieldset may ask for, as SQL expressions
+SWEET_FIELDS = {
+    "id": Sweet.id,
+    "name": Sweet.name,
+    "category_id": Sweet.category_id,
+    "category": Category.name,
+    "price": Sweet.price,
+    "quantity": Sweet.quantity,
+    "reorder_threshold": Sweet.reorder_threshold,
+    "reserved": Sweet.reserved,
+    "available": Sweet.quantity - Sweet.reserved,
+    "version": Sweet.version,
+}
+ALL_FIELDS = list(SWEET_FIELDS)
+
+# Serialized pages of the sweets listing, keyed by (skip, limit)
+catalog_cache = LocalCache("catalog", max_entries=CATALOG_CACHE_SIZE)
+
+@event.listens_for(Sweet, "after_insert")
+@event.listens_for(Sweet, "after_update")
+@event.listens_for(Sweet, "after_delete")
+def _invalidate_catalog(mapper, connection, target: Sweet) -> None:
+    # Only ORM writes are seen here; bulk UPDATEs of sweets must invalidate explicitly
+    invalidate_on_commit(Session.object_session(target), catalog_cache.name)
+
+# Search results keyed by normalized parameters and tagged with the category IDs they cover
+search_cache = TaggedCache("search", max_entries=SEARCH_CACHE_SIZE)
+# Carried by category-name searches, which a newly created category could also match
+CATEGORY_NAMES_TAG = "category-names"
+
+@event.listens_for(Sweet, "after_insert")
+@event.listens_for(Sweet, "after_update")
+@event.listens_for(Sweet, "after_delete")
+def _invalidate_searches(mapper, connection, target: Sweet) -> None:
+    session = Session.object_session(target)
+    invalidate_on_commit(session, search_cache.name, str(target.category_id))
+    history = attributes.get_history(target, "category_id")
+    moved_from = [category_id for category_id in history.deleted if category_id is not None]
+    for category_id in moved_from:
+        invalidate_on_commit(session, search_cache.name, str(category_id))
+    if moved_from:
+        invalidate_on_commit(session, search_cache.name, CATEGORY_NAMES_TAG)
+
+@event.listens_for(Sweet, "after_insert")
+def _invalidate_name_searches(mapper, connection, target: Sweet) -> None:
+    # The sweet may have created its category, which cached name searches could not match
+    invalidate_on_commit(Session.object_session(target), search_cache.name, CATEGORY_NAMES_TAG)
+
+def list_sweets(conn: ReadConnection, skip: int, limit: int) -> List[dict]:
+    """A page of the catalog, served from the cache until a sweet changes"""
+    return catalog_cache.get_or_load((skip, limit), lambda: project_sweets(conn, ALL_FIELDS, skip=skip, limit=limit))
+
+def get_sweets_by_ids(conn: ReadConnection, ids: List[int]) -> List[dict]:
+    """Sweets with the given IDs in one IN query, in the order asked for; unknown IDs are skipped"""
+    return project_sweets(conn, ALL_FIELDS, ids)
+
+def _projection(fields: List[str], conditions: Sequence = ()):
+    columns = [SWEET_FIELDS[field].label(field) for field in fields]
+    query = select(*columns).select_from(Sweet).where(*conditions)
+    if "category" in fields:
+        query = query.join(Category, Category.id == Sweet.category_id)
+    return query
+
+def project_sweets(
+    conn: ReadConnection,
+    fields: List[str],
+    ids: Optional[List[int]] = None,
+    skip: int = 0,
+    limit: int = 100,
+    conditions: Sequence = (),
+    order_by=Sweet.id
+) -> List[dict]:
+    """Only the requested columns as plain dicts, without building Sweet objects"""
+    query = _projection(fields, conditions)
+    if ids is not None:
+        rows = conn.execute(query.add_columns(Sweet.id.label("_id")).where(Sweet.id.in_(ids))).all()
+        by_id = {row._id: row for row in rows}
+        rows = [by_id[sweet_id] for sweet_id in ids if sweet_id in by_id]
+    else:
+        query = query.order_by(order_by).offset(skip)
+        rows = conn.execute(query.limit(limit) if limit is not None else query).all()
+    return [{field: row._mapping[field] for field in fields} for row in rows]
+
+def stream_sweets(bind: Engine, fields: List[str], skip: int, limit: int) -> Iterator[bytes]:
+    """A catalog page as JSON text, produced LISTING_CHUNK_ROWS rows at a time.
+
+    Rows stay tuples until each is dumped, and only one chunk is held in
+    memory, so the peak does not grow with limit. Every chunk is its own
+    short keyset query (id > last id seen), because a cursor held open
+    for the whole response would keep SQLite's shared lock and stall
+    writers behind a slow client.
+    """
+    query = _projection(fields).add_columns(Sweet.id.label("_id")).order_by(Sweet.id)
+    remaining, last_id = limit, None
+    yield b"["
+    separator = b""
+    while remaining > 0:
+        chunk = query.limit(min(remaining, LISTING_CHUNK_ROWS))
+        chunk = chunk.offset(skip) if last_id is None else chunk.where(Sweet.id > last_id)
+        with bind.connect() as conn:
+            rows = conn.execute(chunk).all()
+        if not rows:
+            break
+        yield separator + b",".join(json.dumps(dict(zip(fields, row))).encode() for row in rows)
+        separator = b","
+        remaining -= len(rows)
+        last_id = rows[-1]._id
+        del rows
+    yield b"]"
+
+def _normalize_text(value: Optional[str]) -> Optional[str]:
+    # Searches match case-insensitively, so these spellings all share one entry
+    value = (value or "").strip().lower()
+    return value or None
+
+def find_sweets(
+    conn: ReadConnection,
+    name: Optional[str] = None,
+    category_id: Optional[int] = None,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+) -> List[dict]:
+    """Search results, served from the search cache until a sweet in a matching category changes"""
+    name, category = _normalize_text(name), _normalize_text(category)
+    low, high = min_price, max_price
+    if SEARCH_PRICE_BUCKET:
+        low = math.floor(min_price / SEARCH_PRICE_BUCKET) * SEARCH_PRICE_BUCKET if min_price is not None else None
+        high = math.ceil(max_price / SEARCH_PRICE_BUCKET) * SEARCH_PRICE_BUCKET if max_price is not None else None
+    key = (name, category_id, category, low, high)
+    rows = search_cache.get_or_load_tagged(key, lambda: run_search(conn, name, category_id, category, low, high))
+    if (low, high) != (min_price, max_price):
+        rows = [
+            row for row in rows
+            if (min_price is None or row["price"] >= min_price) and (max_price is None or row["price"] <= max_price)
+        ]
+    return rows
+
+def run_search(
+    conn: ReadConnection,
+    name: Optional[str],
+    category_id: Optional[int],
+    category: Optional[str],
+    min_price: Optional[float],
+    max_price: Optional[float]
+) -> Tuple[List[dict], Optional[Set[str]]]:
+    """Run a search, returning its rows and the cache tags they depend on (None if too large to cache)"""
+    conditions = []
+    if name:
+        conditions.append(Sweet.name.ilike(f"%{name}%"))
+    if category_id is not None:
+        conditions.append(Sweet.category_id == category_id)
+        tags = {str(category_id)}
+    elif category:
+        # Match names in the small categories table, then use the index on category_id
+        matching = conn.execute(select(Category.id).where(Category.name.ilike(f"%{category}%"))).scalars().all()
+        conditions.append(Sweet.category_id.in_(matching))
+        tags = {str(match) for match in matching} | {CATEGORY_NAMES_TAG}
+    else:
+        tags = {WILDCARD_TAG}
+    if min_price is not None:
+        conditions.append(Sweet.price >= min_price)
+    if max_price is not None:
+        conditions.append(Sweet.price <= max_price)
+    rows = project_sweets(conn, ALL_FIELDS, limit=None, conditions=conditions)
+    return rows, tags if len(rows) <= SEARCH_CACHE_MAX_ROWS else None
+
+def parse_id_list(ids: str) -> List[int]:
+    """Parse "1,5,9" into unique IDs in order; raises ValueError on anything else"""
+    parsed = list(dict.fromkeys(int(part) for part in ids.split(",") if part.strip()))
+    if len(parsed) > MAX_BATCH_IDS:
+        raise ValueError(f"At most {MAX_BATCH_IDS} ids can be requested at once")
+    return parsed
+
+def parse_fields(fields: str) -> List[str]:
+    """Parse "id,name" into a list of known fields; raises ValueError for unknown ones"""
+    parsed = list(dict.fromkeys(part.strip() for part in fields.split(",") if part.strip()))
+    unknown = [field for field in parsed if field not in SWEET_FIELDS]
+    if unknown or not parsed:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}" if unknown else "No fields requested")
+    return parsed
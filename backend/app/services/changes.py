@@ -0,0 +1,90 @@
+import heapq
+from typing import List
+
+from sqlalchemy import event, func, insert, select, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.core.clock import utcnow
+from app.database import ReadConnection
+from app.models.sweet import ChangeSequence, Sweet, SweetTombstone
+from app.services.catalog import ALL_FIELDS, project_sweets
+
+def next_version(connection: Connection) -> int:
+    """Take the next version from the change sequence.
+
+    The counter is bumped in the writing transaction, and SQLite runs one
+    writer at a time, so versions are unique and grow in commit order. It
+    never goes back, not even when the newest sweet is deleted.
+    """
+    stmt = sqlite_insert(ChangeSequence).values(id=1, version=1)
+    return connection.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[ChangeSequence.id],
+            set_={"version": ChangeSequence.version + 1}
+        ).returning(ChangeSequence.version)
+    ).scalar_one()
+
+def seed_change_sequence(conn: Connection) -> None:
+    """Start the change sequence at the newest version already handed out"""
+    latest = union_all(
+        select(func.max(Sweet.version).label("version")),
+        select(func.max(SweetTombstone.version).label("version"))
+    ).subquery()
+    conn.execute(insert(ChangeSequence).from_select(
+        ["id", "version"],
+        select(1, func.coalesce(func.max(latest.c.version), 0))
+    ))
+
+@event.listens_for(Sweet, "before_insert")
+def _version_new_sweet(mapper, connection, target: Sweet) -> None:
+    target.version = next_version(connection)
+
+@event.listens_for(Sweet, "before_update")
+def _version_changed_sweet(mapper, connection, target: Sweet) -> None:
+    # Objects flagged dirty without a net change are not written, so they keep their version
+    if Session.object_session(target).is_modified(target, include_collections=False):
+        target.version = next_version(connection)
+
+@event.listens_for(Sweet, "after_delete")
+def _leave_tombstone(mapper, connection, target: Sweet) -> None:
+    stmt = sqlite_insert(SweetTombstone).values(
+        sweet_id=target.id, version=next_version(connection), deleted_at=utcnow()
+    )
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=[SweetTombstone.sweet_id],
+        set_={"version": stmt.excluded.version, "deleted_at": stmt.excluded.deleted_at}
+    ))
+
+def current_version(conn: ReadConnection) -> int:
+    """The newest version handed out so far, 0 for a database without changes"""
+    return conn.execute(select(ChangeSequence.version)).scalar() or 0
+
+def changes_since(conn: ReadConnection, since: int, limit: int) -> dict:
+    """Sweets changed and deleted after a version, oldest first, at most limit of them.
+
+    Each side is a range scan over its version index, so the cost follows
+    the number of changes rather than the size of the catalog.
+    """
+    updated = project_sweets(
+        conn, ALL_FIELDS, limit=limit + 1, conditions=[Sweet.version > since], order_by=Sweet.version
+    )
+    deleted = conn.execute(
+        select(SweetTombstone.sweet_id, SweetTombstone.version)
+        .where(SweetTombstone.version > since)
+        .order_by(SweetTombstone.version)
+        .limit(limit + 1)
+    ).all()
+    merged = heapq.merge(
+        ({"id": row["id"], "version": row["version"], "deleted": False, "sweet": row} for row in updated),
+        ({"id": row.sweet_id, "version": row.version, "deleted": True, "sweet": None} for row in deleted),
+        key=lambda change: change["version"]
+    )
+    changes: List[dict] = list(merged)
+    page = changes[:limit]
+    return {
+        "version": page[-1]["version"] if page else since,
+        "has_more": len(changes) > limit,
+        "changes": page,
+    }
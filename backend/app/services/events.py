@@ -0,0 +1,27 @@
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Topics
+LOW_STOCK = "stock.low"
+STOCK_CHANGED = "stock.changed"
+
+_subscribers: Dict[str, List[Callable[[dict], Any]]] = defaultdict(list)
+
+def subscribe(topic: str, handler: Callable[[dict], Any]) -> None:
+    """Register a handler called with the payload of every event on a topic"""
+    _subscribers[topic].append(handler)
+
+def unsubscribe(topic: str, handler: Callable[[dict], Any]) -> None:
+    if handler in _subscribers[topic]:
+        _subscribers[topic].remove(handler)
+
+def publish(topic: str, payload: dict) -> None:
+    """Deliver an event to every subscriber; a failing handler never affects the publisher"""
+    for handler in list(_subscribers[topic]):
+        try:
+            handler(payload)
+        except Exception:
+            logger.exception("Event handler for %s failed", topic)
@@ -0,0 +1,87 @@
+from typing import Iterable, List, Optional
+
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+
+from app.database import ReadConnection
+from app.models.category import Category, CategoryFacet
+from app.models.sweet import Sweet
+
+def refresh_category_facets(connection: Connection, categories: Optional[Iterable[int]] = None) -> None:
+    """Recompute the facets of some category IDs (or all of them) from the sweets table"""
+    aggregate = select(
+        Sweet.category_id,
+        func.count(),
+        func.min(Sweet.price),
+        func.max(Sweet.price),
+        func.sum(Sweet.quantity),
+    ).group_by(Sweet.category_id)
+    clear = delete(CategoryFacet)
+    if categories is not None:
+        categories = list(categories)
+        # Served by the index on sweets.category_id
+        aggregate = aggregate.where(Sweet.category_id.in_(categories))
+        clear = clear.where(CategoryFacet.category_id.in_(categories))
+    connection.execute(clear)
+    connection.execute(
+        insert(CategoryFacet).from_select(
+            ["category_id", "items", "min_price", "max_price", "total_stock"], aggregate
+        )
+    )
+
+# The listeners below run inside the flush, on the writer's connection, so the
+# facets commit or roll back together with the change to the sweet.
+
+@event.listens_for(Sweet, "after_insert")
+def _add_to_facets(mapper, connection: Connection, target: Sweet) -> None:
+    stmt = sqlite_insert(CategoryFacet).values(
+        category_id=target.category_id,
+        items=1,
+        min_price=target.price,
+        max_price=target.price,
+        total_stock=target.quantity,
+    )
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=[CategoryFacet.category_id],
+        set_={
+            "items": CategoryFacet.items + 1,
+            "min_price": func.min(CategoryFacet.min_price, stmt.excluded.min_price),
+            "max_price": func.max(CategoryFacet.max_price, stmt.excluded.max_price),
+            "total_stock": CategoryFacet.total_stock + stmt.excluded.total_stock,
+        },
+    ))
+
+@event.listens_for(Sweet, "after_update")
+def _update_facets(mapper, connection: Connection, target: Sweet) -> None:
+    state = inspect(target)
+    category = state.attrs.category_id.history
+    if category.has_changes() or state.attrs.price.history.has_changes():
+        # Min and max cannot be maintained by deltas, so recompute the categories involved
+        refresh_category_facets(connection, {target.category_id, *category.deleted})
+        return
+    quantity = state.attrs.quantity.history
+    if quantity.deleted and quantity.added:
+        connection.execute(
+            update(CategoryFacet)
+            .where(CategoryFacet.category_id == target.category_id)
+            .values(total_stock=CategoryFacet.total_stock + (quantity.added[0] - quantity.deleted[0]))
+        )
+
+@event.listens_for(Sweet, "after_delete")
+def _remove_from_facets(mapper, connection: Connection, target: Sweet) -> None:
+    refresh_category_facets(connection, [target.category_id])
+
+def category_facets(conn: ReadConnection) -> List[dict]:
+    return conn.execute(
+        select(
+            CategoryFacet.category_id,
+            Category.name.label("category"),
+            CategoryFacet.items,
+            CategoryFacet.min_price,
+            CategoryFacet.max_price,
+            CategoryFacet.total_stock,
+        )
+        .join(Category, Category.id == CategoryFacet.category_id)
+        .order_by(Category.name)
+    ).mappings().all()
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+from datetime import timedelta
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Response, status
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.clock import utcnow
+from app.models.idempotency import IdempotencyRecord
+
+load_dotenv()
+
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", 24))
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+def request_fingerprint(scope: str, payload: dict) -> str:
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{scope}\n{body}".encode("utf-8")).hexdigest()
+
+def purge_expired(db: Session) -> int:
+    """Delete expired records (an index range scan over expires_at)"""
+    result = db.execute(delete(IdempotencyRecord).where(IdempotencyRecord.expires_at < utcnow()))
+    return result.rowcount
+
+class IdempotentWrite:
+    """Replays or records the response of a write made with an Idempotency-Key.
+
+    Without a key every method is a no-op apart from committing, so routes can
+    use the same code path for keyed and unkeyed requests.
+    """
+
+    def __init__(self, db: Session, key: Optional[str], user_id: int, scope: str, payload: dict):
+        self.db = db
+        self.key = key
+        self.user_id = user_id
+        self.fingerprint = request_fingerprint(scope, payload)
+        self.replay = self._lookup() if key else None
+
+    def _lookup(self) -> Optional[dict]:
+        record = self.db.get(IdempotencyRecord, (self.user_id, self.key))
+        if record is None:
+            return None
+        if record.expires_at < utcnow():
+            # Purged and replaced by record(); keep it out of the identity map
+            self.db.expunge(record)
+            return None
+        if record.fingerprint != self.fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different request"
+            )
+        return json.loads(record.response_body)
+
+    def respond(self, response: Response, body: dict) -> dict:
+        response.headers[REPLAYED_HEADER] = "true"
+        return body
+
+    def record(self, body: dict, status_code: int = status.HTTP_200_OK) -> None:
+        """Store the response in the caller's transaction, replacing an expired record"""
+        if not self.key:
+            return
+        purge_expired(self.db)
+        self.db.add(IdempotencyRecord(
+            user_id=self.user_id,
+            key=self.key,
+            fingerprint=self.fingerprint,
+            status_code=status_code,
+            response_body=json.dumps(body),
+            expires_at=utcnow() + timedelta(hours=IDEMPOTENCY_TTL_HOURS),
+        ))
+
+    def commit(self) -> Optional[dict]:
+        """Commit the caller's transaction.
+
+        If a concurrent request with the same key committed first, the whole
+        transaction is rolled back and that request's response is returned.
+        Any other integrity error is raised after the rollback, since nothing
+        was committed that a response could describe.
+        """
+        try:
+            self.db.commit()
+            return None
+        except IntegrityError:
+            if not self.key:
+                raise
+            self.db.rollback()
+            replay = self._lookup()
+            if replay is None:
+                raise
+            return replay
@@ -0,0 +1,237 @@
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from sqlalchemy import delete, exists, func, insert, literal, select, update
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.core.clock import utcnow
+from app.core.tenancy import shop_scope
+from app.database import each_shop
+from app.models.inventory import InventoryMovement, InventorySnapshot, ADJUSTMENT, SALE
+from app.models.sweet import Sweet
+from app.services.alerts import check_low_stock
+from app.services.analytics import record_sale
+
+load_dotenv()
+
+LEDGER_COMPACT_INTERVAL_SECONDS = int(os.getenv("LEDGER_COMPACT_INTERVAL_SECONDS", 300))
+LEDGER_RETENTION_HOURS = int(os.getenv("LEDGER_RETENTION_HOURS", 24 * 7))
+
+logger = logging.getLogger(__name__)
+
+def record_movement(db: Session, sweet_id: int, kind: str, delta: int) -> None:
+    """Append a movement to the ledger as part of the caller's transaction"""
+    db.add(InventoryMovement(sweet_id=sweet_id, kind=kind, delta=delta, created_at=utcnow()))
+
+def record_movements(db: Session, movements: Iterable[Tuple[int, str, int]]) -> int:
+    """Append several (sweet_id, kind, delta) movements with one batched INSERT"""
+    now = utcnow()
+    rows = [
+        {"sweet_id": sweet_id, "kind": kind, "delta": delta, "created_at": now}
+        for sweet_id, kind, delta in movements
+    ]
+    if rows:
+        db.execute(insert(InventoryMovement), rows)
+    return len(rows)
+
+def adjust_stock(db: Session, sweet: Sweet, condition, quantity: int = 0, reserved: int = 0) -> bool:
+    """Add to a sweet's quantity and reserved units with one conditional UPDATE.
+
+    The condition is checked against the row as it is now, not as it was
+    loaded, so concurrent holds and sales cannot both spend the same units.
+    The new values are then set on the loaded sweet as an ordinary change,
+    so its flush still bumps the version and keeps facets and caches in step.
+    Returns False, changing nothing, when the condition does not hold.
+    """
+    row = db.execute(
+        update(Sweet.__table__)
+        .where(Sweet.id == sweet.id, condition)
+        .values(quantity=Sweet.quantity + quantity, reserved=Sweet.reserved + reserved)
+        .returning(Sweet.quantity, Sweet.reserved)
+    ).first()
+    if row is None:
+        return False
+    # The flush rewrites the values just stored, but its history shows the change
+    set_committed_value(sweet, "quantity", row.quantity - quantity)
+    set_committed_value(sweet, "reserved", row.reserved - reserved)
+    sweet.quantity = row.quantity
+    sweet.reserved = row.reserved
+    return True
+
+def apply_sale(
+    db: Session,
+    sweet: Sweet,
+    quantity: int,
+    user_id: Optional[int],
+    reserved: bool = False
+) -> Optional[dict]:
+    """Take sold units out of stock and record the sale, in the caller's transaction.
+
+    Pass reserved=True when the units were held by a reservation. Returns the
+    low-stock event to publish after commit, if the sale crossed the threshold.
+    """
+    if reserved:
+        applied = adjust_stock(
+            db, sweet, (Sweet.reserved >= quantity) & (Sweet.quantity >= quantity),
+            quantity=-quantity, reserved=-quantity
+        )
+    else:
+        applied = adjust_stock(db, sweet, Sweet.quantity - Sweet.reserved >= quantity, quantity=-quantity)
+    if not applied:
+        db.refresh(sweet)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Insufficient stock. Only {sweet.available} available."
+        )
+    previous_quantity = sweet.quantity + quantity
+    record_movement(db, sweet.id, SALE, -quantity)
+    record_sale(db, sweet, quantity, user_id)
+    return check_low_stock(sweet, previous_quantity)
+
+def seed_opening_balances(db: Session) -> int:
+    """Record the current quantity of sweets that predate the ledger as an opening adjustment"""
+    has_history = exists().where(InventoryMovement.sweet_id == Sweet.id)
+    has_snapshot = exists().where(InventorySnapshot.sweet_id == Sweet.id)
+    opening = select(
+        Sweet.id, literal(ADJUSTMENT), Sweet.quantity, literal(utcnow())
+    ).where(~has_history, ~has_snapshot, Sweet.quantity != 0)
+    result = db.execute(
+        insert(InventoryMovement).from_select(
+            ["sweet_id", "kind", "delta", "created_at"], opening
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+def compact_ledger(db: Session, cutoff: datetime) -> int:
+    """Fold movements created before cutoff into per-sweet snapshots and drop them.
+
+    Returns the number of movements folded. Snapshots are kept, so point-in-time
+    queries older than the cutoff resolve to the nearest snapshot. They are
+    history only: sweets.quantity stays the live balance, written by every
+    stock change, because sales check and take stock in one conditional
+    UPDATE of that row (see adjust_stock), and SQLite serializes writers per
+    database, so there is no row contention left to remove.
+    """
+    last_id = db.scalar(
+        select(func.max(InventoryMovement.id)).where(InventoryMovement.created_at < cutoff)
+    )
+    if last_id is None:
+        return 0
+
+    totals = db.execute(
+        select(
+            InventoryMovement.sweet_id,
+            func.sum(InventoryMovement.delta),
+            func.max(InventoryMovement.created_at),
+            func.count(),
+        )
+        .where(InventoryMovement.id <= last_id)
+        .group_by(InventoryMovement.sweet_id)
+    ).all()
+
+    folded = 0
+    for sweet_id, delta, as_of, count in totals:
+        base = _latest_snapshot(db, sweet_id)
+        db.add(InventorySnapshot(
+            sweet_id=sweet_id,
+            quantity=(base.quantity if base else 0) + delta,
+            as_of=as_of,
+            last_movement_id=last_id,
+        ))
+        folded += count
+
+    db.execute(delete(InventoryMovement).where(InventoryMovement.id <= last_id))
+    db.commit()
+    return folded
+
+def stock_at(db: Session, sweet_id: int, at: datetime) -> Optional[int]:
+    """Stock level of a sweet at a point in time, or None if that history was compacted away"""
+    snapshot = db.execute(
+        select(InventorySnapshot)
+        .where(InventorySnapshot.sweet_id == sweet_id, InventorySnapshot.as_of <= at)
+        .order_by(InventorySnapshot.as_of.desc(), InventorySnapshot.id.desc())
+        .limit(1)
+    ).scalar_one_or_none()
+
+    if snapshot is None and _latest_snapshot(db, sweet_id) is not None:
+        return None
+
+    base = snapshot.quantity if snapshot else 0
+    after_id = snapshot.last_movement_id if snapshot else 0
+    moved = db.scalar(
+        select(func.coalesce(func.sum(InventoryMovement.delta), 0)).where(
+            InventoryMovement.sweet_id == sweet_id,
+            InventoryMovement.id > after_id,
+            InventoryMovement.created_at <= at,
+        )
+    )
+    return base + moved
+
+def _latest_snapshot(db: Session, sweet_id: int) -> Optional[InventorySnapshot]:
+    return db.execute(
+        select(InventorySnapshot)
+        .where(InventorySnapshot.sweet_id == sweet_id)
+        .order_by(InventorySnapshot.last_movement_id.desc())
+        .limit(1)
+    ).scalar_one_or_none()
+
+class LedgerCompactor:
+    """Background thread that periodically compacts the inventory ledger of every shop"""
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        interval_seconds: int = LEDGER_COMPACT_INTERVAL_SECONDS,
+        retention: timedelta = timedelta(hours=LEDGER_RETENTION_HOURS),
+    ):
+        self.session_factory = session_factory
+        self.interval_seconds = interval_seconds
+        self.retention = retention
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        for shop in each_shop():
+            with shop_scope(shop):
+                db = self.session_factory()
+                try:
+                    seed_opening_balances(db)
+                finally:
+                    db.close()
+        self._thread = threading.Thread(target=self._run, name="ledger-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run_once(self) -> int:
+        folded = 0
+        for shop in each_shop():
+            with shop_scope(shop):
+                db = self.session_factory()
+                try:
+                    folded += compact_ledger(db, utcnow() - self.retention)
+                except Exception:
+                    # One broken shop must not keep the others from being compacted
+                    logger.exception("Inventory ledger compaction failed for shop %s", shop)
+                finally:
+                    db.close()
+        return folded
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                folded = self.run_once()
+                if folded:
+                    logger.info("Compacted %d inventory movements", folded)
+            except Exception:
+                logger.exception("Inventory ledger compaction failed")
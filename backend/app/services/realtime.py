@@ -0,0 +1,214 @@
+import asyncio
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+
+from dotenv import load_dotenv
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.core.cache import register_relay, relay
+from app.core.tenancy import current_shop, shop_scope
+from app.database import ReadConnection
+from app.services.changes import changes_since, current_version
+from app.services.events import STOCK_CHANGED, subscribe
+
+load_dotenv()
+
+# How long to wait after the first pending delta so rapid updates go out together
+STREAM_COALESCE_MS = int(os.getenv("STREAM_COALESCE_MS", 50))
+# Changes a resuming client may have missed before it is told to resync instead
+STREAM_RESUME_LIMIT = int(os.getenv("STREAM_RESUME_LIMIT", 4096))
+# Distinct sweets a slow connection may have pending before it is told to resync
+STREAM_MAX_PENDING = int(os.getenv("STREAM_MAX_PENDING", 1024))
+
+# Stock changes travel to the other workers over the cache invalidation channel under this name
+STOCK_RELAY = "stock-changes"
+
+class Subscription:
+    """Pending deltas for one connection, coalesced so each sweet appears at most once.
+
+    Deltas carry the change-feed version of the committed row. Requests
+    publish after commit in whatever order their threads get there, so a
+    delta no newer than what the client already has for that sweet, or than
+    the version it resumed or resynced from, is dropped.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_pending: int = STREAM_MAX_PENDING):
+        self._loop = loop
+        self._max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending: "OrderedDict[int, dict]" = OrderedDict()
+        self._seen: Dict[int, int] = {}
+        self._floor = 0
+        self._reset_to: Optional[int] = None
+        self._wakeup = asyncio.Event()
+
+    def start_from(self, version: int) -> None:
+        """The client already has every change up to version"""
+        with self._lock:
+            self._floor = max(self._floor, version)
+
+    def offer(self, delta: dict) -> None:
+        """Queue a delta; safe to call from any thread"""
+        with self._lock:
+            version = delta["version"]
+            if version <= self._floor or version <= self._seen.get(delta["sweet_id"], 0):
+                return
+            self._seen[delta["sweet_id"]] = version
+            if self._reset_to is not None:
+                self._reset_to = max(self._reset_to, version)
+            else:
+                self._pending.pop(delta["sweet_id"], None)
+                self._pending[delta["sweet_id"]] = delta
+                if len(self._pending) > self._max_pending:
+                    # Backpressure: drop the backlog and have the client refetch instead
+                    self._reset_to = max(pending["version"] for pending in self._pending.values())
+                    self._pending.clear()
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def next_message(self, coalesce_ms: int = STREAM_COALESCE_MS) -> dict:
+        """Wait for pending deltas and return them as a single message"""
+        while True:
+            await self._wakeup.wait()
+            if coalesce_ms:
+                await asyncio.sleep(coalesce_ms / 1000)
+            self._wakeup.clear()
+            with self._lock:
+                if self._reset_to is not None:
+                    message = {"type": "reset", "version": self._reset_to}
+                    # The client refetches everything up to here
+                    self._floor = max(self._floor, self._reset_to)
+                    self._reset_to = None
+                    return message
+                if self._pending:
+                    deltas = list(self._pending.values())
+                    self._pending.clear()
+                    return {"type": "deltas", "deltas": deltas}
+
+class StockHub:
+    """Fans committed stock changes out to the subscriptions of this process.
+
+    Changes made in other workers arrive through the stock relay; versions
+    come from the database, so every worker agrees on them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._subscriptions: Set[Subscription] = set()
+
+    @property
+    def version(self) -> int:
+        """The newest version published here"""
+        return self._version
+
+    def publish(self, sweet_id: int, quantity: Optional[int], version: int, deleted: bool = False) -> dict:
+        delta = {"sweet_id": sweet_id, "quantity": quantity, "version": version}
+        if deleted:
+            delta["deleted"] = True
+        with self._lock:
+            self._version = max(self._version, version)
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.offer(delta)
+        return delta
+
+    def subscribe(self, max_pending: int = STREAM_MAX_PENDING) -> Subscription:
+        subscription = Subscription(asyncio.get_running_loop(), max_pending)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def on_stock_changed(self, event: dict) -> None:
+        self.publish(event["sweet_id"], event.get("quantity"), event["version"], event.get("deleted", False))
+
+def resume_subscription(
+    subscription: Subscription,
+    conn: ReadConnection,
+    since: Optional[int],
+    limit: int = STREAM_RESUME_LIMIT
+) -> dict:
+    """Queue what a client missed since a version, from the change feed, and return its hello message.
+
+    Call after subscribing, so nothing committed in between is lost; anything
+    seen twice is dropped by version. A client that missed more than limit
+    changes, or names a version this database never reached, has to resync.
+    """
+    version = current_version(conn)
+    resumed = False
+    if since is not None and since <= version:
+        page = changes_since(conn, since, limit)
+        if not page["has_more"]:
+            subscription.start_from(since)
+            for change in page["changes"]:
+                delta = {
+                    "sweet_id": change["id"],
+                    "quantity": None if change["deleted"] else change["sweet"]["quantity"],
+                    "version": change["version"],
+                }
+                if change["deleted"]:
+                    delta["deleted"] = True
+                subscription.offer(delta)
+            resumed = True
+    if not resumed:
+        subscription.start_from(version)
+    return {"type": "hello", "version": version, "resumed": resumed}
+
+async def serve_subscription(websocket: WebSocket, subscription: Subscription) -> None:
+    """Send coalesced deltas until the client disconnects.
+
+    Deltas are only taken from the subscription once the previous send has
+    completed, so a slow client accumulates coalesced state rather than a queue.
+    """
+    receiver = asyncio.ensure_future(websocket.receive_text())
+    try:
+        while True:
+            sender = asyncio.ensure_future(subscription.next_message())
+            done, _ = await asyncio.wait({receiver, sender}, return_when=asyncio.FIRST_COMPLETED)
+            if sender in done:
+                await websocket.send_json(sender.result())
+            else:
+                sender.cancel()
+            if receiver in done:
+                if receiver.exception() is not None:
+                    return
+                # Clients may send keepalives; anything they say is ignored
+                receiver = asyncio.ensure_future(websocket.receive_text())
+    except WebSocketDisconnect:
+        return
+    finally:
+        receiver.cancel()
+
+stock_hub = StockHub()
+_shop_hubs: Dict[str, StockHub] = {}
+_shop_hubs_lock = threading.Lock()
+
+def current_stock_hub() -> StockHub:
+    """The hub of the current shop: subscribers are per shop, like the versions they are sent"""
+    shop = current_shop.get()
+    if shop is None:
+        return stock_hub
+    with _shop_hubs_lock:
+        hub = _shop_hubs.get(shop)
+        if hub is None:
+            hub = _shop_hubs[shop] = StockHub()
+        return hub
+
+def _on_stock_changed(event: dict) -> None:
+    # Events are published synchronously by the request or job that made the change, inside its shop
+    current_stock_hub().on_stock_changed(event)
+    relay(STOCK_RELAY, json.dumps({"shop": current_shop.get(), "event": event}))
+
+def _on_relayed_stock_change(message: str) -> None:
+    relayed = json.loads(message)
+    with shop_scope(relayed["shop"]):
+        current_stock_hub().on_stock_changed(relayed["event"])
+
+subscribe(STOCK_CHANGED, _on_stock_changed)
+register_relay(STOCK_RELAY, _on_relayed_stock_change)
@@ -0,0 +1,77 @@
+import hashlib
+import logging
+import os
+import secrets
+from datetime import timedelta
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app.core.clock import utcnow
+from app.models.refresh_token import RefreshToken
+
+load_dotenv()
+
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 14))
+
+logger = logging.getLogger(__name__)
+
+def _digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+def purge_expired(db: Session) -> int:
+    """Delete expired tokens (an index range scan over expires_at)"""
+    result = db.execute(delete(RefreshToken).where(RefreshToken.expires_at < utcnow()))
+    return result.rowcount
+
+def issue_refresh_token(db: Session, user_id: int, family_id: Optional[bytes] = None) -> str:
+    """Add a new token to the caller's transaction, starting a new family unless one is given"""
+    token = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        token_hash=_digest(token),
+        family_id=family_id or secrets.token_bytes(16),
+        user_id=user_id,
+        expires_at=utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    return token
+
+def rotate_refresh_token(db: Session, token: str) -> Optional[Tuple[int, str]]:
+    """Spend a refresh token and issue its successor, returning (user_id, new token).
+
+    Returns None for unknown, expired or already used tokens. A used token
+    coming back means it was copied, so its whole family is revoked and the
+    holder of the successor has to log in again too.
+    """
+    now = utcnow()
+    digest = _digest(token)
+    spent = db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == digest,
+            RefreshToken.used_at.is_(None),
+            RefreshToken.expires_at > now
+        )
+        .values(used_at=now)
+        .returning(RefreshToken.user_id, RefreshToken.family_id)
+    ).first()
+    if spent is None:
+        reused = select(RefreshToken.family_id).where(
+            RefreshToken.token_hash == digest,
+            RefreshToken.used_at.is_not(None)
+        )
+        revoked = db.execute(delete(RefreshToken).where(RefreshToken.family_id.in_(reused))).rowcount
+        db.commit()
+        if revoked:
+            logger.warning("Refresh token reused; revoked %d tokens of its family", revoked)
+        return None
+    new_token = issue_refresh_token(db, spent.user_id, spent.family_id)
+    db.commit()
+    return spent.user_id, new_token
+
+def revoke_refresh_token(db: Session, token: str) -> None:
+    """Log a session out everywhere its refresh token family reached"""
+    family = select(RefreshToken.family_id).where(RefreshToken.token_hash == _digest(token))
+    db.execute(delete(RefreshToken).where(RefreshToken.family_id.in_(family)))
+    db.commit()
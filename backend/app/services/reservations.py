@@ -0,0 +1,158 @@
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.clock import utcnow
+from app.core.tenancy import current_shop, shop_scope
+from app.database import each_shop
+from app.models.reservation import Reservation, HELD, EXPIRED
+from app.models.sweet import Sweet
+from app.services.inventory import adjust_stock
+
+logger = logging.getLogger(__name__)
+
+def hold_stock(db: Session, sweet: Sweet, user_id: int, quantity: int, ttl_seconds: int) -> Optional[Reservation]:
+    """Reserve units of a sweet in the caller's transaction; None if fewer are available"""
+    if not adjust_stock(db, sweet, Sweet.quantity - Sweet.reserved >= quantity, reserved=quantity):
+        return None
+    now = utcnow()
+    reservation = Reservation(
+        sweet_id=sweet.id,
+        user_id=user_id,
+        quantity=quantity,
+        status=HELD,
+        expires_at=now + timedelta(seconds=ttl_seconds),
+        created_at=now,
+    )
+    db.add(reservation)
+    return reservation
+
+def finish_reservation(db: Session, reservation: Reservation, new_status: str) -> bool:
+    """Move a held reservation to new_status; False if it is no longer held.
+
+    The status change is a conditional UPDATE, so a confirm racing the expiry
+    timer (or a second release) can only win once.
+    """
+    result = db.execute(
+        update(Reservation)
+        .where(Reservation.id == reservation.id, Reservation.status == HELD)
+        .values(status=new_status)
+    )
+    return result.rowcount == 1
+
+def release_hold(db: Session, reservation: Reservation) -> None:
+    """Give a finished reservation's units back to available stock"""
+    sweet = db.get(Sweet, reservation.sweet_id)
+    if sweet is not None:
+        adjust_stock(db, sweet, Sweet.reserved >= reservation.quantity, reserved=-reservation.quantity)
+
+def expire_reservation(db: Session, reservation_id: int, now: Optional[datetime] = None) -> bool:
+    """Expire a reservation whose deadline has passed and commit; False if there was nothing to do"""
+    reservation = db.get(Reservation, reservation_id)
+    if reservation is None or reservation.status != HELD:
+        return False
+    if reservation.expires_at > (now or utcnow()):
+        return False
+    if not finish_reservation(db, reservation, EXPIRED):
+        db.rollback()
+        return False
+    release_hold(db, reservation)
+    db.commit()
+    return True
+
+class ReservationScheduler:
+    """Expires reservations at their deadline from a min-heap of (expires_at, id, shop).
+
+    Entries are never removed when a reservation is confirmed or released;
+    expire_reservation simply finds it no longer held when the entry comes due.
+    With tenancy, reservation IDs are only unique within a shop, so each
+    entry remembers the shop it was scheduled for ("" without tenancy).
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int, str]] = []
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._session_factory: Optional[sessionmaker] = None
+
+    def schedule(self, reservation_id: int, expires_at: datetime) -> None:
+        """Expire a reservation of the current shop at expires_at"""
+        entry = (expires_at, reservation_id, current_shop.get() or "")
+        with self._condition:
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] == entry:
+                self._condition.notify()
+
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._heap)
+
+    def start(self, session_factory: sessionmaker) -> None:
+        """Load the deadlines of held reservations in every shop and start the timer thread"""
+        self._session_factory = session_factory
+        for shop in each_shop():
+            with shop_scope(shop):
+                db = session_factory()
+                try:
+                    held = db.execute(
+                        select(Reservation.id, Reservation.expires_at).where(Reservation.status == HELD)
+                    ).all()
+                finally:
+                    db.close()
+                for reservation_id, expires_at in held:
+                    self.schedule(reservation_id, expires_at)
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="reservation-expiry", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    def pop_due(self, now: datetime) -> List[Tuple[Optional[str], int]]:
+        due = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                _, reservation_id, shop = heapq.heappop(self._heap)
+                due.append((shop or None, reservation_id))
+        return due
+
+    def run_due(self, session_factory: sessionmaker, now: Optional[datetime] = None) -> int:
+        """Expire every reservation whose deadline is at or before now"""
+        now = now or utcnow()
+        expired = 0
+        for shop, reservation_id in self.pop_due(now):
+            with shop_scope(shop):
+                db = session_factory()
+                try:
+                    expired += expire_reservation(db, reservation_id, now)
+                except Exception:
+                    logger.exception("Failed to expire reservation %s", reservation_id)
+                finally:
+                    db.close()
+        return expired
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if self._stopping:
+                    return
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                delay = (self._heap[0][0] - utcnow()).total_seconds()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+            self.run_due(self._session_factory)
+
+reservation_scheduler = ReservationScheduler()
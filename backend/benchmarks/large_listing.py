@@ -0,0 +1,75 @@
+"""Peak memory of one large catalog page, built whole versus streamed.
+
+Run from the backend directory:
+
+    python -m benchmarks.large_listing --sweets 100000
+
+The whole page is what a plain listing does: rows become dicts, each dict
+is validated into the Sweet schema and the list is serialized at once.
+The streamed page is what GET /api/sweets returns above
+LISTING_STREAM_THRESHOLD rows: chunks of tuples dumped and sent one at a
+time. Reported are the time and the peak memory tracemalloc sees for one
+page of every sweet.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine, insert
+
+from app.database import Base, ReadConnection
+from app.models.category import Category
+from app.models.sweet import Sweet
+from app.schemas.sweet import Sweet as SweetSchema
+from app.services.catalog import ALL_FIELDS, project_sweets, stream_sweets
+
+def seed(engine, sweets: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        category_id = conn.execute(insert(Category).values(name="Bench")).inserted_primary_key[0]
+        conn.execute(insert(Sweet), [
+            {"name": f"Sweet {i}", "category_id": category_id, "price": 10.0, "quantity": 100}
+            for i in range(sweets)
+        ])
+
+def whole_page(engine, limit: int) -> int:
+    conn = ReadConnection(engine)
+    try:
+        rows = project_sweets(conn, ALL_FIELDS, limit=limit)
+        return len(json.dumps([SweetSchema.model_validate(row).model_dump() for row in rows]))
+    finally:
+        conn.close()
+
+def streamed_page(engine, limit: int) -> int:
+    return sum(len(chunk) for chunk in stream_sweets(engine, ALL_FIELDS, 0, limit))
+
+def measure(read):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = read()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sweets", type=int, default=100_000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    seed(engine, args.sweets)
+
+    results = {
+        "whole page": measure(lambda: whole_page(engine, args.sweets)),
+        "streamed": measure(lambda: streamed_page(engine, args.sweets)),
+    }
+    for name, (size, elapsed, peak) in results.items():
+        print(f"{name:12} {size / 1024:8.0f} KiB body  {elapsed * 1000:8.0f} ms  {peak / 1024:8.0f} KiB peak")
+
+if __name__ == "__main__":
+    main()
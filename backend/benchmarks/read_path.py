@@ -0,0 +1,86 @@
+"""Cost of the read-only Core path against the ORM session path.
+
+Run from the backend directory:
+
+    python -m benchmarks.read_path --sweets 500 --repeat 200
+
+Both paths read the full catalog from a throwaway SQLite database: one
+through a Session building Sweet objects and serializing them, the other
+through ReadConnection returning plain rows. Reported are the mean time per
+read and the peak memory tracemalloc sees while a single read runs.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, ReadConnection
+from app.models.category import Category
+from app.models.sweet import Sweet
+from app.schemas.sweet import Sweet as SweetSchema
+from app.services.catalog import ALL_FIELDS, project_sweets
+
+def seed(engine, sweets: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    category = Category(name="Bench")
+    session.add(category)
+    session.flush()
+    session.add_all(
+        Sweet(name=f"Sweet {i}", category_id=category.id, price=10.0, quantity=100)
+        for i in range(sweets)
+    )
+    session.commit()
+    session.close()
+
+def orm_read(Session, limit: int) -> list:
+    session = Session()
+    try:
+        sweets = session.query(Sweet).order_by(Sweet.id).limit(limit).all()
+        return [SweetSchema.model_validate(sweet).model_dump() for sweet in sweets]
+    finally:
+        session.close()
+
+def core_read(engine, limit: int) -> list:
+    conn = ReadConnection(engine)
+    try:
+        return project_sweets(conn, ALL_FIELDS, limit=limit)
+    finally:
+        conn.close()
+
+def measure(read, repeat: int):
+    read()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        read()
+    elapsed = (time.perf_counter() - started) / repeat
+    tracemalloc.start()
+    read()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sweets", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    seed(engine, args.sweets)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    results = {
+        "session + ORM": measure(lambda: orm_read(Session, args.sweets), args.repeat),
+        "ReadConnection + Core": measure(lambda: core_read(engine, args.sweets), args.repeat),
+    }
+    for name, (elapsed, peak) in results.items():
+        print(f"{name:22} {elapsed * 1000:8.2f} ms/read  {peak / 1024:8.0f} KiB peak")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Registration throughput under concurrent signups.
+
+Run from the backend directory:
+
+    SECRET_KEY=bench python -m benchmarks.register_throughput --users 200 --concurrency 16
+
+Every signup goes through the real /api/auth/register route against a
+throwaway SQLite file. A few duplicate usernames are mixed in, so the
+IntegrityError path is exercised as well.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.main import app
+from app.database import Base, get_db
+from app.core.rate_limit import auth_rate_limiter
+from app.core.security import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS
+
+async def run(users: int, concurrency: int, duplicates: int) -> None:
+    path = os.path.join(tempfile.mkdtemp(), "bench_register.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    # Every request comes from one client address
+    auth_rate_limiter.enabled = False
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = {}
+
+    async def signup(client: httpx.AsyncClient, i: int) -> None:
+        name = f"user{i % (users - duplicates)}"
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(
+                "/api/auth/register",
+                json={"email": f"{name}-{i}@example.com", "username": name, "password": "benchpass123"},
+            )
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(signup(client, i) for i in range(users)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"bcrypt rounds {BCRYPT_ROUNDS}, hash workers {PASSWORD_HASH_WORKERS}, concurrency {concurrency}")
+    print(f"{users} signups in {elapsed:.2f}s: {users / elapsed:.1f}/s, statuses {statuses}")
+    print(
+        f"latency p50 {latencies[len(latencies) // 2] * 1000:.1f}ms, "
+        f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f}ms"
+    )
+    engine.dispose()
+    os.remove(path)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duplicates", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.concurrency, args.duplicates))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Read throughput of the multi-worker server from 1 to N worker processes.
+
+Run from the backend directory:
+
+    python -m benchmarks.worker_scaling --max-workers 4 --duration 10
+
+For each worker count, a fresh `python -m app.server` is started against a
+throwaway SQLite database. Load generator processes then hammer the cached
+sweets listing and the authenticated user lookup, and occasionally update
+a sweet so that cross-process invalidations are part of the measurement.
+Keep the load generators on cores that the server is not using if you can.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+def wait_until_up(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(base_url + "/").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+def seed(base_url: str, sweets: int) -> str:
+    with httpx.Client(base_url=base_url) as client:
+        client.post(
+            "/api/auth/register",
+            json={"email": "bench@example.com", "username": "bench", "password": "benchpass123"},
+        )
+        token = client.post(
+            "/api/auth/login", data={"username": "bench", "password": "benchpass123"}
+        ).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        for i in range(sweets):
+            client.post(
+                "/api/sweets",
+                json={"name": f"Sweet {i}", "category": "Bench", "price": 10.0, "quantity": 1000},
+                headers=headers,
+            )
+    return token
+
+async def generate_load(base_url: str, token: str, duration: float, concurrency: int, write_every: int) -> int:
+    headers = {"Authorization": f"Bearer {token}"}
+    deadline = time.monotonic() + duration
+    completed = 0
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        nonlocal completed
+        while time.monotonic() < deadline:
+            if write_every and completed % write_every == 0:
+                await client.put("/api/sweets/1", json={"price": 10.0 + completed % 7}, headers=headers)
+            else:
+                await client.get("/api/sweets", headers=headers)
+            completed += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return completed
+
+def _load_process(args) -> int:
+    return asyncio.run(generate_load(*args))
+
+def measure(workers: int, args) -> float:
+    run_dir = tempfile.mkdtemp()
+    port = args.port
+    env = dict(
+        os.environ,
+        SECRET_KEY=os.getenv("SECRET_KEY", "bench"),
+        DATABASE_URL=f"sqlite:///{os.path.join(run_dir, 'bench.db')}",
+        RUN_DIR=run_dir,
+        CACHE_INVALIDATION_PATH=os.path.join(run_dir, "invalidations.db"),
+        RATE_LIMIT_SQLITE_PATH=os.path.join(run_dir, "rate_limits.db"),
+        BCRYPT_ROUNDS="4",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.server", "--workers", str(workers), "--port", str(port), "--host", "127.0.0.1"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_until_up(base_url)
+        token = seed(base_url, args.sweets)
+        job = (base_url, token, args.duration, args.concurrency, args.write_every)
+        with multiprocessing.Pool(args.clients) as pool:
+            completed = sum(pool.map(_load_process, [job] * args.clients))
+        return completed / args.duration
+    finally:
+        server.terminate()
+        server.wait()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=2, help="load generator processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="connections per load generator")
+    parser.add_argument("--sweets", type=int, default=50)
+    parser.add_argument("--write-every", type=int, default=200, help="one update per this many requests; 0 for none")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        throughput = measure(workers, args)
+        baseline = baseline or throughput
+        print(f"{workers} worker(s): {throughput:8.1f} req/s  ({throughput / baseline:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
-from app.database import SessionLocal
+import argparse
+import os
+
+from app.database import SessionLocal, current_engine, tenant_engines
+from app.migrations import run_migrations_once
 from app.models.user import User
 from app.core.security import get_password_hash
+from app.core.tenancy import shop_scope, validate_shop_id
 
-def create_admin():
+def create_admin(shop=None):
     db = SessionLocal()
     
     # Check if admin already exists
@@ -25,6 +30,8 @@ def create_admin():
     db.refresh(admin)
     
     print(f"Admin user created successfully!")
+    if shop:
+        print(f"Shop: {shop}")
     print(f"Username: admin")
     print(f"Password: admin123")
     print(f"Email: {admin.email}")
@@ -32,4 +39,16 @@ def create_admin():
     db.close()
 
 if __name__ == "__main__":
-    create_admin()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create the admin user")
+    parser.add_argument("--shop", type=validate_shop_id, help="with TENANT_DATABASE_URL: the shop to create, or to add its admin to")
+    args = parser.parse_args()
+    if tenant_engines is not None and not args.shop:
+        parser.error("--shop is required when TENANT_DATABASE_URL is set")
+    if args.shop and tenant_engines is None:
+        parser.error("--shop needs TENANT_DATABASE_URL")
+    if args.shop:
+        os.makedirs(os.path.dirname(tenant_engines.path(args.shop)) or ".", exist_ok=True)
+    with shop_scope(args.shop):
+        # A new shop's database comes into being here; the app only serves shops that have one
+        run_migrations_once(current_engine())
+        create_admin(args.shop)
@@ -0,0 +1,26 @@
+"""gunicorn settings for running the API with several uvicorn workers.
+
+    pip install gunicorn
+    gunicorn app.main:app -c gunicorn.conf.py
+
+The app is imported once in the master (preload_app), which runs the
+migrations before any worker is forked; each worker then starts its own
+background threads in the lifespan.
+"""
+import os
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Read when the app is preloaded, so these must be set before that happens
+if workers > 1:
+    os.environ.setdefault("CACHE_INVALIDATION_BACKEND", "sqlite")
+    os.environ.setdefault("RATE_LIMIT_BACKEND", "sqlite")
+
+def post_fork(server, worker):
+    from app.database import engine
+
+    # Drop connections inherited from the master without closing them under its feet
+    engine.dispose(close=False)
@@ -0,0 +1,32 @@
+"""Rotate the access-token signing key.
+
+    python rotate_keys.py --algorithm EdDSA
+
+Adds a new key to JWT_KEYS_FILE and makes it the one new tokens are signed
+with. The previous key keeps verifying until every token it signed has
+expired, after which a later rotation drops it. Running workers pick the
+change up within JWT_KEYS_RELOAD_SECONDS.
+
+The first rotation also ends the SECRET_KEY fallback: tokens signed with it
+(which carry no kid) keep verifying for one access-token lifetime, until
+every one of them has expired.
+"""
+import argparse
+
+from app.core.keys import SUPPORTED_ALGORITHMS, rotate_key_file
+from app.core.security import ACCESS_TOKEN_EXPIRE_MINUTES, JWT_KEYS_FILE
+
+def rotate_keys():
+    parser = argparse.ArgumentParser(description="Rotate the access-token signing key")
+    parser.add_argument("--algorithm", choices=SUPPORTED_ALGORITHMS, default="EdDSA")
+    parser.add_argument("--path", default=JWT_KEYS_FILE or "jwt_keys.json")
+    args = parser.parse_args()
+    
+    kid = rotate_key_file(args.path, args.algorithm, overlap_seconds=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+    
+    print(f"New {args.algorithm} signing key {kid} written to {args.path}")
+    if not JWT_KEYS_FILE:
+        print(f"Set JWT_KEYS_FILE={args.path} to start signing with it")
+
+if __name__ == "__main__":
+    rotate_keys()
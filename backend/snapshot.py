@@ -0,0 +1,49 @@
+"""Snapshot and restore the shop database while the app keeps running.
+
+    python snapshot.py create snapshots/sweetshop.db
+    python snapshot.py restore snapshots/sweetshop.db
+
+`create` copies DATABASE_URL with SQLite's online backup API in small
+page steps, so purchases keep committing while it runs. Point
+ANALYTICS_SNAPSHOT_PATH at a snapshot refreshed this way (from cron, say)
+to run the analytics endpoints against it instead of the live database.
+`restore` overwrites the live database with a snapshot; stop the app first.
+With TENANT_DATABASE_URL set, pass --shop to pick the shop's database.
+"""
+import argparse
+import os
+import time
+
+from app.core.snapshots import SNAPSHOT_PAGES_PER_STEP, create_snapshot, database_path, restore_snapshot
+from app.database import tenant_engines
+
+def snapshot():
+    parser = argparse.ArgumentParser(description="Snapshot or restore the shop database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="Copy the live database to a snapshot file")
+    create.add_argument("path")
+    create.add_argument("--pages", type=int, default=SNAPSHOT_PAGES_PER_STEP, help="pages copied per step")
+    restore = commands.add_parser("restore", help="Replace the live database with a snapshot")
+    restore.add_argument("path")
+    parser.add_argument("--shop", help="shop whose database to use, with TENANT_DATABASE_URL")
+    args = parser.parse_args()
+    
+    if tenant_engines is not None and not args.shop:
+        parser.error("--shop is required when TENANT_DATABASE_URL is set")
+    if args.shop and tenant_engines is None:
+        parser.error("--shop needs TENANT_DATABASE_URL")
+    live = tenant_engines.path(args.shop) if args.shop else database_path()
+    if args.command == "create":
+        directory = os.path.dirname(args.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        started = time.monotonic()
+        create_snapshot(live, args.path, pages=args.pages)
+        size = os.path.getsize(args.path)
+        print(f"Snapshot of {live} written to {args.path} ({size} bytes in {time.monotonic() - started:.1f}s)")
+    else:
+        restore_snapshot(args.path, live)
+        print(f"{live} restored from {args.path}")
+
+if __name__ == "__main__":
+    snapshot()
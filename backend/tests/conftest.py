@@ -0,0 +1,69 @@
+import os
+
+# Tokens are signed with SECRET_KEY when no key file is configured; set it before the app is imported
+os.environ.setdefault("SECRET_KEY", "test")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.main import app
+from app.database import Base, ReadConnection, get_db, get_read_connection
+from app.core.cache import clear_caches
+from app.core.rate_limit import auth_rate_limiter
+
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    """Start every test with full login/register token buckets"""
+    auth_rate_limiter.reset()
+    yield
+
+@pytest.fixture(autouse=True)
+def reset_caches():
+    """Tests recreate their tables, so nothing cached may outlive a test"""
+    clear_caches()
+    yield
+
+@pytest.fixture
+def engine(tmp_path):
+    """A fresh database with every table, private to one test"""
+    test_engine = create_engine(f"sqlite:///{tmp_path}/test.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=test_engine)
+    yield test_engine
+    test_engine.dispose()
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def db_session(session_factory):
+    db = session_factory()
+    try:
+        yield db
+    finally:
+        db.close()
+
+@pytest.fixture
+def client(engine, session_factory):
+    """A client whose requests use the test database; the overrides only last for the test"""
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def override_get_read_connection():
+        conn = ReadConnection(engine)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_connection] = override_get_read_connection
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_db, None)
+    app.dependency_overrides.pop(get_read_connection, None)
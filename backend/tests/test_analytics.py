@@ -0,0 +1,114 @@
+import pytest
+
+from app.models.user import User
+from app.models.sales import Purchase, HourlySales, DailySales
+from app.core.security import get_password_hash
+
+@pytest.fixture
+def auth_token(client):
+    """Create a user and return auth token"""
+    client.post(
+        "/api/auth/register",
+        json={
+            "email": "test@example.com",
+            "username": "testuser",
+            "password": "testpass123"
+        }
+    )
+    response = client.post(
+        "/api/auth/login",
+        data={
+            "username": "testuser",
+            "password": "testpass123"
+        }
+    )
+    return response.json()["access_token"]
+
+@pytest.fixture
+def admin_token(client, session_factory):
+    """Create an admin user and return auth token"""
+    db = session_factory()
+    admin = User(
+        email="admin@example.com",
+        username="admin",
+        hashed_password=get_password_hash("adminpass123"),
+        is_admin=True
+    )
+    db.add(admin)
+    db.commit()
+    db.close()
+    
+    response = client.post(
+        "/api/auth/login",
+        data={
+            "username": "admin",
+            "password": "adminpass123"
+        }
+    )
+    return response.json()["access_token"]
+
+@pytest.fixture
+def sales(client, auth_token):
+    """Create two sweets and buy some of each"""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    ids = []
+    for name, category, price in [("Kaju Katli", "Barfi", 40.0), ("Motichoor Ladoo", "Ladoo", 15.0)]:
+        response = client.post(
+            "/api/sweets",
+            json={"name": name, "category": category, "price": price, "quantity": 100},
+            headers=headers
+        )
+        ids.append(response.json()["id"])
+    for sweet_id, quantity in [(ids[0], 2), (ids[1], 5), (ids[1], 3)]:
+        client.post(f"/api/sweets/{sweet_id}/purchase", json={"quantity": quantity}, headers=headers)
+    return ids
+
+def test_purchases_update_rollups(client, sales, session_factory):
+    """Test that each purchase is recorded and folded into the rollups"""
+    db = session_factory()
+    assert db.query(Purchase).count() == 3
+    hourly = {row.sweet_id: row for row in db.query(HourlySales).all()}
+    daily = {row.sweet_id: row for row in db.query(DailySales).all()}
+    db.close()
+    
+    assert hourly[sales[1]].units == 8
+    assert hourly[sales[1]].orders == 2
+    assert hourly[sales[1]].revenue == 120.0
+    assert daily[sales[0]].units == 2
+    assert daily[sales[0]].revenue == 80.0
+
+def test_top_sellers(client, admin_token, sales):
+    """Test ranking sweets and categories"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    
+    response = client.get("/api/analytics/top?metric=units", headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [row["sweet_id"] for row in data] == [sales[1], sales[0]]
+    assert data[0]["name"] == "Motichoor Ladoo"
+    
+    response = client.get("/api/analytics/top?by=category&metric=revenue&limit=1", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == [
+        {"sweet_id": None, "name": None, "category": "Ladoo", "units": 8, "revenue": 120.0, "orders": 2}
+    ]
+
+def test_sales_timeseries(client, admin_token, sales):
+    """Test hourly time series for one category"""
+    response = client.get(
+        "/api/analytics/timeseries?granularity=hour&category=Barfi",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 1
+    assert data[0]["units"] == 2
+    assert data[0]["revenue"] == 80.0
+
+def test_analytics_requires_admin(client, auth_token):
+    """Test that analytics are admin only"""
+    response = client.get(
+        "/api/analytics/top",
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    assert response.status_code == 403
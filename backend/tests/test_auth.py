@@ -1,32 +1,7 @@
-import pytest
-from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from concurrent.futures import ThreadPoolExecutor
 
-from app.main import app
-from app.database import Base, get_db
 from app.models.user import User
-from app.core.security import get_password_hash
-
-# Test database
-TEST_DATABASE_URL = "sqlite:///./test_auth.db"
-engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
-
-app.dependency_overrides[get_db] = override_get_db
-
-@pytest.fixture
-def client():
-    Base.metadata.create_all(bind=engine)
-    yield TestClient(app)
-    Base.metadata.drop_all(bind=engine)
+from app.models.refresh_token import RefreshToken
 
 def test_register_user(client):
     """Test user registration"""
@@ -65,6 +40,48 @@ def test_register_duplicate_email(client):
         }
     )
     assert response.status_code == 400
+    assert response.json()["detail"] == "Email already registered"
+
+def test_register_duplicate_username(client):
+    """Test registering with duplicate username fails"""
+    client.post(
+        "/api/auth/register",
+        json={
+            "email": "first@example.com",
+            "username": "testuser",
+            "password": "testpass123"
+        }
+    )
+    response = client.post(
+        "/api/auth/register",
+        json={
+            "email": "second@example.com",
+            "username": "testuser",
+            "password": "testpass123"
+        }
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Username already taken"
+
+def test_concurrent_registrations_create_one_user(client, session_factory):
+    """Test that racing signups for the same username cannot both succeed"""
+    def register(i):
+        return client.post(
+            "/api/auth/register",
+            json={
+                "email": f"user{i}@example.com",
+                "username": "testuser",
+                "password": "testpass123"
+            }
+        ).status_code
+    
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        statuses = sorted(pool.map(register, range(4)))
+    
+    assert statuses == [201, 400, 400, 400]
+    db = session_factory()
+    assert db.query(User).filter(User.username == "testuser").count() == 1
+    db.close()
 
 def test_login_success(client):
     """Test successful login"""
@@ -109,4 +126,70 @@ def test_login_wrong_password(client):
             "password": "wrongpassword"
         }
     )
-    assert response.status_code == 401
\ No newline at end of file
+    assert response.status_code == 401
+
+def test_jwks_has_no_shared_secrets(client):
+    """Test that the published key set never contains the HMAC secret"""
+    response = client.get("/api/auth/jwks.json")
+    
+    assert response.status_code == 200
+    assert response.json() == {"keys": []}
+
+def login(client):
+    client.post(
+        "/api/auth/register",
+        json={"email": "test@example.com", "username": "testuser", "password": "testpass123"}
+    )
+    return client.post(
+        "/api/auth/login",
+        data={"username": "testuser", "password": "testpass123"}
+    ).json()
+
+def test_refresh_rotates_tokens_without_password(client, monkeypatch):
+    """Test that a refresh token buys new tokens and never touches bcrypt"""
+    tokens = login(client)
+    monkeypatch.setattr("app.core.security.bcrypt.checkpw", None)
+    
+    response = client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    
+    assert response.status_code == 200
+    renewed = response.json()
+    assert renewed["refresh_token"] != tokens["refresh_token"]
+    headers = {"Authorization": f"Bearer {renewed['access_token']}"}
+    assert client.get("/api/sweets", headers=headers).status_code == 200
+
+def test_reused_refresh_token_revokes_its_family(client):
+    """Test that replaying a rotated refresh token logs out the whole session"""
+    tokens = login(client)
+    renewed = client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).json()
+    
+    replay = client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    
+    assert replay.status_code == 401
+    assert client.post(
+        "/api/auth/refresh", json={"refresh_token": renewed["refresh_token"]}
+    ).status_code == 401
+
+def test_logout_revokes_refresh_token(client):
+    """Test that a logged-out refresh token can no longer be used"""
+    tokens = login(client)
+    
+    assert client.post("/api/auth/logout", json={"refresh_token": tokens["refresh_token"]}).status_code == 204
+    assert client.post(
+        "/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+    ).status_code == 401
+
+def test_refresh_token_of_deleted_user_is_rejected(client, session_factory):
+    """Test that a refresh token which outlived its user gets 401 and is revoked"""
+    tokens = login(client)
+    db = session_factory()
+    db.query(User).filter(User.username == "testuser").delete()
+    db.commit()
+    db.close()
+    
+    response = client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    
+    assert response.status_code == 401
+    db = session_factory()
+    assert db.query(RefreshToken).count() == 0
+    db.close()
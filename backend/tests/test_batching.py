@@ -0,0 +1,90 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+
+from app.models.sweet import Sweet
+from app.models.inventory import InventoryMovement
+from app.models.sales import HourlySales
+from app.services.batching import PurchaseBatcher, purchase_batcher
+
+@pytest.fixture
+def sweet_id(client, session_factory):
+    db = session_factory()
+    sweet = Sweet(name="Jalebi", category="Fried", price=5.0, quantity=10)
+    db.add(sweet)
+    db.commit()
+    sweet_id = sweet.id
+    db.close()
+    return sweet_id
+
+def outcome(future):
+    try:
+        return future.result()["quantity"]
+    except HTTPException as exc:
+        return exc.detail
+
+def test_batch_resolves_intents_in_arrival_order(sweet_id, session_factory):
+    """Test that one flush applies every intent serially in one transaction"""
+    batcher = PurchaseBatcher(window_ms=0, session_factory=session_factory)
+    futures = [batcher.submit(sweet_id, 4, None) for _ in range(3)]
+    futures.append(batcher.submit(99999, 1, None))
+    
+    assert batcher.flush() == 4
+    assert [outcome(f) for f in futures] == [
+        6, 2, "Insufficient stock. Only 2 available.", "Sweet not found"
+    ]
+    
+    db = session_factory()
+    assert db.get(Sweet, sweet_id).quantity == 2
+    assert db.query(InventoryMovement).count() == 2
+    assert db.query(HourlySales).one().orders == 2
+    db.close()
+    
+    stats = batcher.stats.snapshot()
+    assert stats["batches"] == 1
+    assert stats["purchases"] == 4
+    assert stats["rejected"] == 2
+
+def test_concurrent_purchases_are_grouped(sweet_id, session_factory):
+    """Test that concurrent callers share transactions and never oversell"""
+    batcher = PurchaseBatcher(window_ms=20, session_factory=session_factory)
+    batcher.start()
+    try:
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(
+                lambda _: outcome(batcher.submit(sweet_id, 1, None)), range(16)
+            ))
+    finally:
+        batcher.stop()
+    
+    assert sum(isinstance(r, int) for r in results) == 10
+    db = session_factory()
+    assert db.get(Sweet, sweet_id).quantity == 0
+    db.close()
+    assert batcher.stats.snapshot()["batches"] < 16
+
+def test_purchase_endpoint_uses_batcher(client, sweet_id, session_factory):
+    """Test that purchase_sweet goes through the batcher when it is running"""
+    client.post(
+        "/api/auth/register",
+        json={"email": "test@example.com", "username": "testuser", "password": "testpass123"}
+    )
+    token = client.post(
+        "/api/auth/login",
+        data={"username": "testuser", "password": "testpass123"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    purchase_batcher.start(session_factory)
+    try:
+        before = purchase_batcher.stats.snapshot()["purchases"]
+        ok = client.post(f"/api/sweets/{sweet_id}/purchase", json={"quantity": 3}, headers=headers)
+        too_many = client.post(f"/api/sweets/{sweet_id}/purchase", json={"quantity": 8}, headers=headers)
+        after = purchase_batcher.stats.snapshot()["purchases"]
+    finally:
+        purchase_batcher.stop()
+    
+    assert ok.status_code == 200
+    assert ok.json()["quantity"] == 7
+    assert too_many.status_code == 400
+    assert after - before == 2
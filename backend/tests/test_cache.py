@@ -0,0 +1,138 @@
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import event
+
+from app.models.user import User
+from app.core.cache import LocalCache, SQLiteInvalidationChannel, TaggedCache, WILDCARD_TAG
+from app.services.catalog import search_cache
+
+@pytest.fixture
+def auth_headers(client):
+    """Create a user and return its auth header"""
+    client.post(
+        "/api/auth/register",
+        json={"email": "test@example.com", "username": "testuser", "password": "testpass123"}
+    )
+    token = client.post(
+        "/api/auth/login",
+        data={"username": "testuser", "password": "testpass123"}
+    ).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+def test_load_racing_an_invalidation_is_not_cached():
+    """Test that a value loaded before an invalidation is not stored"""
+    cache = LocalCache("test-race")
+    
+    def stale_loader():
+        cache.invalidate()
+        return "stale"
+    
+    assert cache.get_or_load("k", stale_loader) == "stale"
+    assert cache.get("k") is None
+    assert cache.get_or_load("k", lambda: "fresh") == "fresh"
+    assert cache.get("k") == "fresh"
+
+def test_invalidation_reaches_other_processes(tmp_path):
+    """Test that an invalidation published by another worker is applied on poll"""
+    path = str(tmp_path / "bus.db")
+    channel = SQLiteInvalidationChannel(path, poll_ms=10)
+    received = []
+    channel.start(lambda cache, key: received.append((cache, key)))
+    channel.stop()
+    
+    channel.publish("users", "own-write")
+    subprocess.run(
+        [
+            sys.executable, "-c",
+            "import sys; from app.core.cache import SQLiteInvalidationChannel as C; "
+            "C(sys.argv[1]).publish('users', 'alice')",
+            path
+        ],
+        check=True
+    )
+    
+    assert channel.poll() == 1
+    assert received == [("users", "alice")]
+
+def test_catalog_cache_is_invalidated_by_writes(client, auth_headers):
+    """Test that the cached sweets listing never outlives a change"""
+    sweet_id = client.post(
+        "/api/sweets",
+        json={"name": "Ladoo", "category": "Traditional", "price": 10.0, "quantity": 5},
+        headers=auth_headers
+    ).json()["id"]
+    assert client.get("/api/sweets", headers=auth_headers).json()[0]["price"] == 10.0
+    
+    client.put(f"/api/sweets/{sweet_id}", json={"price": 12.5}, headers=auth_headers)
+    
+    assert client.get("/api/sweets", headers=auth_headers).json()[0]["price"] == 12.5
+
+def test_user_cache_is_invalidated_when_user_changes(client, auth_headers, session_factory):
+    """Test that promoting a user takes effect despite the cached lookup"""
+    assert client.get("/api/sweets/low-stock", headers=auth_headers).status_code == 403
+    
+    db = session_factory()
+    db.query(User).filter(User.username == "testuser").one().is_admin = True
+    db.commit()
+    db.close()
+    
+    assert client.get("/api/sweets/low-stock", headers=auth_headers).status_code == 200
+
+def test_cached_read_does_not_check_out_a_connection(client, auth_headers, engine):
+    """Test that a listing served from the caches never touches the pool"""
+    client.post(
+        "/api/sweets",
+        json={"name": "Barfi", "category": "Traditional", "price": 8.0, "quantity": 5},
+        headers=auth_headers
+    )
+    client.get("/api/sweets", headers=auth_headers)
+    checkouts = []
+    listener = lambda *args: checkouts.append(args)
+    event.listen(engine, "checkout", listener)
+    try:
+        response = client.get("/api/sweets", headers=auth_headers)
+    finally:
+        event.remove(engine, "checkout", listener)
+    
+    assert response.json()[0]["name"] == "Barfi"
+    assert checkouts == []
+
+def test_tag_invalidation_only_drops_affected_entries():
+    """Test that invalidating a tag keeps entries of other tags but drops wildcard ones"""
+    cache = TaggedCache("test-tags", max_entries=2)
+    cache.set("a", 1, tags={"1"})
+    cache.set("b", 2, tags={"2"})
+    cache.set("all", 3, tags={WILDCARD_TAG})
+    
+    cache.set("c", 4, tags={"1"})
+    cache.invalidate("1")
+    
+    assert (cache.get("a"), cache.get("b"), cache.get("all"), cache.get("c")) == (None, None, None, None)
+    assert cache.stats()["tags"] == 0
+    cache.set("a", 1, tags={"1"})
+    cache.set("b", 2, tags={"2"})
+    cache.invalidate("2")
+    assert (cache.get("a"), cache.get("b")) == (1, None)
+
+def test_search_cache_is_normalized_and_invalidated_per_category(client, auth_headers):
+    """Test that equivalent searches share an entry and writes only drop their category's"""
+    for name, category in (("Kaju Barfi", "Barfi"), ("Gulab Jamun", "Syrup")):
+        client.post(
+            "/api/sweets",
+            json={"name": name, "category": category, "price": 10.0, "quantity": 5},
+            headers=auth_headers
+        )
+    barfi = client.get("/api/sweets/search", params={"category": "barfi"}, headers=auth_headers).json()
+    client.get("/api/sweets/search", params={"category": "Syrup"}, headers=auth_headers)
+    hits = search_cache.hits
+    
+    assert client.get("/api/sweets/search", params={"category": " BARFI "}, headers=auth_headers).json() == barfi
+    assert search_cache.hits == hits + 1
+    
+    client.put(f"/api/sweets/{barfi[0]['id']}", json={"price": 12.0}, headers=auth_headers)
+    
+    assert len(search_cache) == 1
+    repriced = client.get("/api/sweets/search", params={"category": "barfi"}, headers=auth_headers).json()
+    assert repriced[0]["price"] == 12.0
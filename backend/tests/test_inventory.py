@@ -1,33 +1,13 @@
 import pytest
-from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.exc import IntegrityError
 
-from app.main import app
-from app.database import Base, get_db
 from app.models.user import User
 from app.models.sweet import Sweet
+from app.models.inventory import InventoryMovement
+from app.models.idempotency import IdempotencyRecord
 from app.core.security import get_password_hash
-
-# Test database
-TEST_DATABASE_URL = "sqlite:///./test_inventory.db"
-engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
-
-app.dependency_overrides[get_db] = override_get_db
-
-@pytest.fixture
-def client():
-    Base.metadata.create_all(bind=engine)
-    yield TestClient(app)
-    Base.metadata.drop_all(bind=engine)
+from app.services.idempotency import IdempotentWrite
+from app.services.events import LOW_STOCK, subscribe, unsubscribe
 
 @pytest.fixture
 def auth_token(client):
@@ -50,9 +30,9 @@ def auth_token(client):
     return response.json()["access_token"]
 
 @pytest.fixture
-def admin_token(client):
+def admin_token(client, session_factory):
     """Create an admin user and return auth token"""
-    db = TestingSessionLocal()
+    db = session_factory()
     admin = User(
         email="admin@example.com",
         username="admin",
@@ -202,4 +182,153 @@ def test_purchase_from_zero_stock_fails(client, auth_token):
         json={"quantity": 1},
         headers={"Authorization": f"Bearer {auth_token}"}
     )
-    assert response.status_code == 400
\ No newline at end of file
+    assert response.status_code == 400
+
+def test_stock_level_history(client, admin_token, auth_token, sample_sweet, session_factory):
+    """Test reading current and past stock levels from the ledger"""
+    client.post(
+        f"/api/sweets/{sample_sweet}/purchase",
+        json={"quantity": 4},
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    client.post(
+        f"/api/sweets/{sample_sweet}/restock",
+        json={"quantity": 6},
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    
+    response = client.get(
+        f"/api/sweets/{sample_sweet}/stock",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 200
+    assert response.json()["quantity"] == 12  # 10 - 4 + 6
+    
+    response = client.get(
+        f"/api/sweets/{sample_sweet}/stock",
+        params={"at": "2000-01-01T00:00:00"},
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 200
+    assert response.json()["quantity"] == 0
+    
+    db = session_factory()
+    movements = db.query(InventoryMovement).filter(InventoryMovement.sweet_id == sample_sweet).all()
+    db.close()
+    assert [(m.kind, m.delta) for m in movements] == [("adjustment", 10), ("sale", -4), ("restock", 6)]
+
+
+@pytest.fixture
+def low_stock_events():
+    """Collect low-stock events published during a test"""
+    events = []
+    subscribe(LOW_STOCK, events.append)
+    yield events
+    unsubscribe(LOW_STOCK, events.append)
+
+def test_purchase_below_threshold_emits_event(client, auth_token, low_stock_events):
+    """Test that crossing the reorder threshold emits exactly one event"""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    response = client.post(
+        "/api/sweets",
+        json={
+            "name": "Rasgulla",
+            "category": "Syrup",
+            "price": 12.0,
+            "quantity": 10,
+            "reorder_threshold": 5
+        },
+        headers=headers
+    )
+    sweet_id = response.json()["id"]
+    
+    client.post(f"/api/sweets/{sweet_id}/purchase", json={"quantity": 4}, headers=headers)
+    assert low_stock_events == []
+    
+    client.post(f"/api/sweets/{sweet_id}/purchase", json={"quantity": 2}, headers=headers)
+    client.post(f"/api/sweets/{sweet_id}/purchase", json={"quantity": 1}, headers=headers)
+    assert low_stock_events == [
+        {"sweet_id": sweet_id, "name": "Rasgulla", "quantity": 4, "reorder_threshold": 5}
+    ]
+
+def test_list_low_stock_sweets(client, admin_token, auth_token):
+    """Test listing sweets at or below their reorder threshold"""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    for name, quantity, threshold in [("Plenty", 50, 10), ("Running Low", 3, 10), ("Sold Out", 0, 0)]:
+        client.post(
+            "/api/sweets",
+            json={
+                "name": name,
+                "category": "Test",
+                "price": 1.0,
+                "quantity": quantity,
+                "reorder_threshold": threshold
+            },
+            headers=headers
+        )
+    
+    response = client.get(
+        "/api/sweets/low-stock",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 200
+    assert sorted(item["name"] for item in response.json()) == ["Running Low", "Sold Out"]
+    
+    response = client.get("/api/sweets/low-stock", headers=headers)
+    assert response.status_code == 403
+
+def test_purchase_retry_with_idempotency_key(client, auth_token, sample_sweet, session_factory):
+    """Test that retrying a purchase with the same key replays the original response"""
+    headers = {"Authorization": f"Bearer {auth_token}", "Idempotency-Key": "order-42"}
+    first = client.post(f"/api/sweets/{sample_sweet}/purchase", json={"quantity": 3}, headers=headers)
+    retry = client.post(f"/api/sweets/{sample_sweet}/purchase", json={"quantity": 3}, headers=headers)
+    
+    assert first.status_code == 200
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    
+    db = session_factory()
+    assert db.get(Sweet, sample_sweet).quantity == 7  # Decremented only once
+    db.close()
+
+def test_idempotency_key_reused_for_different_request(client, auth_token, sample_sweet):
+    """Test that a key cannot be reused with a different payload"""
+    headers = {"Authorization": f"Bearer {auth_token}", "Idempotency-Key": "order-43"}
+    client.post(f"/api/sweets/{sample_sweet}/purchase", json={"quantity": 1}, headers=headers)
+    response = client.post(f"/api/sweets/{sample_sweet}/purchase", json={"quantity": 2}, headers=headers)
+    
+    assert response.status_code == 422
+
+def test_idempotent_commit_replays_only_a_concurrent_winner(session_factory):
+    """Test that a failed keyed commit is replayed only when a matching record was committed by another request"""
+    payload = {"quantity": 1}
+    winner = session_factory()
+    IdempotentWrite(winner, "order-44", 1, "purchase:1", payload).record({"message": "first"})
+    
+    db = session_factory()
+    write = IdempotentWrite(db, "order-44", 1, "purchase:1", payload)
+    assert write.replay is None
+    winner.commit()
+    write.record({"message": "second"})
+    assert write.commit() == {"message": "first"}
+    winner.close()
+    
+    # Any other integrity error is raised, never reported as committed
+    write = IdempotentWrite(db, "order-45", 1, "purchase:1", payload)
+    db.add_all([User(email="a@example.com", username="same", hashed_password="x"),
+                User(email="b@example.com", username="same", hashed_password="x")])
+    write.record({"message": "lost"})
+    with pytest.raises(IntegrityError):
+        write.commit()
+    assert db.get(IdempotencyRecord, (1, "order-45")) is None
+    db.close()
+
+def test_restock_retry_with_idempotency_key(client, admin_token, sample_sweet):
+    """Test that a retried restock is applied once"""
+    headers = {"Authorization": f"Bearer {admin_token}", "Idempotency-Key": "delivery-7"}
+    for _ in range(2):
+        response = client.post(f"/api/sweets/{sample_sweet}/restock", json={"quantity": 5}, headers=headers)
+        assert response.status_code == 200
+        assert response.json()["quantity"] == 15
@@ -0,0 +1,60 @@
+import jwt
+import pytest
+from jwt.exceptions import InvalidTokenError
+
+from app.core.keys import KeySet, rotate_key_file
+
+def test_rotation_keeps_old_tokens_valid_until_overlap_ends(tmp_path):
+    """Test that tokens signed before a rotation verify until the old key is dropped"""
+    path = str(tmp_path / "keys.json")
+    first_kid = rotate_key_file(path, "HS256", overlap_seconds=60)
+    keys = KeySet(path, reload_seconds=0)
+    old_token = keys.encode({"sub": "alice"})
+    assert jwt.get_unverified_header(old_token)["kid"] == first_kid
+    
+    second_kid = rotate_key_file(path, "HS256", overlap_seconds=60)
+    new_token = keys.encode({"sub": "bob"})
+    
+    assert jwt.get_unverified_header(new_token)["kid"] == second_kid
+    assert keys.decode(old_token)["sub"] == "alice"
+    
+    rotate_key_file(path, "HS256", overlap_seconds=0)
+    with pytest.raises(InvalidTokenError):
+        keys.decode(old_token)
+    assert keys.decode(new_token)["sub"] == "bob"
+
+def test_tokens_without_kid_use_the_shared_secret(tmp_path):
+    """Test that tokens issued before the key file verify until they have had time to expire, and unknown kids never do"""
+    path = str(tmp_path / "keys.json")
+    rotate_key_file(path, "HS256", overlap_seconds=60)
+    keys = KeySet(path, fallback_secret="legacy-secret")
+    
+    legacy_token = jwt.encode({"sub": "alice"}, "legacy-secret", algorithm="HS256")
+    forged = jwt.encode({"sub": "alice"}, "legacy-secret", algorithm="HS256", headers={"kid": "nope"})
+    
+    assert keys.decode(legacy_token)["sub"] == "alice"
+    with pytest.raises(InvalidTokenError):
+        keys.decode(forged)
+    
+    expired = str(tmp_path / "expired.json")
+    rotate_key_file(expired, "HS256", overlap_seconds=0)
+    with pytest.raises(InvalidTokenError):
+        KeySet(expired, fallback_secret="legacy-secret").decode(legacy_token)
+
+def test_jwks_publishes_only_public_members(tmp_path):
+    """Test that asymmetric keys sign and verify and that the key set never leaks private parts"""
+    path = str(tmp_path / "keys.json")
+    rotate_key_file(path, "ES256", overlap_seconds=60)
+    keys = KeySet(path, reload_seconds=0)
+    es256_token = keys.encode({"sub": "bob"})
+    kid = rotate_key_file(path, "EdDSA", overlap_seconds=60)
+    
+    token = keys.encode({"sub": "alice"})
+    assert keys.decode(es256_token)["sub"] == "bob"
+    assert keys.decode(token)["sub"] == "alice"
+    published = keys.jwks()["keys"]
+    
+    assert {key["alg"] for key in published} == {"ES256", "EdDSA"}
+    assert all("d" not in key for key in published)
+    public = jwt.PyJWK(next(key for key in published if key["kid"] == kid))
+    assert jwt.decode(token, public, algorithms=["EdDSA"])["sub"] == "alice"
@@ -0,0 +1,73 @@
+import pytest
+from datetime import timedelta
+from app.core.clock import utcnow
+from app.models.sweet import Sweet
+from app.models.inventory import InventoryMovement, InventorySnapshot, SALE, RESTOCK, ADJUSTMENT
+from app.services.inventory import (
+    record_movement,
+    record_movements,
+    seed_opening_balances,
+    compact_ledger,
+    stock_at
+)
+
+@pytest.fixture
+def sweet(db_session):
+    sweet = Sweet(name="Kaju Katli", category="Barfi", price=40.0, quantity=0)
+    db_session.add(sweet)
+    db_session.commit()
+    return sweet
+
+def test_record_movements_batches_rows(db_session, sweet):
+    """Test that a batch of movements is appended to the ledger"""
+    inserted = record_movements(db_session, [
+        (sweet.id, RESTOCK, 10),
+        (sweet.id, SALE, -3),
+        (sweet.id, SALE, -2),
+    ])
+    db_session.commit()
+    
+    assert inserted == 3
+    assert db_session.query(InventoryMovement).count() == 3
+
+def test_seed_opening_balances(db_session):
+    """Test that sweets without history get an opening adjustment"""
+    db_session.add(Sweet(name="Ladoo", category="Ladoo", price=10.0, quantity=25))
+    db_session.commit()
+    
+    assert seed_opening_balances(db_session) == 1
+    assert seed_opening_balances(db_session) == 0
+    movement = db_session.query(InventoryMovement).one()
+    assert movement.kind == ADJUSTMENT
+    assert movement.delta == 25
+
+def test_compaction_preserves_point_in_time_stock(db_session, sweet):
+    """Test that compaction folds old movements without changing stock history"""
+    start = utcnow() - timedelta(hours=3)
+    for offset, kind, delta in [(0, RESTOCK, 20), (1, SALE, -5), (2, SALE, -4)]:
+        db_session.add(InventoryMovement(
+            sweet_id=sweet.id, kind=kind, delta=delta,
+            created_at=start + timedelta(hours=offset)
+        ))
+    db_session.commit()
+    
+    before = [stock_at(db_session, sweet.id, start + timedelta(hours=h, minutes=30)) for h in range(3)]
+    assert before == [20, 15, 11]
+    
+    folded = compact_ledger(db_session, cutoff=start + timedelta(hours=1, minutes=30))
+    
+    assert folded == 2
+    assert db_session.query(InventoryMovement).count() == 1
+    assert db_session.query(InventorySnapshot).one().quantity == 15
+    assert stock_at(db_session, sweet.id, start + timedelta(hours=1, minutes=30)) == 15
+    assert stock_at(db_session, sweet.id, start + timedelta(hours=2, minutes=30)) == 11
+    # Finer-grained history before the snapshot is gone
+    assert stock_at(db_session, sweet.id, start + timedelta(minutes=30)) is None
+
+def test_compaction_without_old_movements(db_session, sweet):
+    """Test that compaction is a no-op when nothing is old enough"""
+    record_movement(db_session, sweet.id, RESTOCK, 5)
+    db_session.commit()
+    
+    assert compact_ledger(db_session, cutoff=utcnow() - timedelta(hours=1)) == 0
+    assert db_session.query(InventoryMovement).count() == 1
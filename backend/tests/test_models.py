@@ -1,25 +1,9 @@
-import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
-from app.database import Base
+from app.migrations import run_migrations
 from app.models.user import User
 from app.models.sweet import Sweet
-
-# Test database
-TEST_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-@pytest.fixture
-def db_session():
-    """Create a fresh database for each test"""
-    Base.metadata.create_all(bind=engine)
-    db = TestingSessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-        Base.metadata.drop_all(bind=engine)
+from app.models.category import Category, CategoryFacet
 
 # USER MODEL TESTS
 def test_create_user(db_session):
@@ -74,4 +58,47 @@ def test_sweet_purchase_decreases_quantity(db_session):
     db_session.commit()
     db_session.refresh(sweet)
     
-    assert sweet.quantity == 49
\ No newline at end of file
+    assert sweet.quantity == 49
+
+def test_sweets_share_category_rows(db_session):
+    """Test that sweets with the same category name point at one categories row"""
+    db_session.add_all([
+        Sweet(name="Kaju Katli", category="Barfi", price=40.0, quantity=5),
+        Sweet(name="Milk Barfi", category="Barfi", price=30.0, quantity=5),
+    ])
+    db_session.commit()
+    
+    assert db_session.query(Category).count() == 1
+    assert {sweet.category_id for sweet in db_session.query(Sweet)} == {1}
+    assert db_session.query(Sweet).filter(Sweet.category == "Barfi").count() == 2
+
+def test_migration_normalizes_category_strings(tmp_path):
+    """Test upgrading a database whose sweets still store the category name"""
+    old_engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with old_engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE sweets (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, "
+            "category VARCHAR NOT NULL, price FLOAT NOT NULL, quantity INTEGER NOT NULL)"
+        ))
+        conn.execute(text("CREATE INDEX ix_sweets_category ON sweets (category)"))
+        conn.execute(text(
+            "INSERT INTO sweets (name, category, price, quantity) "
+            "VALUES ('Kaju Katli', 'Barfi', 40, 5), ('Motichoor', 'Ladoo', 10, 3), ('Milk Barfi', 'Barfi', 30, 2)"
+        ))
+    
+    run_migrations(old_engine)
+    
+    db = sessionmaker(bind=old_engine)()
+    assert {sweet.name: sweet.category for sweet in db.query(Sweet)} == {
+        "Kaju Katli": "Barfi", "Motichoor": "Ladoo", "Milk Barfi": "Barfi"
+    }
+    assert db.query(Category).count() == 2
+    barfi = db.query(CategoryFacet).join(Category).filter(Category.name == "Barfi").one()
+    assert (barfi.items, barfi.total_stock) == (2, 7)
+    
+    # Existing sweets are numbered by ID, and the change sequence carries on from there
+    sweet = db.query(Sweet).filter(Sweet.name == "Motichoor").one()
+    sweet.quantity = 4
+    db.commit()
+    assert sweet.version == 4
+    db.close()
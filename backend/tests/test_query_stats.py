@@ -0,0 +1,85 @@
+import copy
+import logging
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+import app.database as database
+from app.database import fingerprint, query_stats
+from app.models.user import User
+from app.core.security import get_password_hash
+
+@pytest.fixture
+def client(client):
+    query_stats.reset()
+    return client
+
+@pytest.fixture
+def admin_headers(client, session_factory):
+    """Create an admin user and return its auth header"""
+    db = session_factory()
+    db.add(User(
+        email="admin@example.com",
+        username="admin",
+        hashed_password=get_password_hash("adminpass123"),
+        is_admin=True
+    ))
+    db.commit()
+    db.close()
+    token = client.post(
+        "/api/auth/login",
+        data={"username": "admin", "password": "adminpass123"}
+    ).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+def test_fingerprint_groups_statements_by_shape():
+    """Test that literals and IN/VALUES lists of any length share a fingerprint"""
+    assert fingerprint("SELECT * FROM sweets\n WHERE id IN (?, ?, ?) LIMIT 10") == \
+        fingerprint("SELECT * FROM sweets WHERE id IN (?, ?) LIMIT 20")
+    assert fingerprint("INSERT INTO t (a, b) VALUES (?, ?), (?, ?), (?, ?)") == \
+        fingerprint("INSERT INTO t (a, b) VALUES (?, ?), (?, ?)")
+    assert fingerprint("SELECT name FROM sweets WHERE name = 'x'") == "SELECT name FROM sweets WHERE name = ?"
+
+def test_slow_query_is_logged_with_plan(client, monkeypatch, caplog, engine):
+    """Test that statements over the threshold are logged with their query plan"""
+    monkeypatch.setattr(database, "SLOW_QUERY_MS", 0)
+    with caplog.at_level(logging.WARNING, logger="app.slow_query"):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT id FROM sweets WHERE name = :name"), {"name": "Ladoo"})
+    
+    record = next(r for r in caplog.records if "FROM sweets WHERE name" in r.getMessage())
+    assert "ix_sweets_name" in record.getMessage()
+    top = query_stats.top(order_by="count")
+    entry = next(e for e in top if e["fingerprint"] == "SELECT id FROM sweets WHERE name = ?")
+    assert entry["slow_count"] == 1
+    assert any("ix_sweets_name" in step for step in entry["plan"])
+
+def test_failed_statement_leaves_no_timer_behind(client, engine):
+    """Test that a statement that raises neither leaks state on its connection nor skews the next one"""
+    with engine.connect() as conn:
+        info = copy.deepcopy(dict(conn.info))
+        with pytest.raises(IntegrityError):
+            conn.execute(text("INSERT INTO categories (id, name) VALUES (1, 'a'), (1, 'b')"))
+        conn.rollback()
+        assert dict(conn.info) == info
+        conn.execute(text("SELECT count(*) FROM categories"))
+    
+    entry = next(e for e in query_stats.top(limit=50) if e["fingerprint"] == "SELECT count(*) FROM categories")
+    assert entry["count"] == 1
+
+def test_slow_queries_endpoint(client, admin_headers):
+    """Test that admins can list the most expensive statement fingerprints"""
+    # Different names, so the search cache cannot answer them; one fingerprint
+    for name in ("ladoo", "barfi", "jalebi"):
+        client.get(f"/api/sweets/search?name={name}", headers=admin_headers)
+    
+    response = client.get("/api/admin/slow-queries?order_by=count&limit=50", headers=admin_headers)
+    assert response.status_code == 200
+    statements = response.json()["statements"]
+    search = [s for s in statements if "LIKE" in s["fingerprint"]]
+    assert search and search[0]["count"] == 3
+    assert statements == sorted(statements, key=lambda s: s["count"], reverse=True)
+    
+    assert client.delete("/api/admin/slow-queries", headers=admin_headers).status_code == 200
+    assert client.get("/api/admin/slow-queries", headers=admin_headers).json()["untracked"] == 0
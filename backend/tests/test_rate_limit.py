@@ -0,0 +1,73 @@
+import pytest
+from fastapi import HTTPException, Request
+
+from app.core.tenancy import shop_scope
+from app.core.rate_limit import MemoryBucketStore, SQLiteBucketStore, auth_rate_limiter
+
+@pytest.fixture
+def strict_limits(monkeypatch):
+    """Three attempts per username, refilling at one per minute"""
+    monkeypatch.setattr(auth_rate_limiter, "user_rule", (3, 1 / 60))
+
+def test_bucket_allows_burst_then_refills():
+    """Test the token bucket arithmetic"""
+    store = MemoryBucketStore()
+    assert [store.take("k", 2, 1.0, now=100.0) for _ in range(3)] == [0, 0, 1.0]
+    assert store.take("k", 2, 1.0, now=101.0) == 0
+
+def test_bucket_store_is_bounded_and_expires_lazily():
+    """Test that idle buckets are dropped instead of accumulating"""
+    store = MemoryBucketStore(max_buckets=3)
+    for i in range(5):
+        store.take(f"ip-{i}", 5, 1.0, now=0.0)
+    assert len(store) == 3
+    
+    # Long after every bucket refilled, touching a new key sweeps the stale ones
+    store.take("late", 5, 1.0, now=1000.0)
+    assert len(store) == 1
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    """Test that two workers see the same buckets"""
+    path = str(tmp_path / "buckets.db")
+    first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)
+    assert first.take("k", 2, 0.1, now=0.0) == 0
+    assert second.take("k", 2, 0.1, now=0.0) == 0
+    assert first.take("k", 2, 0.1, now=0.0) == pytest.approx(10.0)
+
+def test_login_is_throttled_per_username(client, strict_limits):
+    """Test that repeated failures return 429 with Retry-After"""
+    statuses = []
+    for _ in range(4):
+        response = client.post(
+            "/api/auth/login",
+            data={"username": "victim", "password": "guess"}
+        )
+        statuses.append(response.status_code)
+    
+    assert statuses == [401, 401, 401, 429]
+    assert int(response.headers["Retry-After"]) == 60
+
+def test_successful_login_does_not_use_up_username_bucket(client, strict_limits):
+    """Test that only failed attempts count against an account"""
+    client.post(
+        "/api/auth/register",
+        json={"email": "test@example.com", "username": "testuser", "password": "testpass123"}
+    )
+    for _ in range(5):
+        response = client.post(
+            "/api/auth/login",
+            data={"username": "testuser", "password": "testpass123"}
+        )
+        assert response.status_code == 200
+
+def test_username_buckets_are_per_shop(strict_limits):
+    """Test that failed attempts in one shop do not throttle the same username in another"""
+    request = Request({"type": "http", "headers": [], "client": ("127.0.0.1", 1)})
+    with shop_scope("north"):
+        for _ in range(3):
+            auth_rate_limiter.check(request, "login", "testuser")
+        with pytest.raises(HTTPException) as throttled:
+            auth_rate_limiter.check(request, "login", "testuser")
+        assert throttled.value.status_code == 429
+    with shop_scope("south"):
+        auth_rate_limiter.check(request, "login", "testuser")
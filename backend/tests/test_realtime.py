@@ -0,0 +1,140 @@
+import asyncio
+import subprocess
+import sys
+import pytest
+from fastapi.websockets import WebSocketDisconnect
+
+from app.core.cache import SQLiteInvalidationChannel, start_invalidation_listener, stop_invalidation_listener
+from app.services.realtime import StockHub
+
+@pytest.fixture
+def auth_token(client):
+    """Create a user and return auth token"""
+    client.post(
+        "/api/auth/register",
+        json={
+            "email": "test@example.com",
+            "username": "testuser",
+            "password": "testpass123"
+        }
+    )
+    response = client.post(
+        "/api/auth/login",
+        data={
+            "username": "testuser",
+            "password": "testpass123"
+        }
+    )
+    return response.json()["access_token"]
+
+@pytest.fixture
+def sample_sweet(client, auth_token):
+    """Create a sample sweet and return its ID"""
+    response = client.post(
+        "/api/sweets",
+        json={
+            "name": "Test Sweet",
+            "category": "Test",
+            "price": 2.50,
+            "quantity": 10
+        },
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    return response.json()["id"]
+
+def test_purchase_is_streamed(client, auth_token, sample_sweet):
+    """Test that a committed purchase reaches connected clients"""
+    with client.websocket_connect(f"/api/sweets/live?token={auth_token}") as websocket:
+        hello = websocket.receive_json()
+        assert hello["type"] == "hello"
+        
+        client.post(
+            f"/api/sweets/{sample_sweet}/purchase",
+            json={"quantity": 3},
+            headers={"Authorization": f"Bearer {auth_token}"}
+        )
+        message = websocket.receive_json()
+    
+    assert message == {
+        "type": "deltas",
+        "deltas": [{"sweet_id": sample_sweet, "quantity": 7, "version": hello["version"] + 1}]
+    }
+
+def test_resume_from_version(client, auth_token, sample_sweet, monkeypatch):
+    """Test that a reconnecting client gets only the latest missed state per sweet, even after a restart"""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    since = client.get("/api/sweets/changes", headers=headers).json()["version"]
+    # Missed changes come from the change feed, not from the memory of the process that made them
+    monkeypatch.setattr("app.services.realtime.stock_hub", StockHub())
+    client.post(f"/api/sweets/{sample_sweet}/purchase", json={"quantity": 1}, headers=headers)
+    client.post(f"/api/sweets/{sample_sweet}/purchase", json={"quantity": 2}, headers=headers)
+    
+    with client.websocket_connect(f"/api/sweets/live?token={auth_token}&since={since}") as websocket:
+        hello = websocket.receive_json()
+        message = websocket.receive_json()
+    
+    assert hello["resumed"] is True
+    assert message["deltas"] == [{"sweet_id": sample_sweet, "quantity": 7, "version": since + 2}]
+
+def test_stream_rejects_invalid_token(client):
+    """Test that the stream requires a valid token, and says so with the policy violation code"""
+    with pytest.raises(WebSocketDisconnect) as disconnect:
+        with client.websocket_connect("/api/sweets/live?token=not-a-token") as websocket:
+            websocket.receive_json()
+    assert disconnect.value.code == 1008
+
+def test_slow_subscription_coalesces_and_resets():
+    """Test coalescing per sweet, dropping deltas published out of commit order, and the reset once too many sweets are pending"""
+    async def scenario():
+        hub = StockHub()
+        subscription = hub.subscribe(max_pending=2)
+        hub.publish(1, 9, version=1)
+        hub.publish(1, 7, version=3)
+        # Committed before version 3 but published after it
+        hub.publish(1, 8, version=2)
+        hub.publish(2, 5, version=4)
+        coalesced = await subscription.next_message(coalesce_ms=0)
+        for sweet_id in (3, 4, 5):
+            hub.publish(sweet_id, 1, version=sweet_id + 2)
+        overflowed = await subscription.next_message(coalesce_ms=0)
+        # Already covered by the resync
+        hub.publish(6, 1, version=6)
+        hub.publish(1, 6, version=8)
+        after_reset = await subscription.next_message(coalesce_ms=0)
+        return coalesced, overflowed, after_reset
+
+    coalesced, overflowed, after_reset = asyncio.run(scenario())
+    assert coalesced["deltas"] == [
+        {"sweet_id": 1, "quantity": 7, "version": 3},
+        {"sweet_id": 2, "quantity": 5, "version": 4},
+    ]
+    assert overflowed == {"type": "reset", "version": 7}
+    assert after_reset["deltas"] == [{"sweet_id": 1, "quantity": 6, "version": 8}]
+
+def test_stock_changes_from_other_workers_reach_the_feed(tmp_path, monkeypatch):
+    """Test that a stock change published in another worker is relayed to this worker's subscribers"""
+    path = str(tmp_path / "bus.db")
+    channel = SQLiteInvalidationChannel(path, poll_ms=10)
+    monkeypatch.setattr("app.core.cache.invalidation_channel", channel)
+    hub = StockHub()
+    monkeypatch.setattr("app.services.realtime.stock_hub", hub)
+    
+    async def scenario():
+        subscription = hub.subscribe()
+        start_invalidation_listener()
+        stop_invalidation_listener()
+        subprocess.run(
+            [
+                sys.executable, "-c",
+                "import sys; import app.core.cache as cache; cache.invalidation_channel = cache.SQLiteInvalidationChannel(sys.argv[1]); "
+                "import app.services.realtime; from app.services.events import STOCK_CHANGED, publish; "
+                "publish(STOCK_CHANGED, {'sweet_id': 1, 'quantity': 4, 'version': 12})",
+                path
+            ],
+            check=True
+        )
+        assert channel.poll() == 1
+        return await subscription.next_message(coalesce_ms=0)
+    
+    message = asyncio.run(scenario())
+    assert message == {"type": "deltas", "deltas": [{"sweet_id": 1, "quantity": 4, "version": 12}]}
@@ -0,0 +1,164 @@
+import pytest
+from datetime import timedelta
+
+from app.models.sweet import Sweet
+from app.models.reservation import Reservation
+from app.core.clock import utcnow
+from app.services.reservations import ReservationScheduler, hold_stock
+
+@pytest.fixture
+def auth_token(client):
+    """Create a user and return auth token"""
+    client.post(
+        "/api/auth/register",
+        json={
+            "email": "test@example.com",
+            "username": "testuser",
+            "password": "testpass123"
+        }
+    )
+    response = client.post(
+        "/api/auth/login",
+        data={
+            "username": "testuser",
+            "password": "testpass123"
+        }
+    )
+    return response.json()["access_token"]
+
+@pytest.fixture
+def sample_sweet(client, auth_token):
+    """Create a sample sweet and return its ID"""
+    response = client.post(
+        "/api/sweets",
+        json={
+            "name": "Test Sweet",
+            "category": "Test",
+            "price": 2.50,
+            "quantity": 10
+        },
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    return response.json()["id"]
+
+def get_sweet(session_factory, sweet_id):
+    db = session_factory()
+    sweet = db.get(Sweet, sweet_id)
+    db.close()
+    return sweet
+
+def test_reservation_holds_stock(client, auth_token, sample_sweet, session_factory):
+    """Test that reserved units cannot be bought by anyone else"""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    response = client.post(
+        "/api/reservations",
+        json={"sweet_id": sample_sweet, "quantity": 8},
+        headers=headers
+    )
+    assert response.status_code == 201
+    assert response.json()["status"] == "held"
+    
+    sweet = get_sweet(session_factory, sample_sweet)
+    assert (sweet.quantity, sweet.reserved, sweet.available) == (10, 8, 2)
+    
+    response = client.post(f"/api/sweets/{sample_sweet}/purchase", json={"quantity": 3}, headers=headers)
+    assert response.status_code == 400
+    assert "Only 2 available" in response.json()["detail"]
+
+def test_concurrent_holds_cannot_oversell(client, auth_token, sample_sweet, session_factory):
+    """Test that two sessions which both read the same available stock cannot both hold it"""
+    first, second = session_factory(), session_factory()
+    first_sweet, second_sweet = first.get(Sweet, sample_sweet), second.get(Sweet, sample_sweet)
+    assert first_sweet.available == second_sweet.available == 10
+    
+    assert hold_stock(first, first_sweet, 1, 6, 60) is not None
+    first.commit()
+    assert hold_stock(second, second_sweet, 1, 6, 60) is None
+    second.rollback()
+    assert hold_stock(second, second_sweet, 1, 4, 60) is not None
+    second.commit()
+    first.close()
+    second.close()
+    
+    sweet = get_sweet(session_factory, sample_sweet)
+    assert (sweet.quantity, sweet.reserved, sweet.available) == (10, 10, 0)
+
+def test_confirm_reservation(client, auth_token, sample_sweet, session_factory):
+    """Test that confirming turns the hold into a sale"""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    reservation_id = client.post(
+        "/api/reservations",
+        json={"sweet_id": sample_sweet, "quantity": 4},
+        headers=headers
+    ).json()["id"]
+    
+    response = client.post(f"/api/reservations/{reservation_id}/confirm", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["quantity"] == 6
+    
+    response = client.post(f"/api/reservations/{reservation_id}/confirm", headers=headers)
+    assert response.status_code == 409
+    
+    sweet = get_sweet(session_factory, sample_sweet)
+    assert (sweet.quantity, sweet.reserved) == (6, 0)
+
+def test_release_reservation(client, auth_token, sample_sweet, session_factory):
+    """Test that releasing returns the units to available stock"""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    reservation_id = client.post(
+        "/api/reservations",
+        json={"sweet_id": sample_sweet, "quantity": 5},
+        headers=headers
+    ).json()["id"]
+    
+    response = client.post(f"/api/reservations/{reservation_id}/release", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["status"] == "released"
+    assert get_sweet(session_factory, sample_sweet).available == 10
+
+def test_scheduler_expires_due_reservations(client, auth_token, sample_sweet, session_factory):
+    """Test that the heap scheduler expires only reservations whose deadline has passed"""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    short = client.post(
+        "/api/reservations",
+        json={"sweet_id": sample_sweet, "quantity": 3, "ttl_seconds": 60},
+        headers=headers
+    ).json()
+    long = client.post(
+        "/api/reservations",
+        json={"sweet_id": sample_sweet, "quantity": 2, "ttl_seconds": 3600},
+        headers=headers
+    ).json()
+    
+    scheduler = ReservationScheduler()
+    db = session_factory()
+    for reservation in db.query(Reservation).all():
+        scheduler.schedule(reservation.id, reservation.expires_at)
+    db.close()
+    
+    assert scheduler.run_due(session_factory, utcnow() + timedelta(minutes=5)) == 1
+    assert scheduler.pending() == 1
+    
+    db = session_factory()
+    assert db.get(Reservation, short["id"]).status == "expired"
+    assert db.get(Reservation, long["id"]).status == "held"
+    db.close()
+    assert get_sweet(session_factory, sample_sweet).reserved == 2
+
+def test_confirm_after_deadline_fails(client, auth_token, sample_sweet, session_factory):
+    """Test that an expired reservation cannot be confirmed even before the timer fires"""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    reservation_id = client.post(
+        "/api/reservations",
+        json={"sweet_id": sample_sweet, "quantity": 3},
+        headers=headers
+    ).json()["id"]
+    db = session_factory()
+    db.get(Reservation, reservation_id).expires_at = utcnow() - timedelta(seconds=1)
+    db.commit()
+    db.close()
+    
+    response = client.post(f"/api/reservations/{reservation_id}/confirm", headers=headers)
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Reservation is expired"
+    assert get_sweet(session_factory, sample_sweet).reserved == 0
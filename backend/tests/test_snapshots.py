@@ -0,0 +1,90 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.core.snapshots import create_snapshot, create_snapshot_engine, restore_snapshot
+
+@pytest.fixture
+def live_db(tmp_path):
+    """A database with enough rows to take several backup steps"""
+    path = str(tmp_path / "live.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE sweets (id INTEGER PRIMARY KEY, name TEXT, quantity INTEGER)")
+    conn.executemany(
+        "INSERT INTO sweets (name, quantity) VALUES (?, ?)",
+        [(f"Sweet {i} " + "x" * 200, 10) for i in range(2000)]
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+def test_writers_commit_while_snapshot_runs(live_db, tmp_path):
+    """Test that a write between backup steps succeeds and ends up in the snapshot"""
+    snapshot_path = str(tmp_path / "snapshot.db")
+    writer = sqlite3.connect(live_db, timeout=0)
+    steps = []
+    
+    def write_once(status, remaining, total):
+        if not steps:
+            writer.execute("UPDATE sweets SET quantity = 99 WHERE id = 1")
+            writer.commit()
+        steps.append(remaining)
+    
+    create_snapshot(live_db, snapshot_path, pages=4, sleep_ms=0, progress=write_once)
+    writer.close()
+    
+    assert len(steps) > 1
+    snapshot = sqlite3.connect(snapshot_path)
+    assert snapshot.execute("SELECT quantity FROM sweets WHERE id = 1").fetchone() == (99,)
+    assert snapshot.execute("SELECT COUNT(*) FROM sweets").fetchone() == (2000,)
+    snapshot.close()
+
+def test_snapshot_of_constantly_written_database_finishes(live_db, tmp_path):
+    """Test that a copy restarted by a write after every step is finished in one pass instead of looping"""
+    snapshot_path = str(tmp_path / "snapshot.db")
+    writer = sqlite3.connect(live_db, timeout=0)
+    steps = []
+    
+    def write_every_step(status, remaining, total):
+        steps.append(remaining)
+        writer.execute("UPDATE sweets SET quantity = ? WHERE id = 1", (len(steps),))
+        writer.commit()
+    
+    create_snapshot(live_db, snapshot_path, pages=4, sleep_ms=0, progress=write_every_step, max_restarts=2)
+    writer.close()
+    
+    assert len(steps) < 10
+    snapshot = sqlite3.connect(snapshot_path)
+    assert snapshot.execute("SELECT quantity FROM sweets WHERE id = 1").fetchone() == (len(steps),)
+    assert snapshot.execute("SELECT COUNT(*) FROM sweets").fetchone() == (2000,)
+    snapshot.close()
+
+def test_restore_brings_back_snapshot_contents(live_db, tmp_path):
+    """Test that restoring a snapshot undoes later changes"""
+    snapshot_path = str(tmp_path / "snapshot.db")
+    create_snapshot(live_db, snapshot_path)
+    conn = sqlite3.connect(live_db)
+    conn.execute("DELETE FROM sweets")
+    conn.commit()
+    conn.close()
+    
+    restore_snapshot(snapshot_path, live_db)
+    
+    conn = sqlite3.connect(live_db)
+    assert conn.execute("SELECT COUNT(*) FROM sweets").fetchone() == (2000,)
+    conn.close()
+
+def test_snapshot_engine_is_read_only_and_memory_mapped(live_db, tmp_path):
+    """Test that reporting connections read through mmap and cannot write"""
+    snapshot_path = str(tmp_path / "snapshot.db")
+    create_snapshot(live_db, snapshot_path)
+    engine = create_snapshot_engine(snapshot_path, mmap_bytes=1 << 20)
+    
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA mmap_size")).scalar() == 1 << 20
+        assert conn.execute(text("SELECT COUNT(*) FROM sweets")).scalar() == 2000
+        with pytest.raises(OperationalError):
+            conn.execute(text("DELETE FROM sweets"))
+    engine.dispose()
@@ -1,34 +1,9 @@
 import pytest
-from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 
-from app.main import app
-from app.database import Base, get_db
 from app.models.user import User
 from app.models.sweet import Sweet
 from app.core.security import get_password_hash
 
-# Test database
-TEST_DATABASE_URL = "sqlite:///./test_sweets.db"
-engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
-
-app.dependency_overrides[get_db] = override_get_db
-
-@pytest.fixture
-def client():
-    Base.metadata.create_all(bind=engine)
-    yield TestClient(app)
-    Base.metadata.drop_all(bind=engine)
-
 @pytest.fixture
 def auth_token(client):
     """Create a user and return auth token"""
@@ -52,9 +27,9 @@ def auth_token(client):
     return response.json()["access_token"]
 
 @pytest.fixture
-def admin_token(client):
+def admin_token(client, session_factory):
     """Create an admin user and return auth token"""
-    db = TestingSessionLocal()
+    db = session_factory()
     # Create admin user directly in database
     admin = User(
         email="admin@example.com",
@@ -284,10 +259,10 @@ def test_update_nonexistent_sweet(client, auth_token):
     )
     assert response.status_code == 404
 
-def test_delete_sweet_as_admin(client, admin_token):
+def test_delete_sweet_as_admin(client, admin_token, session_factory):
     """Test deleting a sweet as admin"""
     # Create a sweet first (need a regular user token for this)
-    db = TestingSessionLocal()
+    db = session_factory()
     sweet = Sweet(
         name="To Delete",
         category="Test",
@@ -336,4 +311,162 @@ def test_delete_nonexistent_sweet(client, admin_token):
         "/api/sweets/99999",
         headers={"Authorization": f"Bearer {admin_token}"}
     )
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+def test_category_facets_follow_writes(client, admin_token):
+    """Test that facets stay correct through create, update, purchase and delete"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    ids = [
+        client.post(
+            "/api/sweets",
+            json={"name": name, "category": category, "price": price, "quantity": quantity},
+            headers=headers
+        ).json()["id"]
+        for name, category, price, quantity in [
+            ("Chocolate Bar", "Chocolate", 2.50, 100),
+            ("Dark Chocolate", "Chocolate", 4.00, 10),
+            ("Gummy Bears", "Candy", 1.50, 200),
+        ]
+    ]
+    
+    response = client.get("/api/sweets/facets", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == [
+        {"category_id": 2, "category": "Candy", "items": 1, "min_price": 1.5, "max_price": 1.5, "total_stock": 200},
+        {"category_id": 1, "category": "Chocolate", "items": 2, "min_price": 2.5, "max_price": 4.0, "total_stock": 110},
+    ]
+    
+    client.post(f"/api/sweets/{ids[0]}/purchase", json={"quantity": 30}, headers=headers)
+    client.put(f"/api/sweets/{ids[1]}", json={"category": "Candy", "price": 1.0}, headers=headers)
+    client.delete(f"/api/sweets/{ids[2]}", headers=headers)
+    
+    assert client.get("/api/sweets/facets", headers=headers).json() == [
+        {"category_id": 2, "category": "Candy", "items": 1, "min_price": 1.0, "max_price": 1.0, "total_stock": 10},
+        {"category_id": 1, "category": "Chocolate", "items": 1, "min_price": 2.5, "max_price": 2.5, "total_stock": 70},
+    ]
+
+def test_search_sweets_by_category_id(client, auth_token):
+    """Test exact category filtering by ID alongside the name substring fallback"""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    for name, category in [("Kaju Katli", "Barfi"), ("Milk Barfi", "Barfi"), ("Motichoor", "Ladoo")]:
+        client.post(
+            "/api/sweets",
+            json={"name": name, "category": category, "price": 10.0, "quantity": 5},
+            headers=headers
+        )
+    
+    categories = client.get("/api/sweets/categories", headers=headers).json()
+    assert [category["name"] for category in categories] == ["Barfi", "Ladoo"]
+    barfi_id = categories[0]["id"]
+    
+    by_id = client.get(f"/api/sweets/search?category_id={barfi_id}", headers=headers).json()
+    assert sorted(sweet["name"] for sweet in by_id) == ["Kaju Katli", "Milk Barfi"]
+    assert all(sweet["category_id"] == barfi_id and sweet["category"] == "Barfi" for sweet in by_id)
+    
+    by_name = client.get("/api/sweets/search?category=adoo", headers=headers).json()
+    assert [sweet["name"] for sweet in by_name] == ["Motichoor"]
+
+def test_get_sweets_by_ids(client, auth_token):
+    """Test fetching specific sweets in the order asked for"""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    for name in ["Ladoo", "Jalebi", "Barfi"]:
+        client.post(
+            "/api/sweets",
+            json={"name": name, "category": "Mithai", "price": 10.0, "quantity": 5},
+            headers=headers
+        )
+    
+    response = client.get("/api/sweets?ids=3,1,99", headers=headers)
+    assert response.status_code == 200
+    assert [sweet["name"] for sweet in response.json()] == ["Barfi", "Ladoo"]
+    
+    assert client.get("/api/sweets?ids=1,x", headers=headers).status_code == 400
+
+def test_get_sweets_sparse_fields(client, auth_token):
+    """Test that fields= returns only the requested columns"""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    client.post(
+        "/api/sweets",
+        json={"name": "Ladoo", "category": "Mithai", "price": 10.0, "quantity": 5},
+        headers=headers
+    )
+    
+    response = client.get("/api/sweets?fields=id,name,category,available", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == [{"id": 1, "name": "Ladoo", "category": "Mithai", "available": 5}]
+    
+    response = client.get("/api/sweets?ids=1&fields=price", headers=headers)
+    assert response.json() == [{"price": 10.0}]
+    
+    response = client.get("/api/sweets?fields=id,hashed_password", headers=headers)
+    assert response.status_code == 400
+
+def test_large_listing_is_streamed_in_chunks(client, auth_token, monkeypatch):
+    """Test that pages above the stream threshold match the built page, across chunk boundaries"""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    for i in range(5):
+        client.post(
+            "/api/sweets",
+            json={"name": f"Sweet {i}", "category": "Mithai", "price": 10.0, "quantity": 5},
+            headers=headers
+        )
+    built = client.get("/api/sweets?skip=1&limit=3", headers=headers).json()
+    built_fields = client.get("/api/sweets?skip=1&limit=3&fields=id,name", headers=headers).json()
+    
+    monkeypatch.setattr("app.routers.sweets.LISTING_STREAM_THRESHOLD", 2)
+    monkeypatch.setattr("app.services.catalog.LISTING_CHUNK_ROWS", 2)
+    response = client.get("/api/sweets?skip=1&limit=3", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == built
+    assert [sweet["id"] for sweet in built] == [2, 3, 4]
+    
+    response = client.get("/api/sweets?skip=1&limit=3&fields=id,name", headers=headers)
+    assert response.json() == built_fields
+    assert client.get("/api/sweets?skip=10&limit=3", headers=headers).json() == []
+
+def test_changes_feed_returns_updates_and_deletions_since_version(client, auth_token, admin_token):
+    """Test that a client syncing from a version sees only later changes, deletions included"""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    ids = [
+        client.post(
+            "/api/sweets",
+            json={"name": name, "category": "Mithai", "price": 10.0, "quantity": 5},
+            headers=headers
+        ).json()["id"]
+        for name in ["Ladoo", "Jalebi", "Barfi"]
+    ]
+    synced = client.get("/api/sweets/changes", headers=headers).json()
+    assert [change["id"] for change in synced["changes"]] == ids
+    
+    client.post(f"/api/sweets/{ids[2]}/purchase", json={"quantity": 1}, headers=headers)
+    client.delete(f"/api/sweets/{ids[0]}", headers=admin_headers)
+    
+    response = client.get(f"/api/sweets/changes?since={synced['version']}", headers=headers)
+    assert response.status_code == 200
+    changes = response.json()["changes"]
+    assert [(change["id"], change["deleted"]) for change in changes] == [(ids[2], False), (ids[0], True)]
+    assert changes[0]["sweet"]["quantity"] == 4
+    
+    first_page = client.get("/api/sweets/changes?since=0&limit=2", headers=headers).json()
+    assert first_page["has_more"]
+    rest = client.get(f"/api/sweets/changes?since={first_page['version']}", headers=headers).json()
+    assert not rest["has_more"]
+    assert len(first_page["changes"]) + len(rest["changes"]) == 3
+
+def test_deleting_newest_sweet_is_seen_after_its_version(client, auth_token, admin_token):
+    """Test that the tombstone of the most recently changed sweet gets a version past the client's cursor"""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    for name in ["Ladoo", "Jalebi"]:
+        newest = client.post(
+            "/api/sweets",
+            json={"name": name, "category": "Mithai", "price": 10.0, "quantity": 5},
+            headers=headers
+        ).json()["id"]
+    cursor = client.get("/api/sweets/changes", headers=headers).json()["version"]
+    
+    client.delete(f"/api/sweets/{newest}", headers={"Authorization": f"Bearer {admin_token}"})
+    
+    changes = client.get(f"/api/sweets/changes?since={cursor}", headers=headers).json()
+    assert [(change["id"], change["deleted"]) for change in changes["changes"]] == [(newest, True)]
+    assert changes["version"] > cursor
@@ -0,0 +1,69 @@
+import subprocess
+import sys
+import threading
+
+from app.core.tasks import SQLiteTaskStore, TaskQueue
+
+def test_failing_task_is_retried_with_backoff():
+    """Test that a task failing twice runs again and then succeeds"""
+    queue = TaskQueue(workers=1, max_attempts=3, backoff_seconds=0.01)
+    calls = []
+    
+    def flaky(payload):
+        calls.append(payload["n"])
+        if len(calls) < 3:
+            raise RuntimeError("temporarily down")
+    
+    queue.register("flaky", flaky)
+    queue.enqueue("flaky", {"n": 1})
+    
+    assert queue.drain()
+    queue.stop()
+    assert calls == [1, 1, 1]
+    stats = queue.stats()
+    assert (stats["completed"], stats["retried"], stats["failed"]) == (1, 2, 0)
+
+def test_full_queue_drops_instead_of_blocking():
+    """Test that enqueueing past the bound returns at once without queueing"""
+    queue = TaskQueue(workers=1, max_size=2)
+    release = threading.Event()
+    started = threading.Event()
+    
+    def slow(payload):
+        started.set()
+        release.wait(5)
+    
+    queue.register("slow", slow)
+    assert queue.enqueue("slow", {})
+    started.wait(5)
+    
+    accepted = [queue.enqueue("slow", {}) for _ in range(3)]
+    release.set()
+    
+    assert accepted == [True, True, False]
+    assert queue.stats()["dropped"] == 1
+    assert queue.drain()
+    queue.stop()
+
+def test_tasks_of_exited_process_are_recovered(tmp_path):
+    """Test that durable tasks left by a process that died are run by the next one"""
+    path = str(tmp_path / "tasks.db")
+    subprocess.run(
+        [
+            sys.executable, "-c",
+            "import sys; from app.core.tasks import SQLiteTaskStore, Task; "
+            "SQLiteTaskStore(sys.argv[1]).add(Task('receipt', {'purchase_id': 7}))",
+            path
+        ],
+        check=True
+    )
+    queue = TaskQueue(SQLiteTaskStore(path), workers=1)
+    received = []
+    queue.register("receipt", received.append)
+    
+    queue.start()
+    assert queue.drain()
+    queue.stop()
+    
+    assert received == [{"purchase_id": 7}]
+    assert SQLiteTaskStore(path).recover() == []
@@ -0,0 +1,82 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.database import EngineRegistry
+from app.migrations import run_migrations
+
+@pytest.fixture
+def shops(tmp_path, monkeypatch):
+    """Two shop databases, with requests routed by the shop header"""
+    registry = EngineRegistry(f"sqlite:///{tmp_path}/{{shop}}.db", prepare=run_migrations)
+    for shop in ("north", "south"):
+        registry.get(shop)
+    monkeypatch.setattr("app.database.tenant_engines", registry)
+    yield registry
+    registry.dispose()
+
+@pytest.fixture
+def client(shops):
+    return TestClient(app)
+
+def login(client, shop: str) -> dict:
+    """Register the same user in a shop and return headers for that shop"""
+    shop_header = {"X-Shop-ID": shop}
+    client.post(
+        "/api/auth/register",
+        json={"email": "test@example.com", "username": "testuser", "password": "testpass123"},
+        headers=shop_header
+    )
+    response = client.post(
+        "/api/auth/login",
+        data={"username": "testuser", "password": "testpass123"},
+        headers=shop_header
+    )
+    assert response.status_code == 200
+    return {**shop_header, "Authorization": f"Bearer {response.json()['access_token']}"}
+
+def test_shops_keep_their_own_users_and_sweets(client):
+    """Test that each shop only sees its own data, cached pages included"""
+    north = login(client, "north")
+    south = login(client, "south")
+
+    response = client.post(
+        "/api/sweets",
+        json={"name": "Ladoo", "category": "Mithai", "price": 10.0, "quantity": 5},
+        headers=north
+    )
+    assert response.status_code == 201
+
+    assert [sweet["name"] for sweet in client.get("/api/sweets", headers=north).json()] == ["Ladoo"]
+    assert client.get("/api/sweets", headers=south).json() == []
+    assert client.get("/api/sweets/search?name=Ladoo", headers=south).json() == []
+
+    # A token only works in the shop that issued it, even for a user of the same name elsewhere
+    crossed = {**south, "Authorization": north["Authorization"]}
+    assert client.get("/api/sweets", headers=crossed).status_code == 401
+
+def test_requests_need_an_existing_shop(client):
+    """Test that the shop header is required, validated, and never creates a database"""
+    assert client.get("/api/sweets").status_code == 400
+    assert client.get("/api/sweets", headers={"X-Shop-ID": "../north"}).status_code == 400
+    assert client.get("/api/sweets", headers={"X-Shop-ID": "east"}).status_code == 404
+    assert client.get("/").status_code == 200
+
+def test_engine_registry_disposes_least_recently_used(tmp_path):
+    """Test that engines beyond the limit are evicted oldest-use first"""
+    registry = EngineRegistry(f"sqlite:///{tmp_path}/{{shop}}.db", max_engines=2)
+    first = registry.get("a")
+    registry.get("b")
+    assert registry.get("a") is first
+    registry.get("c")
+
+    assert registry.stats() == {"open": 2, "max_engines": 2, "opened": 3, "evicted": 1}
+    assert registry.get("a") is first
+    assert registry.shops() == []
+    with first.connect():
+        pass
+    assert registry.shops() == ["a"]
+
+    with pytest.raises(ValueError):
+        registry.url("A/../b")
+    registry.dispose()
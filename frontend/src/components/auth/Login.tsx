@@ -1,7 +1,7 @@
 import React, { useState } from 'react';
 import { useNavigate, Link } from 'react-router-dom';
 import { authAPI } from '../../services/api';
-import { setToken } from '../../utils/auth';
+import { setToken, setRefreshToken } from '../../utils/auth';
 
 const Login: React.FC = () => {
   const [username, setUsername] = useState('');
@@ -18,6 +18,7 @@ const Login: React.FC = () => {
     try {
       const response = await authAPI.login({ username, password });
       setToken(response.access_token);
+      if (response.refresh_token) setRefreshToken(response.refresh_token);
       navigate('/dashboard');
     } catch (err: any) {
       setError(err.response?.data?.detail || 'Login failed. Please try again.');
@@ -1,5 +1,6 @@
 import React from 'react';
 import { Link, useNavigate } from 'react-router-dom';
+import { authAPI } from '../../services/api';
 import { removeToken, getUsername } from '../../utils/auth';
 
 interface NavbarProps {
@@ -11,6 +12,7 @@ const Navbar: React.FC<NavbarProps> = ({ isAdmin }) => {
   const username = getUsername();
 
   const handleLogout = () => {
+    authAPI.logout().catch(() => {});
     removeToken();
     navigate('/login');
   };
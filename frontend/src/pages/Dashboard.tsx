@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { sweetsAPI } from '../services/api';
-import type { Sweet, SweetFormData, SearchParams } from '../types';
+import { sweetsAPI, subscribeToStock } from '../services/api';
+import type { Sweet, SweetFormData, SearchParams, StockDelta } from '../types';
 import { isAuthenticated, isAdmin as checkIsAdmin } from '../utils/auth';
 import Navbar from '../components/layout/Navbar';
 import SweetCard from '../components/sweets/SweetCard';
@@ -26,6 +26,22 @@ const Dashboard: React.FC = () => {
     fetchSweets();
   }, [navigate]);
 
+  useEffect(() => {
+    if (!isAuthenticated()) return;
+    const applyDeltas = (deltas: StockDelta[]) => {
+      setSweets((current) => {
+        const byId = new Map(deltas.map((delta) => [delta.sweet_id, delta]));
+        return current
+          .filter((sweet) => !byId.get(sweet.id)?.deleted)
+          .map((sweet) => {
+            const delta = byId.get(sweet.id);
+            return delta && delta.quantity !== null ? { ...sweet, quantity: delta.quantity } : sweet;
+          });
+      });
+    };
+    return subscribeToStock(applyDeltas, fetchSweets);
+  }, []);
+
   const fetchSweets = async () => {
     try {
       setLoading(true);
@@ -1,10 +1,15 @@
 import axios from 'axios';
-import type { AuthResponse, LoginCredentials, RegisterData, Sweet, SweetFormData, SearchParams } from '../types/index';
+import { getRefreshToken, setRefreshToken, setToken, removeToken } from '../utils/auth';
+import type { AuthResponse, LoginCredentials, RegisterData, Sweet, SweetFormData, SearchParams, StockDelta, Category, CategoryFacet, SweetChanges } from '../types/index';
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000';
+// The shop this build serves, when the backend runs one database per shop
+const SHOP_ID: string | undefined = import.meta.env.VITE_SHOP_ID;
+const shopHeaders = SHOP_ID ? { 'X-Shop-ID': SHOP_ID } : undefined;
 
 const api = axios.create({
   baseURL: API_BASE_URL,
+  headers: shopHeaders,
 });
 
 // Add token to requests if available
@@ -16,6 +21,45 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+// Renew an expired access token once with the refresh token, then retry.
+// Concurrent 401s share a single refresh, since each refresh token only works once.
+let pendingRefresh: Promise<string> | null = null;
+
+const refreshAccessToken = (): Promise<string> => {
+  if (!pendingRefresh) {
+    pendingRefresh = axios
+      .post<AuthResponse>(
+        `${API_BASE_URL}/api/auth/refresh`,
+        { refresh_token: getRefreshToken() },
+        { headers: shopHeaders }
+      )
+      .then((response) => {
+        setToken(response.data.access_token);
+        if (response.data.refresh_token) setRefreshToken(response.data.refresh_token);
+        return response.data.access_token;
+      })
+      .catch((error) => {
+        removeToken();
+        throw error;
+      })
+      .finally(() => {
+        pendingRefresh = null;
+      });
+  }
+  return pendingRefresh;
+};
+
+api.interceptors.response.use(undefined, async (error) => {
+  const original = error.config;
+  if (error.response?.status !== 401 || !original || original._retried || !getRefreshToken()) {
+    throw error;
+  }
+  original._retried = true;
+  const token = await refreshAccessToken();
+  original.headers.Authorization = `Bearer ${token}`;
+  return api(original);
+});
+
 // Auth API
 export const authAPI = {
   register: async (data: RegisterData): Promise<any> => {
@@ -23,6 +67,11 @@ export const authAPI = {
     return response.data;
   },
 
+  logout: async (): Promise<void> => {
+    const refreshToken = getRefreshToken();
+    if (refreshToken) await api.post('/api/auth/logout', { refresh_token: refreshToken });
+  },
+
   login: async (credentials: LoginCredentials): Promise<AuthResponse> => {
     const formData = new FormData();
     formData.append('username', credentials.username);
@@ -40,11 +89,32 @@ export const sweetsAPI = {
     return response.data;
   },
 
+  getByIds: async (ids: number[]): Promise<Sweet[]> => {
+    const response = await api.get<Sweet[]>('/api/sweets', { params: { ids: ids.join(',') } });
+    return response.data;
+  },
+
   search: async (params: SearchParams): Promise<Sweet[]> => {
     const response = await api.get<Sweet[]>('/api/sweets/search', { params });
     return response.data;
   },
 
+  getCategories: async (): Promise<Category[]> => {
+    const response = await api.get<Category[]>('/api/sweets/categories');
+    return response.data;
+  },
+
+  getFacets: async (): Promise<CategoryFacet[]> => {
+    const response = await api.get<CategoryFacet[]>('/api/sweets/facets');
+    return response.data;
+  },
+
+  // Sweets created, updated or deleted after `since`; pass the returned version next time
+  getChanges: async (since: number, limit?: number): Promise<SweetChanges> => {
+    const response = await api.get<SweetChanges>('/api/sweets/changes', { params: { since, limit } });
+    return response.data;
+  },
+
   create: async (data: SweetFormData): Promise<Sweet> => {
     const response = await api.post<Sweet>('/api/sweets', data);
     return response.data;
@@ -70,4 +140,61 @@ export const sweetsAPI = {
   },
 };
 
+// Live stock updates; reconnects and resumes from the last version seen.
+// onReset is called when the server can no longer replay what was missed.
+// A socket refused for its token (close code 1008) reconnects once with a
+// refreshed access token; if that is refused too, it stops retrying.
+export const subscribeToStock = (
+  onDeltas: (deltas: StockDelta[]) => void,
+  onReset: () => void
+): (() => void) => {
+  let version: number | null = null;
+  let socket: WebSocket | null = null;
+  let retryTimer: ReturnType<typeof setTimeout> | undefined;
+  let closed = false;
+  let refreshed = false;
+
+  const connect = () => {
+    const token = localStorage.getItem('token');
+    if (!token || closed) return;
+    const url = new URL('/api/sweets/live', API_BASE_URL.replace(/^http/, 'ws'));
+    url.searchParams.set('token', token);
+    if (SHOP_ID) url.searchParams.set('shop', SHOP_ID);
+    if (version !== null) url.searchParams.set('since', String(version));
+
+    socket = new WebSocket(url);
+    socket.onmessage = (event) => {
+      const message = JSON.parse(event.data);
+      if (message.type === 'hello') {
+        refreshed = false;
+        if (version !== null && !message.resumed) onReset();
+        version = message.version;
+      } else if (message.type === 'reset') {
+        version = message.version;
+        onReset();
+      } else if (message.type === 'deltas') {
+        // Coalesced deltas are not in version order
+        version = Math.max(version ?? 0, ...message.deltas.map((delta: StockDelta) => delta.version));
+        onDeltas(message.deltas);
+      }
+    };
+    socket.onclose = (event) => {
+      if (closed) return;
+      if (event.code !== 1008) {
+        retryTimer = setTimeout(connect, 2000);
+      } else if (!refreshed && getRefreshToken()) {
+        refreshed = true;
+        refreshAccessToken().then(connect, () => undefined);
+      }
+    };
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    clearTimeout(retryTimer);
+    socket?.close();
+  };
+};
+
 export default api;
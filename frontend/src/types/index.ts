@@ -9,8 +9,44 @@ export interface User {
     id: number;
     name: string;
     category: string;
+    category_id?: number;
     price: number;
     quantity: number;
+    version?: number;
+  }
+  
+  export interface SweetChange {
+    id: number;
+    version: number;
+    deleted: boolean;
+    sweet: Sweet | null;
+  }
+  
+  export interface SweetChanges {
+    version: number;
+    has_more: boolean;
+    changes: SweetChange[];
+  }
+  
+  export interface StockDelta {
+    sweet_id: number;
+    quantity: number | null;
+    version: number;
+    deleted?: boolean;
+  }
+  
+  export interface Category {
+    id: number;
+    name: string;
+  }
+  
+  export interface CategoryFacet {
+    category_id: number;
+    category: string;
+    items: number;
+    min_price: number;
+    max_price: number;
+    total_stock: number;
   }
   
   export interface LoginCredentials {
@@ -27,6 +63,7 @@ export interface User {
   export interface AuthResponse {
     access_token: string;
     token_type: string;
+    refresh_token?: string;
   }
   
   export interface SweetFormData {
@@ -39,6 +76,7 @@ export interface User {
   export interface SearchParams {
     name?: string;
     category?: string;
+    category_id?: number;
     min_price?: number;
     max_price?: number;
   }
\ No newline at end of file
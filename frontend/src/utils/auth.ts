@@ -14,13 +14,24 @@ export const setToken = (token: string): void => {
   localStorage.setItem('token', token);
 };
 
+export const getRefreshToken = (): string | null => {
+  return localStorage.getItem('refresh_token');
+};
+
+export const setRefreshToken = (token: string): void => {
+  localStorage.setItem('refresh_token', token);
+};
+
 export const removeToken = (): void => {
   localStorage.removeItem('token');
+  localStorage.removeItem('refresh_token');
 };
 
 export const isAuthenticated = (): boolean => {
   const token = getToken();
   if (!token) return false;
+  // An expired access token is renewed on the next request
+  if (getRefreshToken()) return true;
 
   try {
     const decoded = jwtDecode<DecodedToken>(token);